@@ -0,0 +1,331 @@
+"""Local stand-ins for the provider APIs.
+
+One threaded HTTP server speaks all three wire protocols, chosen by path:
+
+- Anthropic Messages: POST /v1/messages (SSE events when "stream" is set)
+- OpenAI-compatible chat completions (OpenAI, DeepSeek):
+  POST .../chat/completions ("data:" chunks ending with [DONE])
+- Gemini: POST .../models/<model>:generateContent and
+  :streamGenerateContent?alt=sse
+
+Responses are synthetic Markdown (paragraphs, lists and code fences) sent
+one token per chunk, paced by a `MockProfile`.
+"""
+
+import itertools
+import json
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Optional
+
+_WORDS = (
+    "the request is streamed back one token at a time so the client has to "
+    "parse decode and render every chunk as it arrives while the user waits"
+).split()
+
+_CODE = [
+    "```python\n",
+    "def handler(event):\n",
+    "    total = sum(item.size for item in event.items)\n",
+    "    return {'total': total}\n",
+    "```\n\n",
+]
+
+
+def synthetic_tokens(count: int) -> List[str]:
+    """`count` tokens of Markdown: prose paragraphs, a list and a code block."""
+    tokens: List[str] = []
+    words = itertools.cycle(_WORDS)
+    block = 0
+    while len(tokens) < count:
+        kind = block % 4
+        if kind == 3:
+            tokens.extend(_CODE)
+        elif kind == 2:
+            for _ in range(3):
+                tokens.append("- ")
+                tokens.extend(f"{next(words)} " for _ in range(6))
+                tokens.append("\n")
+            tokens.append("\n")
+        else:
+            tokens.extend(f"{next(words)} " for _ in range(40))
+            tokens.append("\n\n")
+        block += 1
+    return tokens[:count]
+
+
+@dataclass
+class MockProfile:
+    ttft: float = 0.2  # seconds from request to first token
+    tokens_per_s: float = 200.0  # 0 sends tokens as fast as possible
+    tokens: int = 400
+    input_tokens: int = 1000
+    cached_tokens: int = 0
+    connect_delay: float = 0.0  # per new connection, standing in for TCP+TLS setup
+    # The first `fail_requests` requests get `fail_status` (with Retry-After
+    # if set) instead of an answer
+    fail_requests: int = 0
+    fail_status: int = 429
+    retry_after: Optional[str] = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MockServer"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections += 1
+        time.sleep(self.server.profile.connect_delay)
+
+    def do_HEAD(self) -> None:
+        # Like the real APIs: no such route, but the connection stays open
+        self.send_response(405)
+        self.send_header("content-length", "0")
+        self.end_headers()
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("content-length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?", 1)[0]
+        with self.server.lock:
+            self.server.requests += 1
+            fail = self.server.requests <= self.server.profile.fail_requests
+        if fail:
+            self._fail()
+            return
+        if path.endswith("/v1/messages"):
+            self._anthropic(body)
+        elif path.endswith("/chat/completions"):
+            self._openai(body)
+        elif path.endswith(":streamGenerateContent"):
+            self._gemini(stream=True)
+        elif path.endswith(":generateContent"):
+            self._gemini(stream=False)
+        else:
+            self._json({"error": {"message": f"no mock for {path}"}}, status=404)
+
+    # Helpers
+
+    def _json(self, payload, status: int = 200) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _fail(self) -> None:
+        profile = self.server.profile
+        data = json.dumps({"error": {"message": "mock failure"}}).encode()
+        self.send_response(profile.fail_status)
+        if profile.retry_after is not None:
+            self.send_header("retry-after", profile.retry_after)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self) -> None:
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _end_stream(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _paced(self) -> Iterator[str]:
+        profile = self.server.profile
+        time.sleep(profile.ttft)
+        interval = 1.0 / profile.tokens_per_s if profile.tokens_per_s else 0.0
+        next_at = time.perf_counter()
+        for token in self.server.tokens:
+            if interval:
+                next_at += interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield token
+
+    # Protocols
+
+    def _anthropic(self, body) -> None:
+        profile = self.server.profile
+        usage = {
+            "input_tokens": profile.input_tokens - profile.cached_tokens,
+            "cache_read_input_tokens": profile.cached_tokens,
+            "output_tokens": 1,
+        }
+        if not body.get("stream"):
+            text = "".join(self._paced())
+            usage["output_tokens"] = profile.tokens
+            self._json(
+                {
+                    "content": [{"type": "text", "text": text}],
+                    "stop_reason": "end_turn",
+                    "usage": usage,
+                }
+            )
+            return
+
+        def event(name: str, payload) -> bytes:
+            return f"event: {name}\ndata: {json.dumps(payload)}\n\n".encode()
+
+        self._start_stream()
+        self._chunk(
+            event("message_start", {"type": "message_start", "message": {"usage": usage}})
+        )
+        self._chunk(event("ping", {"type": "ping"}))
+        for token in self._paced():
+            self._chunk(
+                event(
+                    "content_block_delta",
+                    {
+                        "type": "content_block_delta",
+                        "index": 0,
+                        "delta": {"type": "text_delta", "text": token},
+                    },
+                )
+            )
+        self._chunk(
+            event(
+                "message_delta",
+                {
+                    "type": "message_delta",
+                    "delta": {"stop_reason": "end_turn"},
+                    "usage": {"output_tokens": profile.tokens},
+                },
+            )
+        )
+        self._chunk(event("message_stop", {"type": "message_stop"}))
+        self._end_stream()
+
+    def _openai(self, body) -> None:
+        profile = self.server.profile
+        model = body.get("model", "mock")
+        usage = {
+            "prompt_tokens": profile.input_tokens,
+            "completion_tokens": profile.tokens,
+            "total_tokens": profile.input_tokens + profile.tokens,
+            "prompt_tokens_details": {"cached_tokens": profile.cached_tokens},
+        }
+        base = {"id": "mock", "created": 0, "model": model}
+        if not body.get("stream"):
+            text = "".join(self._paced())
+            self._json(
+                {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                }
+            )
+            return
+
+        def data(payload) -> bytes:
+            return f"data: {json.dumps(payload)}\n\n".encode()
+
+        self._start_stream()
+        for token in self._paced():
+            self._chunk(
+                data(
+                    {
+                        **base,
+                        "object": "chat.completion.chunk",
+                        "choices": [
+                            {"index": 0, "delta": {"content": token}, "finish_reason": None}
+                        ],
+                    }
+                )
+            )
+        self._chunk(
+            data({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+        )
+        self._chunk(b"data: [DONE]\n\n")
+        self._end_stream()
+
+    def _gemini(self, stream: bool) -> None:
+        profile = self.server.profile
+
+        def response(text: str, done: bool):
+            payload = {
+                "candidates": [
+                    {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+                ]
+            }
+            if done:
+                payload["candidates"][0]["finishReason"] = "STOP"
+                payload["usageMetadata"] = {
+                    "promptTokenCount": profile.input_tokens,
+                    "candidatesTokenCount": profile.tokens,
+                    "cachedContentTokenCount": profile.cached_tokens,
+                }
+            return payload
+
+        if not stream:
+            self._json(response("".join(self._paced()), done=True))
+            return
+
+        def data(text: str, done: bool) -> bytes:
+            return f"data: {json.dumps(response(text, done))}\r\n\r\n".encode()
+
+        self._start_stream()
+        # Hold one token back so the last chunk can carry the usage
+        previous = None
+        for token in self._paced():
+            if previous is not None:
+                self._chunk(data(previous, False))
+            previous = token
+        self._chunk(data(previous or "", True))
+        self._end_stream()
+
+
+class MockServer(ThreadingHTTPServer):
+    """Serves the mock APIs on a free localhost port while in a `with` block."""
+
+    daemon_threads = True
+
+    def __init__(self, profile: Optional[MockProfile] = None):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.profile = profile or MockProfile()
+        self.tokens = synthetic_tokens(self.profile.tokens)
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def handle_error(self, request, client_address) -> None:
+        # Cancelled requests (losing hedges, early closes) hang up mid-stream
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def __enter__(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+        self.server_close()
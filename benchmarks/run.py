@@ -0,0 +1,276 @@
+"""Offline benchmarks for llm_cli.
+
+    python -m benchmarks.run [providers|render|ingest|warm ...] [--runs N] [--json]
+
+Everything runs against local mock servers and synthetic file trees, with
+HOME pointed at a temporary directory so logs, metrics and caches never
+touch the real ones. Sections:
+
+- providers: time to first token and throughput of every provider, sync
+  and async, against a paced profile (client overhead on top of the mock's
+  TTFT) and an unthrottled one (how fast the client can parse chunks).
+- render: share of a ChatSession turn spent rendering Markdown, with the
+  terminal output going to memory.
+- ingest: read_directory throughput on a synthetic tree, without the
+  context cache, filling it, and served from it.
+- warm: time to first token on a new connection, cold and after
+  BaseProvider.warm(), with a mock connection setup delay.
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+# Isolate every path llm_cli derives from HOME before it is imported
+_HOME = tempfile.mkdtemp(prefix="llm-cli-bench-")
+os.environ["HOME"] = _HOME
+for _key in ("ANTHROPIC_API_KEY", "OPENAI_API_KEY", "DEEPSEEK_API_KEY", "GEMINI_API_KEY"):
+    os.environ[_key] = "benchmark"
+
+from llm_cli.providers import PROVIDERS  # noqa: E402
+from llm_cli.providers.transport import close_all, run_sync  # noqa: E402
+from llm_cli.utils.metrics import StreamMeter, percentile  # noqa: E402
+
+from .mock_servers import MockProfile, MockServer  # noqa: E402
+
+BASE_URL_VARS = {
+    "anthropic": ("ANTHROPIC_BASE_URL", ""),
+    "openai": ("OPENAI_BASE_URL", "/v1"),
+    "deepseek": ("DEEPSEEK_BASE_URL", ""),
+    "gemini": ("GEMINI_BASE_URL", ""),
+}
+
+PROFILES = {
+    "paced": MockProfile(ttft=0.2, tokens_per_s=200, tokens=400),
+    "unthrottled": MockProfile(ttft=0.0, tokens_per_s=0, tokens=5000),
+}
+
+
+def point_providers_at(url: str) -> None:
+    for variable, suffix in BASE_URL_VARS.values():
+        os.environ[variable] = url + suffix
+
+
+def summarize(name: str, samples: List[float], unit: str = "s") -> Dict[str, Any]:
+    return {
+        "name": name,
+        "unit": unit,
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "mean": statistics.fmean(samples) if samples else None,
+    }
+
+
+def print_results(title: str, results: List[Dict[str, Any]]) -> None:
+    print(f"\n{title}")
+    width = max(len(r["name"]) for r in results)
+    for r in results:
+        if r["unit"] == "s":
+            values = f"p50 {r['p50'] * 1000:9.1f}ms  p95 {r['p95'] * 1000:9.1f}ms"
+        else:
+            values = f"p50 {r['p50']:12,.1f}  p95 {r['p95']:12,.1f} {r['unit']}"
+        print(f"  {r['name']:<{width}}  {values}")
+
+
+# Providers
+
+
+def _stream_once(provider) -> StreamMeter:
+    meter = StreamMeter(provider.query_stream("benchmark prompt"))
+    for _ in meter:
+        pass
+    return meter
+
+
+def _astream_once(provider) -> StreamMeter:
+    # StreamMeter only wraps sync iterables; fill in its timestamps by hand
+    async def consume() -> StreamMeter:
+        meter = StreamMeter(())
+        async for _ in provider.aquery_stream("benchmark prompt"):
+            if meter.first is None:
+                meter.first = time.perf_counter()
+        meter.end = time.perf_counter()
+        return meter
+
+    return run_sync(consume())
+
+
+def bench_providers(runs: int) -> List[Dict[str, Any]]:
+    results = []
+    for profile_name, profile in PROFILES.items():
+        rows = []
+        with MockServer(profile) as server:
+            point_providers_at(server.url)
+            for name in PROVIDERS:
+                provider = PROVIDERS[name](model=f"mock-{name}")
+                for mode, once in (("sync", _stream_once), ("async", _astream_once)):
+                    once(provider)  # warm the connection pool
+                    ttft, rate = [], []
+                    for _ in range(runs):
+                        meter = once(provider)
+                        ttft.append(meter.first - meter.start)
+                        rate.append(profile.tokens / (meter.end - meter.first))
+                    label = f"{name:<9} {mode:<5}"
+                    if profile.ttft:
+                        overhead = [t - profile.ttft for t in ttft]
+                        rows.append(summarize(f"{label} ttft overhead", overhead))
+                    else:
+                        rows.append(summarize(f"{label} ttft", ttft))
+                    rows.append(summarize(f"{label} throughput", rate, "tok/s"))
+        print_results(
+            f"providers, {profile_name} ({profile.tokens} tokens,"
+            f" ttft {profile.ttft}s, {profile.tokens_per_s or 'unlimited'} tok/s)",
+            rows,
+        )
+        results.extend({"profile": profile_name, **row} for row in rows)
+    return results
+
+
+def bench_warm(runs: int) -> List[Dict[str, Any]]:
+    profile = MockProfile(ttft=0.05, tokens_per_s=0, tokens=50, connect_delay=0.1)
+    rows = []
+    with MockServer(profile) as server:
+        point_providers_at(server.url)
+        for name in PROVIDERS:
+            for mode in ("cold", "warm"):
+                ttft = []
+                for _ in range(runs):
+                    close_all()  # a new pool, as after a long idle spell
+                    provider = PROVIDERS[name](model=f"mock-{name}")
+                    if mode == "warm":
+                        provider.warm()
+                    meter = _stream_once(provider)
+                    ttft.append(meter.first - meter.start)
+                rows.append(summarize(f"{name:<9} {mode} ttft", ttft))
+    print_results(
+        f"warm (ttft {profile.ttft}s, {profile.connect_delay}s per new connection)",
+        rows,
+    )
+    return rows
+
+
+# Rendering
+
+
+def bench_render(runs: int) -> List[Dict[str, Any]]:
+    from rich.console import Console
+
+    from llm_cli.chat.chat import ChatSession
+    from llm_cli.utils.metrics import Stopwatch
+
+    profile = MockProfile(ttft=0.0, tokens_per_s=0, tokens=3000)
+    with MockServer(profile) as server:
+        point_providers_at(server.url)
+        session = ChatSession(provider="anthropic", model="mock-anthropic")
+        session.console = Console(file=io.StringIO(), force_terminal=True, width=100)
+
+        shares, per_token = [], []
+        for _ in range(runs + 1):
+            packed = session._pack("benchmark prompt")
+            _, (metrics,) = session._stream("benchmark prompt", packed, Stopwatch())
+            render = metrics.stages["render"]
+            shares.append(100 * render / metrics.total)
+            per_token.append(render / profile.tokens * 1e6)
+            session.console.file = io.StringIO()
+
+    rows = [
+        summarize("render share of turn", shares[1:], "%"),
+        summarize("render cost per token", per_token[1:], "us"),
+    ]
+    print_results(f"render ({profile.tokens} tokens of Markdown, unthrottled)", rows)
+    return rows
+
+
+# Ingestion
+
+
+def make_tree(root: Path, files: int, seed: int = 0) -> int:
+    """Write a synthetic source tree; returns its size in bytes."""
+    rng = random.Random(seed)
+    total = 0
+    (root / ".gitignore").write_text("build/\n*.log\n")
+    for i in range(files):
+        directory = root / f"pkg{i % 20}" / f"mod{i % 7}"
+        directory.mkdir(parents=True, exist_ok=True)
+        if i % 50 == 0:
+            data = bytes(rng.getrandbits(8) for _ in range(2048))  # binary
+            (directory / f"blob{i}.bin").write_bytes(data)
+        else:
+            lines = [
+                f"def function_{i}_{n}(value):\n    return value * {n}  # {rng.random()}\n"
+                for n in range(rng.randint(20, 120))
+            ]
+            data = "".join(lines).encode()
+            (directory / f"file{i}.py").write_bytes(data)
+        total += len(data)
+    (root / "build").mkdir(exist_ok=True)
+    (root / "build" / "ignored.py").write_text("x = 1\n" * 1000)
+    return total
+
+
+def bench_ingest(runs: int, files: int) -> List[Dict[str, Any]]:
+    from llm_cli.utils.ingest import IngestOptions
+    from llm_cli.utils.io_utils import read_directory
+
+    root = Path(tempfile.mkdtemp(prefix="tree-", dir=_HOME))
+    size = make_tree(root, files)
+    unlimited = dict(max_total_bytes=size * 2)
+
+    def timed(options: IngestOptions) -> float:
+        start = time.perf_counter()
+        read_directory(str(root), options=options)
+        return time.perf_counter() - start
+
+    uncached = [timed(IngestOptions(use_cache=False, **unlimited)) for _ in range(runs)]
+    fill = timed(IngestOptions(use_cache=True, **unlimited))
+    warm = [timed(IngestOptions(use_cache=True, **unlimited)) for _ in range(runs)]
+
+    mb = size / 1e6
+    rows = [
+        summarize("no cache", [mb / t for t in uncached], "MB/s"),
+        summarize("filling cache", [mb / fill], "MB/s"),
+        summarize("cached", [mb / t for t in warm], "MB/s"),
+    ]
+    print_results(f"ingest ({files} files, {mb:.1f} MB)", rows)
+    return rows
+
+
+SECTIONS: Dict[str, Callable[[argparse.Namespace], List[Dict[str, Any]]]] = {
+    "providers": lambda args: bench_providers(args.runs),
+    "render": lambda args: bench_render(args.runs),
+    "ingest": lambda args: bench_ingest(args.runs, args.files),
+    "warm": lambda args: bench_warm(args.runs),
+}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sections", nargs="*", metavar="section",
+                        help=f"any of {', '.join(SECTIONS)} (default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="measured runs per case")
+    parser.add_argument("--files", type=int, default=2000, help="files in the ingest tree")
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown section: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for section in args.sections or list(SECTIONS):
+        results[section] = SECTIONS[section](args)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
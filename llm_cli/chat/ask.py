@@ -0,0 +1,128 @@
+import logging
+import sys
+from typing import Callable, Dict, Iterable, Optional, Sequence, TextIO, Tuple
+
+from ..providers import PROVIDERS
+from ..providers.prompts import SYSTEM_PROMPTS, prompt_type_for_vibe
+from ..providers.scheduler import ScheduledProvider, schedule
+from ..utils.metrics import Stopwatch, StreamMeter, TurnMetrics, record_metrics
+from ..utils.retrieval import Retriever
+from ..utils.tokens import TokenBudget, split_context
+from .output import note_stderr, render_markdown, write_raw
+
+
+def run_ask(
+    provider: str,
+    model: str,
+    prompt: str,
+    file_context: str = "",
+    vibe: Optional[str] = None,
+    retriever: Optional[Retriever] = None,
+    max_tokens: Optional[int] = None,
+    response_cache=None,
+    fanout: Sequence[Tuple[str, str]] = (),
+    hedge_delay: float = 0.0,
+    stats: bool = False,
+    startup: Optional[Dict[str, float]] = None,
+    out: TextIO = sys.stdout,
+    note: Callable[[str], None] = note_stderr,
+    render: Optional[Callable[[Iterable[str], Stopwatch], str]] = None,
+) -> str:
+    """Answer a single prompt without the interactive UI.
+
+    Tokens go straight to `out` when it isn't a terminal; Rich is only
+    imported to render Markdown for a human at a TTY. `render` replaces both
+    (`llm serve` forwards the tokens to its client). Extra `fanout` targets
+    are always hedged: only one answer is printed. Metrics are recorded for
+    every answer and passed to `note` with `stats`, as are other notices.
+    """
+    watch = Stopwatch()
+    watch.stages.update(startup or {})
+    targets = [(provider, model), *fanout]
+    providers = []
+    for name, target_model in targets:
+        target = schedule(PROVIDERS[name](model=target_model), name)
+        if max_tokens:
+            target.max_tokens = max_tokens
+        providers.append(target)
+    budget = min(
+        (
+            TokenBudget(name, target.model, target.output_limit)
+            for (name, _), target in zip(targets, providers)
+        ),
+        key=lambda b: b.limit,
+    )
+
+    hedged = None
+    llm = providers[0]
+    if len(providers) > 1:
+        from ..providers.fanout import HedgedProvider
+
+        hedged = llm = HedgedProvider(providers, hedge_delay)
+    if response_cache is not None:
+        from ..providers.cached import CachedProvider
+
+        llm = CachedProvider(llm, response_cache)
+
+    prompt_type = prompt_type_for_vibe(vibe)
+    with watch.stage("pack"):
+        chunks = []
+        if retriever is not None:
+            chunks.extend(split_context(retriever.retrieve(prompt)))
+        chunks.extend(split_context(file_context))
+        packed = budget.pack(
+            SYSTEM_PROMPTS.get(prompt_type, ""), prompt, chunks, []
+        )
+    if packed.dropped:
+        note(f"budget: dropped {', '.join(packed.dropped)} to fit the context window")
+    if packed.over_budget:
+        note(packed.over_budget_note())
+
+    meter = StreamMeter(
+        llm.query_stream(prompt=prompt, prompt_type=prompt_type, context=packed.context)
+    )
+    if render is not None:
+        response = render(meter, watch)
+    elif out.isatty():
+        response = render_markdown(meter, watch)
+    else:
+        response = write_raw(meter, out, watch)
+
+    answered_by = (provider, llm.model)
+    if hedged is not None and hedged.winner is not None:
+        from ..providers.fanout import provider_label
+
+        label = provider_label(hedged.winner)
+        note(f"hedge: answered by {label}")
+        provider_name, _, winner_model = label.partition(":")
+        answered_by = (provider_name, winner_model)
+    scheduled = providers[0] if hedged is None else None
+    if isinstance(scheduled, ScheduledProvider) and scheduled.failed_over:
+        from ..providers.fanout import provider_label
+
+        label = provider_label(scheduled.answered_by)
+        note(f"failover: answered by {label}")
+        provider_name, _, fallback_model = label.partition(":")
+        answered_by = (provider_name, fallback_model)
+
+    usage = llm.last_usage
+    if usage is not None and usage.stop_reason == "max_tokens":
+        note(f"answer cut off at max_tokens ({llm.output_limit:,})")
+
+    if response:
+        metrics = TurnMetrics.from_stream(
+            *answered_by,
+            meter.start,
+            meter.first,
+            meter.end,
+            budget.estimate(response),
+            llm.last_marks,
+            llm.last_usage,
+            watch.stages,
+        )
+        record_metrics(metrics)
+        if stats:
+            note(metrics.footer())
+
+    logging.info({"query": prompt, "context": packed.context, "response": response})
+    return response
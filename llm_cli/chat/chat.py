@@ -1,11 +1,19 @@
-import json
-from rich.table import Table
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from ..daemon import DaemonClient
 from ..providers import PROVIDERS
-from ..providers.base import Message
-from ..providers.prompts import Prompts
-from ..utils.io_utils import LOGS_PATH, format_prompt_with_context
+from ..providers.base import BaseProvider, Message, Usage
+from ..providers.cached import CachedProvider
+from ..providers.fanout import HedgedProvider, fan_out, provider_label
+from ..providers.prompts import SYSTEM_PROMPTS, Prompts, prompt_type_for_vibe
+from ..providers.remote import RemoteProvider
+from ..providers.scheduler import ScheduledProvider, schedule
+from ..providers.transport import TRANSPORT_CONFIG, iterate_sync, run_sync
+from ..utils.metrics import Stopwatch, StreamMeter, TurnMetrics, record_metrics
+from ..utils.response_cache import ResponseCache
+from ..utils.retrieval import Retriever
+from ..utils.sessions import SessionStore
+from ..utils.tokens import PackResult, TokenBudget, split_context
 
 
 import click
@@ -13,9 +21,12 @@ from prompt_toolkit import PromptSession
 from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.keys import Keys
 from rich.console import Console
-from rich.live import Live
-from rich.markdown import Markdown
 
+from .compaction import Compactor, make_compactor
+from .prewarm import Prewarmer
+from .render import SideBySide, StreamingMarkdown
+
+import asyncio
 import logging
 
 # Type aliases for better code readability
@@ -33,21 +44,99 @@ class ChatSession:
         model: str,
         file_context: FileContext = "",
         vibe: Optional[str] = None,
+        context_loader: Optional[Callable[[], FileContext]] = None,
+        retriever: Optional[Retriever] = None,
+        max_tokens: Optional[int] = None,
+        response_cache: Optional[ResponseCache] = None,
+        fanout: Sequence[Tuple[str, str]] = (),
+        hedge: bool = False,
+        hedge_delay: float = 0.0,
+        sessions: Optional[SessionStore] = None,
+        session_id: Optional[int] = None,
+        stats: bool = False,
+        startup: Optional[Dict[str, float]] = None,
+        daemon: Optional[DaemonClient] = None,
+        compaction: Optional[Dict[str, Any]] = None,
     ):
         self.console = Console()
-        self.provider_cls = PROVIDERS[provider]
-        self.llm = self.provider_cls(model=model)
+
+        def build(name: str, target_model: Optional[str]) -> BaseProvider:
+            if daemon is not None:
+                # `llm serve` makes the calls; no SDK is imported here
+                # (and paces, retries and fails over)
+                return RemoteProvider(daemon, name, model=target_model)
+            return schedule(PROVIDERS[name](model=target_model), name)
+
+        targets = [(provider, model), *fanout]
+        providers = []
+        for name, target_model in targets:
+            llm = build(name, target_model)
+            if max_tokens:
+                llm.max_tokens = max_tokens
+            providers.append(llm)
+        # Pack for the smallest window so every target can take the request
+        self.budget = min(
+            (
+                TokenBudget(name, llm.model, llm.output_limit)
+                for (name, _), llm in zip(targets, providers)
+            ),
+            key=lambda budget: budget.limit,
+        )
+        # Older turns are summarized in the background once history grows
+        self.compactor: Optional[Compactor] = None
+        if compaction is not None:
+            self.compactor = make_compactor(compaction, provider, self.budget, build)
+
+        # With --fanout, each turn goes to every target: raced (hedge) or
+        # streamed side by side (compare)
+        self.hedged: Optional[HedgedProvider] = None
+        self.compare: List[BaseProvider] = []
+        self.compare_labels = [provider_label(llm) for llm in providers]
+        if len(providers) > 1 and hedge:
+            self.hedged = HedgedProvider(providers, hedge_delay)
+            self.llm = self.hedged
+        else:
+            self.llm = providers[0]
+            if len(providers) > 1:
+                self.compare = providers
+        # Set when a failover target may answer instead of the provider
+        self.scheduled: Optional[ScheduledProvider] = None
+        if self.llm is providers[0] and isinstance(self.llm, ScheduledProvider):
+            self.scheduled = self.llm
+        if response_cache is not None:
+            self.llm = CachedProvider(self.llm, response_cache)
+            self.compare = [CachedProvider(llm, response_cache) for llm in self.compare]
         self.file_context = file_context
+        self.context_loader = context_loader
+        self.retriever = retriever
         self.message_history: MessageHistory = []
+        # Turns are saved as they complete; the session row is created on the
+        # first one so sessions that are never used aren't recorded
+        self.provider_name = provider
+        # The primary target's model; under --hedge self.llm.model is the
+        # joined label of every raced target
+        self.model_name = providers[0].model
+        self.sessions = sessions
+        self.session_id = session_id
+        if sessions is not None and session_id is not None:
+            self.message_history = sessions.load_tail(session_id, self.budget.limit)
+        # Metrics are always recorded; --stats also prints them per turn.
+        # Startup stage timings are attached to the first turn's metrics.
+        self.stats = stats
+        self.startup = dict(startup or {})
         self.prompt_type = self._get_prompt_type(vibe)
+        # Connections and the packed request are prepared while the user types
+        self.prewarmer: Prewarmer[PackResult] = Prewarmer(
+            self._warm_connections,
+            self._pack_draft,
+            self._pack_state,
+            idle=TRANSPORT_CONFIG.rewarm_after_idle,
+        )
         self.session = self._setup_prompt_session()
 
     def _get_prompt_type(self, vibe: Optional[str]) -> PromptType:
         """Determine the prompt type based on the vibe setting."""
-        prompt_types = {"primer": Prompts.UNIVERSAL_PRIMER, "concise": Prompts.CONCISE}
-        if vibe is None:
-            return Prompts.REPL
-        return prompt_types.get(vibe.lower(), Prompts.REPL)
+        return prompt_type_for_vibe(vibe)
 
     def _setup_prompt_session(self) -> PromptSession:
         """Set up the prompt session with custom key bindings."""
@@ -61,7 +150,11 @@ class ChatSession:
         def _(event):
             event.current_buffer.insert_text("\n")
 
-        return PromptSession(key_bindings=kb)
+        session = PromptSession(key_bindings=kb)
+        session.default_buffer.on_text_changed += lambda buffer: (
+            self.prewarmer.on_text_changed(buffer.text)
+        )
+        return session
 
     def _handle_user_input(self, user_input: str) -> bool:
         """Process user input and return whether to continue the session."""
@@ -69,28 +162,77 @@ class ChatSession:
             self.console.print("[bold blue]Ending chat session[/]")
             return False
 
+        self._apply_compaction()
+
+        if user_input.strip().lower() == "/refresh":
+            self._refresh_context()
+            return True
+
+        if user_input.strip().lower() == "/budget":
+            self._show_budget(self._pack(""))
+            return True
+
         try:
-            formatted_prompt = format_prompt_with_context(user_input, self.file_context)
-            response = ""
-
-            with Live(
-                Markdown(response),
-                console=self.console,
-                auto_refresh=True,
-                screen=False,
-            ) as live:
-                for token in self.llm.query_stream(
-                    prompt=formatted_prompt,
-                    prompt_type=self.prompt_type,
-                    message_history=self.message_history,
-                ):
-                    response += token
-                    live.update(Markdown(response))
+            # File context is attached to each request by the provider, so the
+            # history only keeps what the user actually typed
+            watch = Stopwatch()
+            with watch.stage("pack"):
+                packed = self.prewarmer.take(user_input) or self._pack(user_input)
+            if packed.dropped:
+                self.console.print(
+                    f"[dim]budget: dropped {', '.join(packed.dropped)} to fit"
+                    f" {self.budget.window:,}-token window[/]"
+                )
+            if packed.over_budget:
+                self.console.print(f"[bold yellow]{packed.over_budget_note()}[/]")
+            context = packed.context
+            record = {"query": user_input, "context": context}
+            if self.compare:
+                responses, metrics = self._compare(user_input, packed, watch)
+                record["responses"] = dict(zip(self.compare_labels, responses))
+                # The first target that answered carries the conversation on
+                response = next((text for text in responses if text), "")
+                usage = None
+            else:
+                response, metrics = self._stream(user_input, packed, watch)
+                usage = self.llm.last_usage
+            self._report_metrics(metrics)
 
             if response:
-                logging.info({"query": formatted_prompt, "response": response})
-                self.message_history.append(Message("user", formatted_prompt))
-                self.message_history.append(Message("assistant", response))
+                record["response"] = response
+                record["usage"] = vars(usage) if usage else None
+                logging.info(record)
+                self._report_cache(usage)
+                if usage is not None and usage.stop_reason == "max_tokens":
+                    self.console.print(
+                        f"[dim yellow]answer cut off at max_tokens"
+                        f" ({self.llm.output_limit:,})[/]"
+                    )
+                if self.hedged is not None and self.hedged.winner is not None:
+                    self.console.print(
+                        f"hedge: answered by {provider_label(self.hedged.winner)}",
+                        style="dim",
+                        markup=False,
+                        emoji=False,
+                    )
+                if self.scheduled is not None and self.scheduled.failed_over:
+                    self.console.print(
+                        "failover: answered by"
+                        f" {provider_label(self.scheduled.answered_by)}",
+                        style="dim",
+                        markup=False,
+                        emoji=False,
+                    )
+                estimate = self.budget.message_tokens
+                turn = [
+                    Message("user", user_input, estimate(user_input)),
+                    Message("assistant", response, estimate(response)),
+                ]
+                self.message_history.extend(turn)
+                self._save_turn(turn)
+                if self.compactor is not None:
+                    # Runs while the user types the next message
+                    self.compactor.start(self.message_history)
 
             return True
 
@@ -98,12 +240,229 @@ class ChatSession:
             self.console.print(f"[bold red]Error: {str(e)}[/]")
             return True
 
+    def _stream(
+        self, user_input: str, packed: PackResult, watch: Stopwatch
+    ) -> Tuple[str, List[TurnMetrics]]:
+        """Stream one answer through the Markdown renderer."""
+        meter = StreamMeter(
+            self.llm.query_stream(
+                prompt=user_input,
+                prompt_type=self.prompt_type,
+                message_history=packed.history,
+                context=packed.context,
+            )
+        )
+        with StreamingMarkdown(self.console) as renderer:
+            for token in meter:
+                renderer.feed(token)
+
+        if self.hedged is not None and self.hedged.winner is not None:
+            provider, _, model = provider_label(self.hedged.winner).partition(":")
+        elif self.scheduled is not None and self.scheduled.failed_over:
+            label = provider_label(self.scheduled.answered_by)
+            provider, _, model = label.partition(":")
+        else:
+            provider, model = self.provider_name, self.llm.model
+        metrics = TurnMetrics.from_stream(
+            provider,
+            model,
+            meter.start,
+            meter.first,
+            meter.end,
+            self.budget.estimate(renderer.text),
+            self.llm.last_marks,
+            self.llm.last_usage,
+            {**self._take_startup(), **watch.stages, "render": renderer.render_time},
+        )
+        return renderer.text, [metrics]
+
+    def _compare(
+        self, user_input: str, packed: PackResult, watch: Stopwatch
+    ) -> Tuple[List[str], List[TurnMetrics]]:
+        """Stream the turn to every fan-out target in side-by-side columns."""
+        start = time.perf_counter()
+        first: List[Optional[float]] = [None] * len(self.compare)
+        last = [start] * len(self.compare)
+        with SideBySide(self.console, self.compare_labels) as view:
+            for index, event in iterate_sync(
+                lambda: fan_out(
+                    self.compare,
+                    user_input,
+                    self.prompt_type,
+                    packed.history,
+                    packed.context,
+                )
+            ):
+                last[index] = time.perf_counter()
+                if isinstance(event, Exception):
+                    view.fail(index, event)
+                    continue
+                if first[index] is None:
+                    first[index] = last[index]
+                view.feed(index, event)
+
+        stages = {**self._take_startup(), **watch.stages, "render": view.render_time}
+        metrics = []
+        for index, (llm, label, text) in enumerate(
+            zip(self.compare, self.compare_labels, view.texts)
+        ):
+            if not text:
+                continue
+            provider, _, model = label.partition(":")
+            metrics.append(
+                TurnMetrics.from_stream(
+                    provider,
+                    model,
+                    start,
+                    first[index],
+                    last[index],
+                    self.budget.estimate(text),
+                    llm.last_marks,
+                    llm.last_usage,
+                    stages,
+                )
+            )
+        return view.texts, metrics
+
+    def _take_startup(self) -> Dict[str, float]:
+        startup, self.startup = self.startup, {}
+        return startup
+
+    def _report_metrics(self, metrics: List[TurnMetrics]) -> None:
+        for turn in metrics:
+            record_metrics(turn)
+            if self.stats:
+                label = f"{turn.provider}:{turn.model}: " if len(metrics) > 1 else ""
+                self.console.print(
+                    f"{label}{turn.footer()}", style="dim", markup=False, emoji=False
+                )
+
+    def _save_turn(self, turn: List[Message]) -> None:
+        if self.sessions is None:
+            return
+        if self.session_id is None:
+            self.session_id = self.sessions.create(
+                self.provider_name, self.model_name, turn[0].content
+            )
+        self.sessions.append(
+            self.session_id,
+            turn,
+            [m.tokens for m in turn],
+        )
+
+    def _apply_compaction(self) -> None:
+        """Replace the older turns with their summary once it is ready."""
+        if self.compactor is None:
+            return
+        error = self.compactor.take_error()
+        if error is not None:
+            self.console.print(f"[dim yellow]compaction failed: {error}[/]")
+        result = self.compactor.take(self.message_history)
+        if result is None:
+            return
+        self.message_history = result.history
+        self.console.print(
+            f"[dim]compacted {result.replaced} earlier messages into a"
+            f" ~{result.summary_tokens:,}-token summary[/]"
+        )
+
+    def _warm_connections(self) -> None:
+        if self.compare:
+            # Compared targets stream through the async clients
+            run_sync(asyncio.gather(*(llm.awarm() for llm in self.compare)))
+        else:
+            self.llm.warm()
+
+    def _pack_state(self) -> Tuple[Any, ...]:
+        """Everything besides the message that _pack's result depends on."""
+        history = self.message_history
+        return (
+            len(history),
+            history[0] if history else None,
+            history[-1] if history else None,
+            self.file_context,
+            self.prompt_type,
+        )
+
+    def _pack_draft(self, draft: str) -> Optional[PackResult]:
+        """`_pack` for a draft, unless retrieval is an API request.
+
+        Most drafts are thrown away, and a remote embedder would be paid for
+        every typing pause; those turns are packed on Enter instead.
+        """
+        if self.retriever is not None and self.retriever.remote:
+            return None
+        return self._pack(draft)
+
+    def _pack(self, user_input: str) -> PackResult:
+        """Fit system prompt, context and history into the model's window.
+
+        Chunks retrieved for this message take priority over the static
+        file context.
+        """
+        chunks = []
+        if self.retriever is not None and user_input:
+            chunks.extend(split_context(self.retriever.retrieve(user_input)))
+        chunks.extend(split_context(self.file_context))
+        return self.budget.pack(
+            SYSTEM_PROMPTS.get(self.prompt_type, ""),
+            user_input,
+            chunks,
+            self.message_history,
+        )
+
+    def _show_budget(self, packed: PackResult) -> None:
+        """Pre-flight view of the next request's estimated size."""
+        self.console.print(
+            f"[bold blue]Next request: ~{packed.tokens:,} of {packed.limit:,}"
+            f" input tokens[/]\n"
+            f"  system + prompt: {packed.system_tokens:,}\n"
+            f"  context:         {packed.context_tokens:,}\n"
+            f"  history:         {packed.history_tokens:,}"
+            f" ({len(packed.history)} of {len(self.message_history)} messages)"
+        )
+        if packed.dropped:
+            self.console.print(f"  dropped: {', '.join(packed.dropped)}")
+        if packed.over_budget:
+            self.console.print(f"  [bold yellow]{packed.over_budget_note()}[/]")
+
+    def _report_cache(self, usage: Optional[Usage]) -> None:
+        """Show whether the request prefix was served from the prompt cache."""
+        if usage is None or not (usage.cached_tokens or usage.cache_write_tokens):
+            return
+        if usage.cache_hit:
+            status = f"hit {usage.cached_tokens:,}/{usage.input_tokens:,} tokens"
+        else:
+            status = f"miss, wrote {usage.cache_write_tokens:,} tokens"
+        self.console.print(f"[dim]prompt cache: {status}[/]")
+
+    def _refresh_context(self) -> None:
+        """Re-read the context files so edits show up in the next request."""
+        if self.context_loader is None:
+            self.console.print("[bold yellow]No files or directories to refresh[/]")
+            return
+        self.file_context = self.context_loader()
+        self.console.print(
+            f"[bold blue]Context refreshed ({len(self.file_context):,} chars)[/]"
+        )
+
     def run(self) -> None:
         """Run the chat session."""
         self.console.print(
-            "[bold blue]Chat session started. Type 'exit' to end the conversation.[/]"
+            "[bold blue]Chat session started. Type 'exit' to end the conversation"
+            " ('/refresh' reloads file context, '/budget' shows request size).[/]"
         )
+        if self.session_id is not None:
+            info = self.sessions.get(self.session_id) if self.sessions else None
+            total = info.messages if info else len(self.message_history)
+            self.console.print(
+                f"[dim]Resumed session {self.session_id}: loaded"
+                f" {len(self.message_history)} of {total} messages[/]"
+            )
+            if self.compactor is not None:
+                self.compactor.start(self.message_history)
 
+        self.prewarmer.warm()
         while True:
             try:
                 user_input = self.session.prompt("\n>>> ")
@@ -114,45 +473,8 @@ class ChatSession:
                 self.console.print("[bold blue]Goodbye![/]")
                 break
 
-
-class HistoryViewer:
-    """Handles viewing chat history with rich formatting."""
-
-    def __init__(self, n: Optional[int] = None):
-        self.n = int(n) if n else None
-        self.console = Console()
-
-    def _get_log_entries(self) -> List[Dict[str, Any]]:
-        """Retrieve log entries from the log file."""
-        curr_year, curr_month = datetime.now().year, datetime.now().month
-        file_name = LOGS_PATH / f"llm_cli_{str(curr_year)}{curr_month:02}.log"
-
-        try:
-            with open(file_name, "r", encoding="utf-8") as f:
-                log_entries = [json.loads(line) for line in f.readlines()]
-                if self.n is not None:
-                    return log_entries[-self.n :]
-                return log_entries[-10:]
-        except FileNotFoundError:
-            self.console.print("[bold red]No log file found.[/]")
-            return []
-
-    def display(self) -> None:
-        """Display the chat history in a formatted table."""
-        log_entries = self._get_log_entries()
-
-        table = Table(show_header=True, header_style="bold magenta")
-        table.add_column("Timestamp", style="dim")
-        table.add_column("Level", style="bold")
-        table.add_column("Query", style="dim")
-        table.add_column("Response", style="bold")
-
-        for entry in log_entries:
-            table.add_row(
-                entry.get("timestamp", "N/A"),
-                entry.get("level", "N/A"),
-                entry.get("query", "N/A"),
-                entry.get("response", "N/A"),
+        if self.sessions is not None and self.session_id is not None:
+            self.console.print(
+                f"[dim]Session {self.session_id} saved;"
+                f" resume with: llm chat --resume {self.session_id}[/]"
             )
-
-        self.console.print(table)
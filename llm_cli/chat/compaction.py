@@ -0,0 +1,186 @@
+"""Background compaction of long chat histories.
+
+Every turn resends the history that fits in the window, so a long session
+gets slower (and dearer) each turn. Once the history passes a threshold,
+the older turns are summarized by a cheap model on a background thread,
+while the user is still typing the next message. The summary replaces them
+at the start of the following turn. The session store keeps the full
+transcript; only what is sent is compacted.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from ..providers.base import BaseProvider, Message
+from ..providers.prompts import Prompts
+from ..utils.tokens import TokenBudget
+
+# Fast, inexpensive model per provider, used when the compaction section
+# doesn't name a target
+CHEAP_MODELS = {
+    "anthropic": "claude-3-5-haiku-20241022",
+    "openai": "gpt-4.1-mini",
+    "deepseek": "deepseek-chat",
+    "gemini": "gemini-2.0-flash-lite",
+}
+
+SUMMARY_OPEN = "<conversation_summary>"
+SUMMARY_CLOSE = "</conversation_summary>"
+SUMMARY_REPLY = "Understood. I'll continue from that summary."
+
+
+@dataclass
+class CompactionResult:
+    replaced: int  # messages at the start of the history the summary replaces
+    history: List[Message]  # the summary exchange followed by the rest
+    summary_tokens: int
+
+
+class Compactor:
+    """Summarizes the older part of a chat history in the background.
+
+    `start` is called once a turn has been added to the history and returns
+    straight away; `take` is called before the next request is packed and
+    returns the compacted history once a summary is ready. The newest
+    `keep_recent` messages are never summarized.
+    """
+
+    def __init__(
+        self,
+        llm: BaseProvider,
+        budget: TokenBudget,
+        threshold: int,
+        keep_recent: int = 4,
+    ):
+        self.llm = llm
+        self.budget = budget
+        # Compact before the window fills up and packing starts dropping turns
+        self.threshold = min(threshold, budget.limit // 2)
+        self.keep_recent = keep_recent
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+        self.prefix: List[Message] = []
+        self.summary: Optional[str] = None
+        self.error: Optional[Exception] = None
+        # History length at the last failure; retried after more turns
+        self.failed_at: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, history: List[Message]) -> bool:
+        """Start summarizing if `history` is over the threshold.
+
+        Returns whether a summary was started.
+        """
+        if self.running or self.summary is not None:
+            return False
+        failed_at = self.failed_at
+        if failed_at is not None and len(history) < failed_at + self.keep_recent:
+            return False
+        total = sum(
+            m.tokens or self.budget.message_tokens(m.content) for m in history
+        )
+        if total <= self.threshold:
+            return False
+
+        # The kept tail has to start on a user message
+        end = len(history) - self.keep_recent
+        while end > 0 and history[end].role != "user":
+            end -= 1
+        if end < 2 or (end == 2 and history[0].content.startswith(SUMMARY_OPEN)):
+            return False  # nothing new to summarize
+
+        self.prefix = history[:end]
+        self.error = self.failed_at = None
+        self.thread = threading.Thread(
+            target=self._summarize,
+            args=(self.prefix,),
+            name="llm-compaction",
+            daemon=True,
+        )
+        self.thread.start()
+        return True
+
+    def _summarize(self, prefix: List[Message]) -> None:
+        transcript = "\n\n".join(f"{m.role}: {m.content}" for m in prefix)
+        try:
+            summary = self.llm.query(
+                prompt=f"<conversation>\n{transcript}\n</conversation>",
+                prompt_type=Prompts.COMPACT,
+            )
+        except Exception as e:
+            logging.warning(f"compaction failed: {type(e).__name__}: {e}")
+            with self.lock:
+                self.error = e
+                self.failed_at = len(prefix)
+            return
+        with self.lock:
+            self.summary = summary.strip() or None
+
+    def take(self, history: List[Message]) -> Optional[CompactionResult]:
+        """The compacted history, if a summary of its start is ready.
+
+        A summary is discarded when the history no longer starts with the
+        messages it covers (the session was cleared or replaced meanwhile).
+        """
+        with self.lock:
+            summary, self.summary = self.summary, None
+        if summary is None:
+            return None
+        prefix, self.prefix = self.prefix, []
+        n = len(prefix)
+        if len(history) < n or history[n - 1] is not prefix[-1]:
+            return None
+        if history[0] is not prefix[0]:
+            return None
+
+        content = f"{SUMMARY_OPEN}\n{summary}\n{SUMMARY_CLOSE}"
+        exchange = [
+            Message("user", content, self.budget.message_tokens(content)),
+            Message(
+                "assistant", SUMMARY_REPLY, self.budget.message_tokens(SUMMARY_REPLY)
+            ),
+        ]
+        return CompactionResult(n, exchange + history[n:], exchange[0].tokens)
+
+    def take_error(self) -> Optional[Exception]:
+        with self.lock:
+            error, self.error = self.error, None
+        return error
+
+
+def make_compactor(
+    settings: Dict[str, Any],
+    provider: str,
+    budget: TokenBudget,
+    build,
+) -> Optional[Compactor]:
+    """A Compactor for the `compaction` config section, or None if disabled.
+
+    `build(provider, model)` constructs the summarizing provider; the
+    section's "target" ("provider[:model]") defaults to the chat's provider
+    with its entry in CHEAP_MODELS.
+    """
+    if not settings.get("enabled", False):
+        return None
+    target = settings.get("target") or provider
+    name, _, model = target.partition(":")
+    try:
+        llm = build(name, model or CHEAP_MODELS.get(name))
+    except KeyError:
+        logging.warning(f"compaction disabled: unknown provider {name!r}")
+        return None
+    except (ImportError, ValueError) as e:
+        logging.warning(f"compaction disabled: {e}")
+        return None
+    llm.max_tokens = int(settings.get("max_tokens", 1024))
+    return Compactor(
+        llm,
+        budget,
+        threshold=int(settings.get("threshold", 16_000)),
+        keep_recent=int(settings.get("keep_recent", 4)),
+    )
@@ -0,0 +1,51 @@
+from typing import Any, Dict, List, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+from ..utils.history_index import HistoryIndex, log_files, parse_since, tail_entries
+
+
+class HistoryViewer:
+    """Handles viewing chat history with rich formatting."""
+
+    def __init__(
+        self,
+        n: Optional[int] = None,
+        search: Optional[str] = None,
+        since: Optional[str] = None,
+    ):
+        self.n = int(n) if n else None
+        self.search = search
+        self.since = parse_since(since) if since else None
+        self.console = Console()
+
+    def _get_log_entries(self) -> List[Dict[str, Any]]:
+        """Retrieve log entries, newest months first, stopping after `n`."""
+        if not log_files():
+            self.console.print("[bold red]No log file found.[/]")
+            return []
+        limit = self.n or 10
+        if self.search or self.since:
+            return HistoryIndex().search(self.search, self.since, limit)
+        return tail_entries(limit)
+
+    def display(self) -> None:
+        """Display the chat history in a formatted table."""
+        log_entries = self._get_log_entries()
+
+        table = Table(show_header=True, header_style="bold magenta")
+        table.add_column("Timestamp", style="dim")
+        table.add_column("Level", style="bold")
+        table.add_column("Query", style="dim")
+        table.add_column("Response", style="bold")
+
+        for entry in log_entries:
+            table.add_row(
+                entry.get("timestamp", "N/A"),
+                entry.get("level", "N/A"),
+                entry.get("query", "N/A"),
+                entry.get("response", "N/A"),
+            )
+
+        self.console.print(table)
@@ -0,0 +1,68 @@
+"""Printing answers outside the interactive chat.
+
+Kept free of provider, config and Rich imports so `llm ask` through
+`llm serve` starts with little more than the interpreter.
+"""
+
+import sys
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, Optional, TextIO
+
+if TYPE_CHECKING:
+    from ..daemon import DaemonClient
+    from ..utils.metrics import Stopwatch
+
+
+def write_raw(
+    tokens: Iterable[str], out: TextIO, watch: Optional["Stopwatch"] = None
+) -> str:
+    """Write tokens straight to `out` as they arrive; returns the full text."""
+    parts = []
+    writing = 0.0
+    for token in tokens:
+        parts.append(token)
+        start = time.perf_counter()
+        out.write(token)
+        out.flush()
+        writing += time.perf_counter() - start
+    if parts and not parts[-1].endswith("\n"):
+        out.write("\n")
+        out.flush()
+    if watch is not None:
+        watch.stages["render"] = writing
+    return "".join(parts)
+
+
+def render_markdown(tokens: Iterable[str], watch: Optional["Stopwatch"] = None) -> str:
+    """Render tokens as Markdown on an interactive terminal."""
+    from rich.console import Console
+
+    from .render import StreamingMarkdown
+
+    with StreamingMarkdown(Console()) as renderer:
+        for token in tokens:
+            renderer.feed(token)
+    if watch is not None:
+        watch.stages["render"] = renderer.render_time
+    return renderer.text
+
+
+def note_stderr(message: str) -> None:
+    print(message, file=sys.stderr)
+
+
+def run_remote_ask(
+    client: "DaemonClient", request: Dict[str, Any], out: TextIO = sys.stdout
+) -> str:
+    """Print the answer `llm serve` streams back for an `ask` request."""
+
+    def tokens() -> Iterator[str]:
+        for message in client.stream("ask", **request):
+            if "token" in message:
+                yield message["token"]
+            elif "note" in message:
+                note_stderr(message["note"])
+
+    if out.isatty():
+        return render_markdown(tokens())
+    return write_raw(tokens(), out)
@@ -0,0 +1,128 @@
+"""Speculative work done while the user is typing.
+
+The prompt used to block until Enter, and only then did the turn retrieve
+context, pack the request and (after an idle spell) reconnect to the API.
+The Prewarmer does that work in the background: it opens connections when
+the session starts and again when the user starts typing after an idle
+period, and it packs the draft whenever typing pauses. When the submitted
+text matches the last draft, the turn goes straight to sending the request.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Generic, Optional, Tuple, TypeVar
+
+# Seconds without a keystroke before the draft is packed
+PACK_DEBOUNCE = 0.15
+
+T = TypeVar("T")
+
+
+class Prewarmer(Generic[T]):
+    """Warms connections and prepares the draft message in the background.
+
+    `warm()` opens connections (at most one warm-up runs at a time).
+    `on_text_changed(draft)` is called on every edit of the prompt; the
+    draft is passed to `prepare` once typing pauses for `debounce` seconds;
+    it may return None to leave the draft for the turn to prepare.
+    `take(text)` returns that result for the submitted text, provided
+    `state()` (whatever else `prepare` reads) hasn't changed since.
+    """
+
+    def __init__(
+        self,
+        warm: Callable[[], None],
+        prepare: Callable[[str], Optional[T]],
+        state: Callable[[], Any],
+        idle: float,
+        debounce: float = PACK_DEBOUNCE,
+    ):
+        self._warm = warm
+        self.prepare = prepare
+        self.state = state
+        self.idle = idle
+        self.debounce = debounce
+        self.cond = threading.Condition()
+        self.warming = False
+        self.last_used = time.monotonic()
+        self.draft: Optional[str] = None
+        self.changed_at = 0.0
+        self.preparing: Optional[str] = None
+        self.prepared: Optional[Tuple[str, Any, T]] = None
+        self.worker: Optional[threading.Thread] = None
+
+    def warm(self) -> None:
+        """Open connections on a background thread."""
+        with self.cond:
+            self.last_used = time.monotonic()
+            if self.warming:
+                return
+            self.warming = True
+        threading.Thread(target=self._run_warm, name="llm-warm", daemon=True).start()
+
+    def _run_warm(self) -> None:
+        try:
+            self._warm()
+        except Exception:
+            logging.debug("connection warm-up failed", exc_info=True)
+        finally:
+            with self.cond:
+                self.warming = False
+
+    def on_text_changed(self, draft: str) -> None:
+        """Note an edit of the prompt; cheap enough to run per keystroke."""
+        now = time.monotonic()
+        if now - self.last_used > self.idle:
+            self.warm()
+        with self.cond:
+            self.draft = draft
+            self.changed_at = now
+            if self.worker is None:
+                self.worker = threading.Thread(
+                    target=self._run_prepare, name="llm-prepare", daemon=True
+                )
+                self.worker.start()
+            self.cond.notify_all()
+
+    def _run_prepare(self) -> None:
+        while True:
+            with self.cond:
+                while self.draft is None:
+                    self.cond.wait()
+                delay = self.changed_at + self.debounce - time.monotonic()
+                if delay > 0:
+                    self.cond.wait(delay)
+                    continue
+                draft, self.draft = self.draft, None
+                if not draft.strip() or (self.prepared and self.prepared[0] == draft):
+                    continue
+                self.preparing = draft
+            try:
+                state = self.state()
+                result = self.prepare(draft)
+            except Exception:
+                # The turn prepares it again and reports the error
+                logging.debug("speculative prepare failed", exc_info=True)
+                result = None
+            with self.cond:
+                if result is not None:
+                    self.prepared = (draft, state, result)
+                self.preparing = None
+                self.cond.notify_all()
+
+    def take(self, text: str) -> Optional[T]:
+        """The result prepared for `text`, or None if it has to be redone.
+
+        Waits for a preparation of this very text that is still running.
+        """
+        with self.cond:
+            self.draft = None
+            self.last_used = time.monotonic()
+            while self.preparing == text:
+                self.cond.wait()
+            prepared, self.prepared = self.prepared, None
+        if prepared is None or prepared[0] != text:
+            return None
+        _, state, result = prepared
+        return result if state == self.state() else None
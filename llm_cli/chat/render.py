@@ -0,0 +1,184 @@
+import time
+from typing import List, Optional, Sequence
+
+from rich.console import Console, Group
+from rich.live import Live
+from rich.markdown import Markdown
+from rich.panel import Panel
+from rich.table import Table
+from rich.text import Text
+
+
+class StreamingMarkdown:
+    """Render a token stream as Markdown without re-rendering finished blocks.
+
+    Completed top-level blocks (paragraphs ended by a blank line, closed code
+    fences) are printed once above the live region; only the trailing open
+    block is re-parsed, and live refreshes are capped at `max_fps` so bursts
+    of tokens are coalesced into a single frame.
+    """
+
+    def __init__(self, console: Console, max_fps: float = 15.0):
+        self.console = console
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self._parts: List[str] = []
+        self._pending = ""  # text after the last committed block
+        self._scan_pos = 0  # offset in _pending of the first unscanned line
+        self._fence: Optional[str] = None  # open code fence marker, if any
+        self._committed_any = False
+        self._dirty = False
+        self._last_refresh = 0.0
+        self._live: Optional[Live] = None
+        self.render_time = 0.0  # seconds spent parsing and drawing
+
+    @property
+    def text(self) -> str:
+        """The full response received so far."""
+        return "".join(self._parts)
+
+    def __enter__(self) -> "StreamingMarkdown":
+        self._live = Live(
+            Text(""),
+            console=self.console,
+            auto_refresh=False,
+            screen=False,
+        )
+        self._live.__enter__()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        start = time.perf_counter()
+        self._refresh(force=True)
+        self._live.__exit__(*exc_info)
+        self._live = None
+        self.render_time += time.perf_counter() - start
+
+    def feed(self, token: str) -> None:
+        """Add a token to the stream and refresh if the frame budget allows."""
+        start = time.perf_counter()
+        self._parts.append(token)
+        self._pending += token
+        self._dirty = True
+        self._commit_finished_blocks()
+        self._refresh()
+        self.render_time += time.perf_counter() - start
+
+    def _commit_finished_blocks(self) -> None:
+        while True:
+            newline = self._pending.find("\n", self._scan_pos)
+            if newline == -1:
+                return
+            line = self._pending[self._scan_pos : newline].strip()
+            self._scan_pos = newline + 1
+
+            if self._fence:
+                if line.startswith(self._fence) and not line.strip(self._fence[0]):
+                    self._fence = None
+                    self._commit(self._scan_pos)
+            elif line.startswith(("```", "~~~")):
+                self._fence = line[: len(line) - len(line.lstrip(line[0]))]
+            elif not line:
+                self._commit(self._scan_pos)
+
+    def _commit(self, end: int) -> None:
+        block, self._pending = self._pending[:end], self._pending[end:]
+        self._scan_pos = 0
+        if not block.strip():
+            return
+        if self._committed_any:
+            self._live.console.print()
+        self._live.console.print(Markdown(block))
+        self._committed_any = True
+        self._dirty = True
+
+    def _refresh(self, force: bool = False) -> None:
+        if not self._dirty:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.min_interval:
+            return
+
+        tail = self._pending
+        if not tail.strip():
+            renderable = Text("")
+        elif self._committed_any:
+            renderable = Group(Text(""), Markdown(tail))
+        else:
+            renderable = Markdown(tail)
+        self._live.update(renderable, refresh=True)
+        self._last_refresh = now
+        self._dirty = False
+
+
+class SideBySide:
+    """Render several token streams as Markdown columns, one per provider.
+
+    Each column is re-parsed on refresh, so refreshes are capped at
+    `max_fps`; a failed stream shows its error in place of the answer.
+    """
+
+    def __init__(self, console: Console, labels: Sequence[str], max_fps: float = 8.0):
+        self.console = console
+        self.labels = list(labels)
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self._parts: List[List[str]] = [[] for _ in self.labels]
+        self._errors: List[Optional[str]] = [None for _ in self.labels]
+        self._dirty = False
+        self._last_refresh = 0.0
+        self._live: Optional[Live] = None
+        self.render_time = 0.0
+
+    @property
+    def texts(self) -> List[str]:
+        """The response received so far from each stream."""
+        return ["".join(parts) for parts in self._parts]
+
+    def __enter__(self) -> "SideBySide":
+        self._live = Live(
+            self._renderable(),
+            console=self.console,
+            auto_refresh=False,
+            vertical_overflow="visible",
+        )
+        self._live.__enter__()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        start = time.perf_counter()
+        self._refresh(force=True)
+        self._live.__exit__(*exc_info)
+        self._live = None
+        self.render_time += time.perf_counter() - start
+
+    def feed(self, index: int, token: str) -> None:
+        start = time.perf_counter()
+        self._parts[index].append(token)
+        self._dirty = True
+        self._refresh()
+        self.render_time += time.perf_counter() - start
+
+    def fail(self, index: int, error: Exception) -> None:
+        self._errors[index] = str(error)
+        self._dirty = True
+        self._refresh()
+
+    def _renderable(self) -> Table:
+        grid = Table.grid(expand=True, padding=(0, 1))
+        for _ in self.labels:
+            grid.add_column(ratio=1)
+        cells = []
+        for label, text, error in zip(self.labels, self.texts, self._errors):
+            body = Text(f"Error: {error}", style="bold red") if error else Markdown(text)
+            cells.append(Panel(body, title=label, title_align="left"))
+        grid.add_row(*cells)
+        return grid
+
+    def _refresh(self, force: bool = False) -> None:
+        if not self._dirty:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.min_interval:
+            return
+        self._live.update(self._renderable(), refresh=True)
+        self._last_refresh = now
+        self._dirty = False
@@ -0,0 +1,394 @@
+"""`llm serve`: a warm background process behind `llm ask` and `llm chat`.
+
+A one-shot `llm ask` spends most of its startup importing provider SDKs,
+parsing the config, building HTTP clients and re-reading context before
+the request is even sent. The daemon does all of that once and keeps it:
+config (reloaded when the file changes), imported SDKs, pooled connections,
+the context cache and codebase indexes. The commands find it on a Unix
+socket and become thin clients.
+
+The protocol is one JSON object per line. The client sends a single
+request, {"op": ..., ...fields}, and the daemon answers with any number of
+{"token": str} and {"note": str} messages followed by {"done": {...}}, or
+{"error": str}. Closing the connection cancels the request.
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from dataclasses import asdict
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+SOCKET_PATH = Path.home() / ".config" / "llm_cli" / "llm.sock"
+# Upper bound on one protocol line (a whole non-streamed answer fits)
+MAX_LINE = 64 * 1024 * 1024
+# Chat sessions whose last history is kept for reuse (see Daemon._history)
+MAX_SESSIONS = 64
+
+Send = Callable[[Dict[str, Any]], None]
+
+
+class DaemonError(Exception):
+    """The daemon failed the request, or went away in the middle of it."""
+
+
+def encode(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message).encode("utf-8") + b"\n"
+
+
+class DaemonClient:
+    """Sends requests to the `llm serve` daemon listening on `path`."""
+
+    def __init__(self, path: Path = SOCKET_PATH):
+        self.path = path
+
+    @classmethod
+    def find(cls, path: Path = SOCKET_PATH) -> Optional["DaemonClient"]:
+        """A client for the daemon on `path`, or None if it isn't running."""
+        if not path.exists():
+            return None
+        client = cls(path)
+        try:
+            for _ in client.stream("ping"):
+                pass
+        except (OSError, DaemonError):
+            return None
+        return client
+
+    def stream(self, op: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+        """Send one request and yield the daemon's messages up to "done"."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(self.path))
+            sock.sendall(encode({"op": op, **fields}))
+            with sock.makefile("rb") as reader:
+                for line in reader:
+                    message = json.loads(line)
+                    if "error" in message:
+                        raise DaemonError(message["error"])
+                    yield message
+                    if "done" in message:
+                        return
+        raise DaemonError("llm serve closed the connection mid-request")
+
+    async def astream(self, op: str, **fields: Any) -> AsyncIterator[Dict[str, Any]]:
+        import asyncio
+
+        reader, writer = await asyncio.open_unix_connection(
+            str(self.path), limit=MAX_LINE
+        )
+        try:
+            writer.write(encode({"op": op, **fields}))
+            await writer.drain()
+            while line := await reader.readline():
+                message = json.loads(line)
+                if "error" in message:
+                    raise DaemonError(message["error"])
+                yield message
+                if "done" in message:
+                    return
+            raise DaemonError("llm serve closed the connection mid-request")
+        finally:
+            writer.close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "Daemon"
+
+    def handle(self) -> None:
+        line = self.rfile.readline(MAX_LINE)
+        if not line:
+            return
+
+        def send(message: Dict[str, Any]) -> None:
+            self.wfile.write(encode(message))
+
+        try:
+            request = json.loads(line)
+            op = getattr(self.server, f"op_{request.pop('op', '')}", None)
+            if op is None:
+                raise ValueError("unknown request")
+            op(send, **request)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client hung up; unwinding closed its stream
+        except Exception as e:
+            logging.exception("llm serve request failed")
+            try:
+                send({"error": f"{type(e).__name__}: {e}"})
+            except OSError:
+                pass
+
+
+class Daemon(socketserver.ThreadingUnixStreamServer):
+    """Serves requests on a Unix socket, one thread per connection."""
+
+    daemon_threads = True
+
+    def __init__(self, path: Path = SOCKET_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            if DaemonClient.find(path) is not None:
+                raise RuntimeError(f"llm serve is already running on {path}")
+            path.unlink()  # left behind by a daemon that was killed
+        # Only the owner may connect: requests are sent with their API keys
+        umask = os.umask(0o177)
+        try:
+            super().__init__(str(path), _Handler)
+        finally:
+            os.umask(umask)
+        self.path = path
+        self.config: Dict[str, Any] = {}
+        self.config_mtime: Optional[float] = None
+        # Codebase indexes by prepare_request's key, kept warm across requests
+        self.retrievers: Dict[Any, Any] = {}
+        # Open response caches by TTL (see open_response_cache)
+        self.response_caches: Dict[Optional[float], Any] = {}
+        # Idle providers by (provider, model). Each serves one request at a
+        # time, so its usage and converted history belong to that request.
+        self.providers: Dict[Tuple[str, Optional[str]], List[Any]] = {}
+        # The history each chat session sent last, by session id
+        self.histories: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self._load_config()
+
+    def _load_config(self) -> Dict[str, Any]:
+        """The config, re-read if the file changed since the last request."""
+        from .providers.scheduler import configure_scheduler
+        from .providers.transport import configure_transport
+        from .utils.io_utils import CONFIG_PATH, load_config, setup_logging
+
+        with self.lock:
+            mtime = CONFIG_PATH.stat().st_mtime if CONFIG_PATH.exists() else None
+            if not self.config or mtime != self.config_mtime:
+                first = not self.config
+                self.config = load_config()
+                self.config_mtime = mtime
+                if first:
+                    setup_logging(self.config["logging"])
+                configure_transport(self.config["http"])
+                configure_scheduler(self.config["scheduler"])
+                # Index and cache settings may have changed
+                self.retrievers.clear()
+                self.response_caches.clear()
+                # Providers were scheduled under the old failover settings
+                self.providers = {}
+            return self.config
+
+    @contextmanager
+    def _provider(self, provider: str, model: Optional[str]) -> Iterator[Any]:
+        """A provider for one request, taken from the pool and put back after."""
+        from .providers import PROVIDERS
+        from .providers.scheduler import schedule
+
+        key = (provider, model)
+        with self.lock:
+            # Returned here even if the config is reloaded meanwhile
+            pools = self.providers
+            idle = pools.get(key)
+            llm = idle.pop() if idle else None
+        if llm is None:
+            # Scheduled here, so every client shares the rate limits and breakers
+            llm = schedule(PROVIDERS[provider](model=model), provider)
+        try:
+            yield llm
+        finally:
+            with self.lock:
+                pools.setdefault(key, []).append(llm)
+
+    def _history(self, session: Optional[str], pairs: List[List[str]]) -> List[Any]:
+        """`pairs` as Messages, reusing those `session` sent last time.
+
+        A chat resends its whole history every turn. Passing the provider
+        the same Message objects lets it convert only the new ones (see
+        BaseProvider._native_history).
+        """
+        from .providers.base import Message
+
+        with self.lock:
+            previous = self.histories.pop(session, []) if session else []
+        reused: List[Any] = []
+        # Older messages may have been dropped from the front to fit the window
+        for start in range(len(previous)):
+            tail = previous[start:]
+            if len(tail) <= len(pairs) and all(
+                message.role == role and message.content == content
+                for message, (role, content) in zip(tail, pairs)
+            ):
+                reused = tail
+                break
+        messages = reused + [
+            Message(role, content) for role, content in pairs[len(reused) :]
+        ]
+        if session:
+            with self.lock:
+                self.histories[session] = messages
+                while len(self.histories) > MAX_SESSIONS:
+                    self.histories.popitem(last=False)
+        return messages
+
+    def warm(self) -> List[str]:
+        """Import every provider SDK and build clients for configured keys.
+
+        Returns the providers that are ready.
+        """
+        from .providers import PROVIDERS
+
+        ready = []
+        for name in PROVIDERS:
+            try:
+                PROVIDERS[name]()
+            except (ImportError, ValueError):
+                continue  # SDK not installed or API key not set
+            ready.append(name)
+        return ready
+
+    def serve(self) -> None:
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            self.path.unlink(missing_ok=True)
+            for cache in self.response_caches.values():
+                cache.close()
+
+    # Requests
+
+    def op_ping(self, send: Send) -> None:
+        send({"done": {"pid": os.getpid()}})
+
+    def op_warm(self, send: Send, provider: str, model: Optional[str] = None) -> None:
+        """Open a connection to `provider` ahead of a client's next request."""
+        self._load_config()
+        with self._provider(provider, model) as llm:
+            llm.warm()
+        send({"done": {}})
+
+    def op_query(
+        self,
+        send: Send,
+        provider: str,
+        model: Optional[str],
+        prompt: str,
+        prompt_type: Optional[str] = None,
+        history: Optional[List[List[str]]] = None,
+        context: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        stream: bool = True,
+        session: Optional[str] = None,
+    ) -> None:
+        """One provider call on behalf of a RemoteProvider."""
+        from .providers.prompts import Prompts
+
+        self._load_config()
+        args = (
+            prompt,
+            Prompts(prompt_type) if prompt_type else None,
+            self._history(session, history or []),
+            context,
+        )
+        with self._provider(provider, model) as llm:
+            llm.max_tokens = max_tokens
+            llm.last_usage = None
+            if stream:
+                with closing(llm.query_stream(*args)) as tokens:
+                    for token in tokens:
+                        send({"token": token})
+            else:
+                send({"text": llm.query(*args)})
+            # Read before the provider goes back to the pool
+            usage = llm.last_usage
+        send({"done": {"usage": asdict(usage) if usage is not None else None}})
+
+    def op_ask(
+        self,
+        send: Send,
+        prompt: str,
+        stdin_text: str = "",
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        files: List[str] = (),
+        directory: List[str] = (),
+        codebase: Optional[str] = None,
+        retrieval: str = "embedding",
+        include: List[str] = (),
+        exclude: List[str] = (),
+        cache: Optional[bool] = None,
+        cache_ttl: Optional[float] = None,
+        fanout: List[str] = (),
+        hedge_delay: Optional[float] = None,
+        stats: bool = False,
+        vibe: Optional[str] = None,
+    ) -> None:
+        """A whole `llm ask`: context, retrieval and the answer.
+
+        Paths must be absolute; the daemon doesn't share the client's
+        working directory.
+        """
+        from .chat.ask import run_ask
+        from .main import open_response_cache, prepare_request, resolve_fanout
+        from .utils.io_utils import load_file_context
+        from .utils.metrics import Stopwatch
+
+        def note(message: str) -> None:
+            send({"note": message})
+
+        watch = Stopwatch()
+        config, provider, model, ingest_options, retriever = prepare_request(
+            provider,
+            model,
+            include,
+            exclude,
+            codebase,
+            retrieval,
+            echo=note,
+            watch=watch,
+            config=self._load_config(),
+            retrievers=self.retrievers,
+        )
+        targets, _, hedge_delay = resolve_fanout(config, fanout, True, hedge_delay)
+        with watch.stage("ingest"):
+            file_context = load_file_context(files, directory, ingest_options, echo=note)
+        if stdin_text:
+            file_context += f'<file path="<stdin>">\n{stdin_text}\n</file>\n'
+
+        def forward(tokens, watch: Stopwatch) -> str:
+            parts = []
+            for token in tokens:
+                parts.append(token)
+                with watch.stage("render"):
+                    send({"token": token})
+            return "".join(parts)
+
+        run_ask(
+            provider=provider,
+            model=model,
+            prompt=prompt,
+            file_context=file_context,
+            vibe=vibe,
+            retriever=retriever,
+            max_tokens=config["max_tokens"],
+            response_cache=open_response_cache(
+                config, cache, cache_ttl, self.response_caches
+            ),
+            fanout=targets,
+            hedge_delay=hedge_delay,
+            stats=stats,
+            startup=watch.stages,
+            note=note,
+            render=forward,
+        )
+        send({"done": {}})
@@ -1,16 +1,10 @@
 from typing import List, Optional
 import click
 import logging
-from prompt_toolkit.styles import Style
 
-from .chat.chat import ChatSession, HistoryViewer
-
-from .providers.base import Message
-from .utils.io_utils import (
-    read_directory,
-    setup_logging,
-    get_provider_and_model,
-)
+# Heavy imports (Rich, prompt_toolkit, provider SDKs, the YAML config
+# loader) happen inside the commands that need them so `llm --help`,
+# `llm history` and `llm ask` through `llm serve` start fast.
 
 
 @click.group()
@@ -18,71 +12,574 @@ def cli():
     pass
 
 
+def open_response_cache(
+    config, enabled: Optional[bool], ttl: Optional[float], caches=None
+):
+    """Open the response cache if enabled by flag or config.
+
+    `llm serve` passes a `caches` dict so one connection per TTL is kept
+    open between requests.
+    """
+    settings = config["response_cache"]
+    if enabled is None:
+        enabled = settings.get("enabled", False)
+    if not enabled:
+        return None
+    from .utils.response_cache import ResponseCache
+
+    if caches is None:
+        return ResponseCache.from_config(settings, ttl)
+    cache = caches.get(ttl)
+    if cache is None:
+        cache = caches.setdefault(ttl, ResponseCache.from_config(settings, ttl))
+    return cache
+
+
+def resolve_fanout(config, fanout, hedge: Optional[bool], hedge_delay: Optional[float]):
+    """Merge --fanout/--hedge/--hedge-delay with the `fanout` config section.
+
+    Returns (targets, hedge, hedge_delay).
+    """
+    from .utils.io_utils import parse_targets
+
+    settings = config["fanout"]
+    targets = parse_targets(fanout or settings.get("targets", []), config)
+    if hedge is None:
+        hedge = settings.get("hedge", False)
+    if hedge_delay is None:
+        hedge_delay = settings.get("hedge_delay", 0.0)
+    return targets, hedge, hedge_delay
+
+
+# Options shared by every command that sends a request
+REQUEST_OPTIONS = [
+    click.option("-p", "--provider", help="LLM provider to use"),
+    click.option(
+        "-m",
+        "--model",
+        help="Model to use (e.g., claude-3-7-sonnet-20250219, gemini-1.5-pro)",
+    ),
+    click.option("-f", "--files", help="File to use as context", multiple=True),
+    click.option(
+        "-d",
+        "--directory",
+        help="Directory to use as context, use . for current dir",
+        multiple=True,
+    ),
+    click.option(
+        "-c",
+        "--codebase",
+        help="Directory to index; only the chunks most relevant to each message are sent",
+    ),
+    click.option(
+        "--retrieval",
+        type=click.Choice(["embedding", "bm25"]),
+        default="embedding",
+        help="Retrieval engine used with -c/--codebase",
+    ),
+    click.option(
+        "--include",
+        help="Only read directory files matching this glob (repeatable)",
+        multiple=True,
+    ),
+    click.option(
+        "--exclude",
+        help="Skip directory files matching this glob (repeatable)",
+        multiple=True,
+    ),
+    click.option(
+        "--cache/--no-cache",
+        default=None,
+        help="Reuse cached answers to identical requests (default from config)",
+    ),
+    click.option(
+        "--cache-ttl",
+        type=float,
+        help="Seconds a cached answer stays valid",
+    ),
+    click.option(
+        "--fanout",
+        multiple=True,
+        help="Also send each turn to these provider[:model] targets, comma-separated",
+    ),
+    click.option(
+        "--hedge/--compare",
+        default=None,
+        help="With --fanout, keep the first answer and cancel the rest instead of"
+        " showing all side by side (default from config)",
+    ),
+    click.option(
+        "--hedge-delay",
+        type=float,
+        help="Seconds before hedged backups are started (default 0: all at once)",
+    ),
+    click.option(
+        "--stats",
+        is_flag=True,
+        help="Print latency, throughput and token usage after each answer",
+    ),
+    click.option(
+        "--daemon/--no-daemon",
+        default=None,
+        help="Send the request through `llm serve` (default: whenever it is running)",
+    ),
+    click.option(
+        "-v",
+        "--vibe",
+        help="vibe used for the prompt types, available now: 'primer', 'concise'",
+    ),
+]
+
+
+def find_daemon(daemon: Optional[bool]):
+    """Client for the running `llm serve`; None if it isn't running or --no-daemon."""
+    if daemon is False:
+        return None
+    from .daemon import DaemonClient
+
+    client = DaemonClient.find()
+    if client is None and daemon:
+        raise click.ClickException("llm serve is not running")
+    return client
+
+
+def stdin_is_piped() -> bool:
+    """Whether stdin is a pipe or a file, rather than a terminal or inherited handle.
+
+    A CI runner or a `while read` loop may leave stdin open without meaning
+    it for us; reading it would hang or swallow the loop's input.
+    """
+    import os
+    import stat
+    import sys
+
+    try:
+        mode = os.fstat(sys.stdin.fileno()).st_mode
+    except (AttributeError, OSError, ValueError):
+        # Replaced by an in-memory stream (tests, embedding)
+        return sys.stdin is not None and not sys.stdin.isatty()
+    return stat.S_ISFIFO(mode) or stat.S_ISREG(mode)
+
+
+def request_options(f):
+    for option in reversed(REQUEST_OPTIONS):
+        f = option(f)
+    return f
+
+
+def prepare_request(
+    provider,
+    model,
+    include,
+    exclude,
+    codebase,
+    retrieval,
+    echo=click.echo,
+    watch=None,
+    config=None,
+    retrievers=None,
+):
+    """Load config and resolve everything a request needs before sending it.
+
+    Returns (config, provider, model, ingest options, retriever). Stage
+    timings are added to `watch` when given. `llm serve` passes its loaded
+    `config` and a `retrievers` dict so indexes stay in memory between
+    requests.
+    """
+    from .providers.scheduler import configure_scheduler
+    from .providers.transport import configure_transport
+    from .utils.ingest import IngestOptions
+    from .utils.io_utils import get_provider_and_model, load_config, setup_logging
+    from .utils.metrics import Stopwatch
+
+    watch = watch or Stopwatch()
+    with watch.stage("config"):
+        if config is None:
+            config = load_config()
+            setup_logging(config["logging"])
+            configure_transport(config["http"])
+            configure_scheduler(config["scheduler"])
+        provider, model = get_provider_and_model(provider, model, config)
+        ingest_options = IngestOptions.from_config(
+            config["ingest"], include=include, exclude=exclude
+        )
+
+    retriever = None
+    if codebase:
+        from .utils.retrieval import get_retriever
+
+        with watch.stage("index"):
+            key = (retrieval, codebase, tuple(include or ()), tuple(exclude or ()))
+            retriever = retrievers.get(key) if retrievers is not None else None
+            if retriever is None:
+                retriever = get_retriever(
+                    retrieval, codebase, config["embeddings"], ingest_options
+                )
+                if retrievers is not None:
+                    retrievers[key] = retriever
+            echo(f"Indexed {retriever.refresh()} new chunks from {codebase}")
+    return config, provider, model, ingest_options, retriever
+
+
 @click.command()
-@click.option("-p", "--provider", help="LLM provider to use")
+@request_options
+@click.option("--resume", "resume", type=int, help="Resume the session with this id")
 @click.option(
-    "-m",
-    "--model",
-    help="Model to use (e.g., claude-3-7-sonnet-20250219, gemini-1.5-pro)",
-)
-@click.option("-f", "--files", help="File to use as context", multiple=True)
-@click.option(
-    "-d",
-    "--directory",
-    help="Directory to use as context, use . for current dir",
-    multiple=True,
-)
-@click.option(
-    "-v",
-    "--vibe",
-    help="vibe used for the prompt types, available now: 'primer', 'concise'",
+    "--continue", "continue_", is_flag=True, help="Resume the most recent session"
 )
 def chat(
     provider: Optional[str],
     model: Optional[str],
     files: Optional[List[str]],
     directory: Optional[List[str]],
+    codebase: Optional[str],
+    retrieval: str,
+    include: Optional[List[str]],
+    exclude: Optional[List[str]],
+    cache: Optional[bool],
+    cache_ttl: Optional[float],
+    fanout: List[str],
+    hedge: Optional[bool],
+    hedge_delay: Optional[float],
+    stats: bool,
+    daemon: Optional[bool],
     vibe: Optional[str],
+    resume: Optional[int],
+    continue_: bool,
 ) -> None:
     """Start an interactive chat session with the LLM."""
-    setup_logging()
-    provider, model = get_provider_and_model(provider, model)
+    from .chat.chat import ChatSession
+    from .utils.io_utils import load_file_context
+    from .utils.metrics import Stopwatch
+    from .utils.sessions import SessionStore
+
+    watch = Stopwatch()
+    store = SessionStore()
+    resumed = store.latest() if continue_ else None
+    if resume is not None:
+        resumed = store.get(resume)
+        if resumed is None:
+            raise click.BadParameter(f"no session {resume}", param_hint="--resume")
+    if resumed is not None and not provider:
+        # Carry on with the model the session was started with
+        provider, model = resumed.provider, model or resumed.model
+
+    config, provider, model, ingest_options, retriever = prepare_request(
+        provider, model, include, exclude, codebase, retrieval, watch=watch
+    )
+    targets, hedge, hedge_delay = resolve_fanout(config, fanout, hedge, hedge_delay)
+    with watch.stage("connect"):
+        client = find_daemon(daemon)
 
     # Use vibe from context if not provided directly
     logging.info(f"Using vibe: {vibe}")
 
-    file_context = ""
-    if files:
-        for file in files:
-            try:
-                with open(file, "r") as f:
-                    file_context += f.read()
-            except FileNotFoundError:
-                click.echo(f"Warning: File {file} not found")
+    def load_context() -> str:
+        return load_file_context(files, directory, ingest_options)
 
-    if directory:
-        for d in directory:
-            file_context += read_directory(d)
+    with watch.stage("ingest"):
+        file_context = load_context()
 
     chat_session = ChatSession(
         provider=provider,
         model=model,
         file_context=file_context,
         vibe=vibe,
+        context_loader=load_context if files or directory else None,
+        retriever=retriever,
+        max_tokens=config["max_tokens"],
+        response_cache=open_response_cache(config, cache, cache_ttl),
+        fanout=targets,
+        hedge=hedge,
+        hedge_delay=hedge_delay,
+        sessions=store,
+        session_id=resumed.id if resumed else None,
+        stats=stats,
+        startup=watch.stages,
+        daemon=client,
+        compaction=config["compaction"],
     )
     chat_session.run()
 
 
+@click.command()
+@click.argument("prompt", nargs=-1)
+@request_options
+def ask(
+    prompt: List[str],
+    provider: Optional[str],
+    model: Optional[str],
+    files: Optional[List[str]],
+    directory: Optional[List[str]],
+    codebase: Optional[str],
+    retrieval: str,
+    include: Optional[List[str]],
+    exclude: Optional[List[str]],
+    cache: Optional[bool],
+    cache_ttl: Optional[float],
+    fanout: List[str],
+    hedge: Optional[bool],
+    hedge_delay: Optional[float],
+    stats: bool,
+    daemon: Optional[bool],
+    vibe: Optional[str],
+) -> None:
+    """Answer a single PROMPT and exit.
+
+    The prompt comes from the arguments or, if none are given, from stdin.
+    When both are present, stdin is used as extra context if it is a pipe
+    or file, or if `-` is among the arguments. Output is streamed raw when
+    stdout is not a terminal. --fanout targets are always hedged here since
+    only one answer is printed. While `llm serve` runs, everything but
+    reading stdin and printing happens in the daemon.
+    """
+    import os
+    import sys
+
+    words = [word for word in prompt if word != "-"]
+    text = " ".join(words)
+    if len(words) < len(prompt):
+        read_stdin = True
+    elif text:
+        read_stdin = stdin_is_piped()
+    else:
+        read_stdin = not sys.stdin.isatty()
+    stdin_text = sys.stdin.read() if read_stdin else ""
+    if not text:
+        text, stdin_text = stdin_text.strip(), ""
+    if not text:
+        raise click.UsageError("No prompt given on the command line or stdin")
+
+    client = find_daemon(daemon)
+    if client is not None:
+        from .chat.output import run_remote_ask
+        from .daemon import DaemonError
+
+        # The daemon has its own working directory
+        try:
+            run_remote_ask(
+                client,
+                dict(
+                    prompt=text,
+                    stdin_text=stdin_text,
+                    provider=provider,
+                    model=model,
+                    files=[os.path.abspath(f) for f in files],
+                    directory=[os.path.abspath(d) for d in directory],
+                    codebase=os.path.abspath(codebase) if codebase else None,
+                    retrieval=retrieval,
+                    include=list(include),
+                    exclude=list(exclude),
+                    cache=cache,
+                    cache_ttl=cache_ttl,
+                    fanout=list(fanout),
+                    hedge_delay=hedge_delay,
+                    stats=stats,
+                    vibe=vibe,
+                ),
+            )
+        except DaemonError as e:
+            raise click.ClickException(str(e))
+        return
+
+    from .chat.ask import run_ask
+    from .utils.io_utils import load_file_context
+    from .utils.metrics import Stopwatch
+
+    watch = Stopwatch()
+    config, provider, model, ingest_options, retriever = prepare_request(
+        provider,
+        model,
+        include,
+        exclude,
+        codebase,
+        retrieval,
+        echo=lambda msg: click.echo(msg, err=True),
+        watch=watch,
+    )
+
+    targets, _, hedge_delay = resolve_fanout(config, fanout, hedge, hedge_delay)
+
+    with watch.stage("ingest"):
+        file_context = load_file_context(files, directory, ingest_options)
+    if stdin_text:
+        file_context += f'<file path="<stdin>">\n{stdin_text}\n</file>\n'
+
+    try:
+        run_ask(
+            provider=provider,
+            model=model,
+            prompt=text,
+            file_context=file_context,
+            vibe=vibe,
+            retriever=retriever,
+            max_tokens=config["max_tokens"],
+            response_cache=open_response_cache(config, cache, cache_ttl),
+            fanout=targets,
+            hedge_delay=hedge_delay,
+            stats=stats,
+            startup=watch.stages,
+        )
+    except Exception as e:
+        # Reported like the daemon reports a failed request
+        logging.exception("llm ask request failed")
+        raise click.ClickException(f"{type(e).__name__}: {e}")
+
+
 @click.command()
 @click.option("-n", help="Show the last N logs")
-def history(n: Optional[int]) -> None:
+@click.option("-s", "--search", help="Only show entries matching these words")
+@click.option(
+    "--since", help='Only show entries since a date ("2025-03-01") or age ("3d", "12h")'
+)
+def history(n: Optional[int], search: Optional[str], since: Optional[str]) -> None:
     """View chat history with rich formatting."""
-    viewer = HistoryViewer(n)
+    from .chat.history import HistoryViewer
+
+    try:
+        viewer = HistoryViewer(n, search=search, since=since)
+    except ValueError:
+        raise click.BadParameter(f"can't read {since!r} as a date", param_hint="--since")
     viewer.display()
 
 
+@click.command()
+@click.option("-n", default=20, help="Show the N most recent sessions")
+def sessions(n: int) -> None:
+    """List saved chat sessions, most recent first."""
+    from datetime import datetime
+
+    from .utils.sessions import SessionStore
+
+    for info in SessionStore().list(n):
+        updated = datetime.fromtimestamp(info.updated).strftime("%Y-%m-%d %H:%M")
+        click.secho(
+            f"{info.id:>5}  {updated}  {info.provider}:{info.model}"
+            f"  {info.messages} msgs, ~{info.tokens:,} tokens",
+            bold=True,
+        )
+        click.echo(f"       {info.title}")
+
+
+@click.command()
+@click.option(
+    "--since", help='Only include requests since a date ("2025-03-01") or age ("7d")'
+)
+def stats(since: Optional[str]) -> None:
+    """Latency and throughput percentiles per provider and model."""
+    from datetime import datetime
+
+    from rich.console import Console
+    from rich.table import Table
+
+    from .utils.history_index import parse_since
+    from .utils.metrics import load_metrics, summarize
+
+    cutoff = None
+    if since:
+        try:
+            cutoff = datetime.fromisoformat(parse_since(since)).timestamp()
+        except ValueError:
+            raise click.BadParameter(f"can't read {since!r} as a date", param_hint="--since")
+
+    def seconds(value):
+        return "-" if value is None else f"{value:.2f}"
+
+    table = Table(show_header=True, header_style="bold magenta")
+    for column in (
+        "Provider",
+        "Model",
+        "Requests",
+        "TTFT p50/p95/p99 (s)",
+        "Total p50/p95/p99 (s)",
+        "Tok/s p50",
+        "Cached",
+    ):
+        table.add_column(column)
+    for (provider, model), row in summarize(load_metrics(since=cutoff)).items():
+        table.add_row(
+            provider,
+            model or "-",
+            str(row["count"]),
+            " / ".join(seconds(row[f"ttft_p{p}"]) for p in (50, 95, 99)),
+            " / ".join(seconds(row[f"total_p{p}"]) for p in (50, 95, 99)),
+            "-" if row["tokens_per_s_p50"] is None else f"{row['tokens_per_s_p50']:.0f}",
+            "-" if row["cached_ratio"] is None else f"{row['cached_ratio']:.0%}",
+        )
+    Console().print(table)
+
+
+@click.command()
+@click.argument("query", nargs=-1, required=True)
+@click.option(
+    "-d", "--directory", default=".", help="Directory to search, defaults to ."
+)
+@click.option("-k", "top_k", default=10, help="Number of results to show")
+@click.option(
+    "--mode",
+    type=click.Choice(["bm25", "embedding"]),
+    default="bm25",
+    help="Search engine to use",
+)
+def search(query: List[str], directory: str, top_k: int, mode: str) -> None:
+    """Search a codebase for the chunks most relevant to QUERY."""
+    from .utils.ingest import IngestOptions
+    from .utils.io_utils import load_config
+    from .utils.retrieval import get_retriever
+
+    config = load_config()
+    retriever = get_retriever(
+        mode, directory, config["embeddings"], IngestOptions.from_config(config["ingest"])
+    )
+    retriever.refresh()
+    for chunk, score in retriever.search(" ".join(query), top_k):
+        click.secho(
+            f"{chunk.path}:{chunk.start_line}-{chunk.end_line}  ({score:.3f})",
+            bold=True,
+        )
+        preview = [line for line in chunk.text.splitlines() if line.strip()][:3]
+        for line in preview:
+            click.echo(f"    {line.strip()[:120]}")
+
+
+@click.command()
+def serve() -> None:
+    """Keep config, SDKs, connections and indexes warm for ask and chat.
+
+    Listens on ~/.config/llm_cli/llm.sock until interrupted. While it runs,
+    `llm ask` and `llm chat` send their requests through it (--no-daemon
+    opts out). Requests run with this process's environment, API keys
+    included.
+    """
+    import signal
+    import sys
+
+    from .daemon import Daemon
+
+    try:
+        server = Daemon()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    # Unwind on SIGTERM too, so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    ready = server.warm()
+    click.echo(
+        f"llm serve: listening on {server.path}"
+        f" ({', '.join(ready) or 'no provider API keys set'})"
+    )
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+
+
 cli.add_command(chat)
+cli.add_command(ask)
 cli.add_command(history)
+cli.add_command(sessions)
+cli.add_command(stats)
+cli.add_command(search)
+cli.add_command(serve)
 
 if __name__ == "__main__":
     cli()
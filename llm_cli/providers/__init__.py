@@ -1,11 +1,45 @@
-from .anthropic import AnthropicProvider
-from .deepseek import DeepSeekProvider
-from .gemini import GeminiProvider
-from .openai import OpenAIProvider
-
-PROVIDERS = {
-    "anthropic": AnthropicProvider, 
-    "deepseek": DeepSeekProvider,
-    "gemini": GeminiProvider,
-    "openai": OpenAIProvider
+from collections.abc import Mapping
+from importlib import import_module
+from typing import Dict, Iterator, Type
+
+# Provider name -> "module:ClassName". Each module is only imported (along
+# with its vendor SDK) the first time that provider is looked up.
+PROVIDER_PATHS = {
+    "anthropic": ".anthropic:AnthropicProvider",
+    "deepseek": ".deepseek:DeepSeekProvider",
+    "gemini": ".gemini:GeminiProvider",
+    "openai": ".openai:OpenAIProvider",
 }
+
+
+class LazyProviderRegistry(Mapping):
+    """Mapping of provider names to classes that imports providers on demand."""
+
+    def __init__(self, paths: Dict[str, str]):
+        self._paths = paths
+        self._loaded: Dict[str, Type] = {}
+
+    def __getitem__(self, name: str) -> Type:
+        if name not in self._loaded:
+            module_name, class_name = self._paths[name].split(":")
+            module = import_module(module_name, __name__)
+            self._loaded[name] = getattr(module, class_name)
+        return self._loaded[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._paths)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+
+PROVIDERS = LazyProviderRegistry(PROVIDER_PATHS)
+
+
+def __getattr__(name: str):
+    # Keep `from llm_cli.providers import AnthropicProvider` working without
+    # importing every SDK up front.
+    for key, path in PROVIDER_PATHS.items():
+        if path.endswith(f":{name}"):
+            return PROVIDERS[key]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
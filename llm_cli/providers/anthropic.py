@@ -1,117 +1,230 @@
 import os
-from typing import Optional, List, Generator
-from .base import BaseProvider, Message
-from .prompts import MAIN_PROMPT, REPL, UNIVERSAL_PRIMER, USER_PROMPT, CONCISE, Prompts
-import requests
-import json
+from typing import Any, AsyncGenerator, Dict, Optional, List, Generator
+from .base import BaseProvider, Message, Usage, format_context
+from .prompts import Prompts
+from .sse import ServerSentEvent, SSEDecoder, StreamError
+from .transport import (
+    TRANSPORT_CONFIG,
+    awarm_connection,
+    get_async_httpx_client,
+    get_session,
+    warm_connection,
+)
+
+ANTHROPIC_BASE_URL = "https://api.anthropic.com"
 
 
 class AnthropicProvider(BaseProvider):
     def __init__(self, model=None):
-        self.model = model or "claude-3.7-sonnet"
+        super().__init__(model or "claude-3.7-sonnet")
         self.api_key = os.getenv("ANTHROPIC_API_KEY")
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable not set")
+        # ANTHROPIC_BASE_URL points the provider at a proxy or a local server
+        base_url = os.getenv("ANTHROPIC_BASE_URL") or ANTHROPIC_BASE_URL
+        self.url = base_url.rstrip("/") + "/v1/messages"
+        self.session = get_session(self.url)
 
-    def query(
-        self,
-        prompt: str,
-        prompt_type: Optional[Prompts] = None,
-        message_history: Optional[List[Message]] = None,
-    ) -> str:
-        headers = {
+    def _headers(self) -> Dict[str, str]:
+        return {
             "x-api-key": self.api_key,
             "content-type": "application/json",
             "anthropic-version": "2023-06-01",
         }
 
-        # Build messages array
-        messages = []
-        if message_history:
-            messages.extend(
-                [{"role": msg.role, "content": msg.content}
-                    for msg in message_history]
-            )
+    def warm(self) -> None:
+        warm_connection(self.session, self.url)
+
+    async def awarm(self) -> None:
+        await awarm_connection(get_async_httpx_client(self.url), self.url)
+
+    def _build_request(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts],
+        message_history: Optional[List[Message]],
+        context: Optional[str],
+    ) -> Dict[str, Any]:
+        messages = self._native_history(message_history)
+        if messages and self.prompt_cache:
+            # Cache breakpoint at the end of the history so the next turn
+            # only prefills the new exchange. The cached dict is shared with
+            # later turns, so the marked copy replaces it in this list only.
+            last = messages[-1]
+            messages[-1] = {
+                "role": last["role"],
+                "content": [
+                    {
+                        "type": "text",
+                        "text": last["content"],
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ],
+            }
         messages.append({"role": "user", "content": prompt})
 
         data = {
             "model": self.model,
-            "max_tokens": 2048,
+            "max_tokens": self.output_limit,
             "messages": messages,
         }
 
-        # Set the system prompt based on the prompt_type
-        if prompt_type:
-            prompt_value_map = {
-                "main": MAIN_PROMPT,
-                "primer": UNIVERSAL_PRIMER,
-                "concise": CONCISE,
-                "repl": REPL,
-            }
-            data["system"] = prompt_value_map.get(prompt_type.value, REPL)
+        # Set the system prompt based on the prompt_type, followed by the
+        # file context so it is sent once per request rather than per turn
+        system = []
+        system_prompt = self.system_prompt(prompt_type)
+        if system_prompt:
+            system.append({"type": "text", "text": system_prompt})
+        if context:
+            system.append({"type": "text", "text": format_context(context)})
+        if system:
+            if self.prompt_cache:
+                # Caches the system prompt and file context as one prefix
+                system[-1]["cache_control"] = {"type": "ephemeral"}
+            data["system"] = system
 
-        response = requests.post(
-            "https://api.anthropic.com/v1/messages", headers=headers, json=data
+        return data
+
+    def query(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        data = self._build_request(prompt, prompt_type, message_history, context)
+        self._mark("request")
+
+        response = self.session.post(
+            self.url,
+            headers=self._headers(),
+            json=data,
+            timeout=TRANSPORT_CONFIG.timeout,
         )
         response.raise_for_status()
-        return response.json()["content"][0]["text"]
+        self._mark("response")
+        body = response.json()
+        self.last_usage = self._parse_usage(body.get("usage", {}))
+        self.last_usage.stop_reason = body.get("stop_reason")
+        return body["content"][0]["text"]
 
     def query_stream(
         self,
         prompt: str,
         prompt_type: Optional[Prompts] = None,
         message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
     ) -> Generator[str, None, None]:
-        headers = {
-            "x-api-key": self.api_key,
-            "content-type": "application/json",
-            "anthropic-version": "2023-06-01",
-        }
+        data = self._build_request(prompt, prompt_type, message_history, context)
+        self._mark("request")
+        data["stream"] = True
 
-        messages = []
-        if message_history:
-            messages.extend(
-                [{"role": msg.role, "content": msg.content}
-                    for msg in message_history]
-            )
-        messages.append({"role": "user", "content": prompt})
+        response = self.session.post(
+            self.url,
+            headers=self._headers(),
+            json=data,
+            stream=True,
+            timeout=TRANSPORT_CONFIG.timeout,
+        )
+        # Closing the response on exit (including an early close of this
+        # generator) hands the connection back to the pool
+        with response:
+            response.raise_for_status()
+            self._mark("response")
+            self.last_usage = Usage()
 
-        data = {
-            "model": self.model,
-            "max_tokens": 2048,
-            "stream": True,
-            "messages": messages,
-        }
+            decoder = SSEDecoder()
+            # chunk_size=None hands over bytes as soon as they arrive
+            for chunk in response.iter_content(chunk_size=None):
+                for event in decoder.feed(chunk):
+                    text = self._handle_event(event)
+                    if text:
+                        yield text
 
-        # Set the system prompt based on the prompt_type
-        if prompt_type:
-            prompt_value_map = {
-                "main": MAIN_PROMPT,
-                "primer": UNIVERSAL_PRIMER,
-                "concise": CONCISE,
-                "repl": REPL,
-            }
-            data["system"] = prompt_value_map.get(prompt_type.value, REPL)
+    async def aquery(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        data = self._build_request(prompt, prompt_type, message_history, context)
+        self._mark("request")
 
-        response = requests.post(
-            "https://api.anthropic.com/v1/messages",
-            headers=headers,
-            json=data,
-            stream=True,
+        client = get_async_httpx_client(self.url)
+        response = await client.post(
+            self.url, headers=self._headers(), json=data
         )
         response.raise_for_status()
+        self._mark("response")
+        body = response.json()
+        self.last_usage = self._parse_usage(body.get("usage", {}))
+        self.last_usage.stop_reason = body.get("stop_reason")
+        return body["content"][0]["text"]
 
-        for line in response.iter_lines():
-            if line:
-                line_text = line.decode("utf-8")
-                if not line_text.startswith("data: "):
-                    continue
+    async def aquery_stream(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
+        data = self._build_request(prompt, prompt_type, message_history, context)
+        self._mark("request")
+        data["stream"] = True
 
-                json_str = line_text.replace("data: ", "")
-                json_response = json.loads(json_str)
+        client = get_async_httpx_client(self.url)
+        async with client.stream(
+            "POST", self.url, headers=self._headers(), json=data
+        ) as response:
+            if response.is_error:
+                await response.aread()
+            response.raise_for_status()
+            self._mark("response")
+            self.last_usage = Usage()
 
-                if json_response["type"] == "content_block_delta":
-                    delta = json_response["delta"]
-                    if delta["type"] == "text_delta":
-                        text = delta["text"]
+            decoder = SSEDecoder()
+            async for chunk in response.aiter_bytes():
+                for event in decoder.feed(chunk):
+                    text = self._handle_event(event)
+                    if text:
                         yield text
+
+    def _handle_event(self, event: ServerSentEvent) -> Optional[str]:
+        """Process one event of the stream; returns any text delta.
+
+        Events are told apart by name, so pings and block boundaries are
+        skipped without parsing their JSON. Raises StreamError for an error
+        event (e.g. the API overloaded mid-answer).
+        """
+        name = event.event
+        if name == "content_block_delta":
+            delta = event.json()["delta"]
+            if delta["type"] == "text_delta":
+                return delta["text"]
+        elif name == "message_start":
+            message = event.json()["message"]
+            self.last_usage = self._parse_usage(message.get("usage", {}))
+        elif name == "message_delta":
+            body = event.json()
+            usage = body.get("usage") or {}
+            self.last_usage.output_tokens = usage.get(
+                "output_tokens", self.last_usage.output_tokens
+            )
+            self.last_usage.stop_reason = body.get("delta", {}).get("stop_reason")
+        elif name == "error":
+            error = event.json().get("error", {})
+            raise StreamError(error.get("type", "error"), error.get("message", ""))
+        return None
+
+    @staticmethod
+    def _parse_usage(usage: Dict[str, Any]) -> Usage:
+        cached = usage.get("cache_read_input_tokens") or 0
+        written = usage.get("cache_creation_input_tokens") or 0
+        return Usage(
+            # input_tokens excludes cached reads and writes
+            input_tokens=(usage.get("input_tokens") or 0) + cached + written,
+            output_tokens=usage.get("output_tokens") or 0,
+            cached_tokens=cached,
+            cache_write_tokens=written,
+        )
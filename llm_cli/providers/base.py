@@ -1,18 +1,131 @@
+import hashlib
+import time
 from abc import ABC, abstractmethod
-from typing import Optional, Generator, List
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Dict, Optional, Generator, List
 from enum import Enum
-from .prompts import Prompts
+from .prompts import SYSTEM_PROMPTS, Prompts
 
+# Cap on generated tokens for APIs that require one when max_tokens is unset
+DEFAULT_MAX_TOKENS = 2048
 
+
+def format_context(context: str) -> str:
+    """Wrap file context in the block sent alongside the system prompt."""
+    return f"<files_context>\n{context}\n</files_context>"
+
+
+@dataclass(slots=True)
 class Message:
-    def __init__(self, role: str, content: str):
-        self.role = role
-        self.content = content
+    role: str
+    content: str
+    # Estimated tokens including MESSAGE_OVERHEAD; 0 until counted
+    tokens: int = 0
+
+
+@dataclass
+class Usage:
+    """Token usage reported by the provider for the last request."""
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0  # prompt tokens read from the provider's cache
+    cache_write_tokens: int = 0  # prompt tokens written to the cache
+    stop_reason: Optional[str] = None  # e.g. "max_tokens" when cut off
+
+    @property
+    def cache_hit(self) -> bool:
+        return self.cached_tokens > 0
 
 
 class BaseProvider(ABC):
+    # Requests are laid out as system prompt -> file context -> history so the
+    # stable prefix can be reused by the vendor's prompt cache. Providers with
+    # explicit cache controls honour this flag.
+    prompt_cache = True
+    # Upper bound on generated tokens per request. None leaves it to the
+    # API, or to DEFAULT_MAX_TOKENS where the API requires one.
+    max_tokens: Optional[int] = None
+
     def __init__(self, model=None):
         self.model = model
+        self.last_usage: Optional[Usage] = None
+        # perf_counter() when the last request was built ("request") and
+        # when its response headers arrived ("response")
+        self.last_marks: Dict[str, float] = {}
+        # History already converted by _native_message, kept across turns:
+        # the source messages, their native form and each one's position
+        self._history_src: List[Message] = []
+        self._history_native: List[Any] = []
+        self._history_pos: Dict[int, int] = {}
+
+    @property
+    def output_limit(self) -> int:
+        """The most tokens an answer may take, for requests and budgets."""
+        return self.max_tokens or DEFAULT_MAX_TOKENS
+
+    def _mark(self, event: str) -> None:
+        self.last_marks[event] = time.perf_counter()
+
+    @staticmethod
+    def cache_key(*parts: Optional[str]) -> str:
+        """Stable hash of the parts of a request prefix."""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update((part or "").encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def warm(self) -> None:
+        """Open a pooled connection to the API ahead of the next request.
+
+        Best effort and safe to call from any thread: a failure is left for
+        the real request to report. The default does nothing, for providers
+        whose connections aren't in the shared transport.
+        """
+
+    async def awarm(self) -> None:
+        """`warm` for the async clients used by fan-out and hedging."""
+
+    @staticmethod
+    def system_prompt(prompt_type: Optional[Prompts]) -> Optional[str]:
+        return SYSTEM_PROMPTS.get(prompt_type) if prompt_type else None
+
+    def _native_message(self, message: Message) -> Any:
+        """One history message in the vendor's request format."""
+        return {"role": message.role, "content": message.content}
+
+    def _native_history(self, message_history: Optional[List[Message]]) -> List[Any]:
+        """`message_history` in the vendor's format, converting only new messages.
+
+        A chat session sends the same messages every turn, with new ones
+        appended and old ones dropped from the front to fit the window. The
+        converted list is kept and extended; anything else (a cleared or
+        loaded session) starts it over. The returned list is a fresh copy and
+        may be modified, but its items are shared and must not be.
+        """
+        if not message_history:
+            return []
+        src, native = self._history_src, self._history_native
+        start = self._history_pos.get(id(message_history[0]))
+        if start is None or src[start] is not message_history[0]:
+            start = len(src)  # not seen before: new history or a new session
+        overlap = len(src) - start
+        if overlap and not (
+            overlap <= len(message_history)
+            and message_history[overlap - 1] is src[-1]
+        ):
+            start, overlap = len(src), 0
+        if start == len(src) and src:
+            src.clear()
+            native.clear()
+            self._history_pos.clear()
+            start = 0
+        for message in message_history[overlap:]:
+            self._history_pos[id(message)] = len(src)
+            src.append(message)
+            native.append(self._native_message(message))
+        return native[start:]
 
     @abstractmethod
     def query(
@@ -20,6 +133,7 @@ class BaseProvider(ABC):
         prompt: str,
         prompt_type: Optional[Prompts] = None,
         message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
     ) -> str:
         pass
 
@@ -29,5 +143,30 @@ class BaseProvider(ABC):
         prompt: str,
         prompt_type: Optional[Prompts] = None,
         message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
     ) -> Generator[str, None, None]:
         pass
+
+    @abstractmethod
+    async def aquery(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        pass
+
+    @abstractmethod
+    def aquery_stream(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
+        """Async generator of response tokens.
+
+        Cancelling the consuming task closes the underlying HTTP stream.
+        """
+        pass
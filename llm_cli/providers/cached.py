@@ -0,0 +1,150 @@
+from typing import AsyncGenerator, Generator, List, Optional
+
+from ..utils.response_cache import ResponseCache
+from .base import BaseProvider, Message
+from .fanout import provider_label
+from .prompts import Prompts
+
+# Size of the pieces a cached answer is replayed in through query_stream
+REPLAY_CHUNK_CHARS = 256
+
+
+class CachedProvider(BaseProvider):
+    """Serves repeated requests from a ResponseCache before calling `provider`."""
+
+    def __init__(self, provider: BaseProvider, cache: ResponseCache):
+        super().__init__(provider.model)
+        self.provider = provider
+        self.cache = cache
+
+    @property
+    def max_tokens(self) -> Optional[int]:
+        return self.provider.max_tokens
+
+    @max_tokens.setter
+    def max_tokens(self, value: Optional[int]) -> None:
+        self.provider.max_tokens = value
+
+    def warm(self) -> None:
+        self.provider.warm()
+
+    async def awarm(self) -> None:
+        await self.provider.awarm()
+
+    def _key(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts],
+        message_history: Optional[List[Message]],
+        context: Optional[str],
+    ) -> str:
+        return self.cache.make_key(
+            # The wrapped provider's name, not its wrapper class (scheduled,
+            # hedged or remote), so different providers never share entries
+            provider=provider_label(self.provider),
+            model=self.provider.model,
+            prompt_type=prompt_type.value if prompt_type else None,
+            context=context or "",
+            history=[[m.role, m.content] for m in message_history or []],
+            prompt=prompt,
+            max_tokens=self.provider.max_tokens,
+        )
+
+    def query(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        key = self._key(prompt, prompt_type, message_history, context)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.last_usage = None
+            self.last_marks = {}
+            return cached
+
+        response = self.provider.query(prompt, prompt_type, message_history, context)
+        self.last_usage = self.provider.last_usage
+        self.last_marks = self.provider.last_marks
+        if response:
+            self.cache.put(key, response)
+        return response
+
+    def query_stream(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> Generator[str, None, None]:
+        key = self._key(prompt, prompt_type, message_history, context)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.last_usage = None
+            self.last_marks = {}
+            for start in range(0, len(cached), REPLAY_CHUNK_CHARS):
+                yield cached[start : start + REPLAY_CHUNK_CHARS]
+            return
+
+        parts = []
+        for token in self.provider.query_stream(
+            prompt, prompt_type, message_history, context
+        ):
+            parts.append(token)
+            yield token
+        self.last_usage = self.provider.last_usage
+        self.last_marks = self.provider.last_marks
+        # Only complete streams reach this point; interrupted ones aren't cached
+        if parts:
+            self.cache.put(key, "".join(parts))
+
+    async def aquery(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        key = self._key(prompt, prompt_type, message_history, context)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.last_usage = None
+            self.last_marks = {}
+            return cached
+
+        response = await self.provider.aquery(
+            prompt, prompt_type, message_history, context
+        )
+        self.last_usage = self.provider.last_usage
+        self.last_marks = self.provider.last_marks
+        if response:
+            self.cache.put(key, response)
+        return response
+
+    async def aquery_stream(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
+        key = self._key(prompt, prompt_type, message_history, context)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.last_usage = None
+            self.last_marks = {}
+            for start in range(0, len(cached), REPLAY_CHUNK_CHARS):
+                yield cached[start : start + REPLAY_CHUNK_CHARS]
+            return
+
+        parts = []
+        async for token in self.provider.aquery_stream(
+            prompt, prompt_type, message_history, context
+        ):
+            parts.append(token)
+            yield token
+        self.last_usage = self.provider.last_usage
+        self.last_marks = self.provider.last_marks
+        if parts:
+            self.cache.put(key, "".join(parts))
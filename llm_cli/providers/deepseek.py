@@ -1,8 +1,18 @@
 import os
-from typing import Optional, List, Generator
-from .base import BaseProvider, Message
-from .prompts import MAIN_PROMPT, REPL, UNIVERSAL_PRIMER, USER_PROMPT, CONCISE, Prompts
-from openai import OpenAI
+from typing import AsyncGenerator, Dict, Optional, List, Generator
+from .base import BaseProvider, Message, Usage, format_context
+from .prompts import Prompts
+from .transport import (
+    awarm_connection,
+    get_async_client,
+    get_async_httpx_client,
+    get_client,
+    get_httpx_client,
+    warm_connection,
+)
+from openai import AsyncOpenAI, OpenAI
+
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
 
 
 class DeepSeekProvider(BaseProvider):
@@ -13,46 +23,74 @@ class DeepSeekProvider(BaseProvider):
         if not self.api_key:
             raise ValueError("DEEPSEEK_API_KEY environment variable not set")
 
-        self.client = OpenAI(api_key=self.api_key, base_url="https://api.deepseek.com")
+        # DEEPSEEK_BASE_URL points the provider at a proxy or a local server
+        self.base_url = os.getenv("DEEPSEEK_BASE_URL") or DEEPSEEK_BASE_URL
+        self.client = get_client(
+            ("deepseek", self.api_key, self.base_url),
+            lambda: OpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=get_httpx_client(self.base_url),
+                # Retries are left to providers.scheduler
+                max_retries=0,
+            ),
+        )
 
-    def query(
+    def warm(self) -> None:
+        # The SDK client sends through the pooled httpx client for this host
+        warm_connection(get_httpx_client(self.base_url), self.base_url)
+
+    async def awarm(self) -> None:
+        await awarm_connection(get_async_httpx_client(self.base_url), self.base_url)
+
+    def _limits(self) -> Dict[str, int]:
+        # No cap unless max_tokens is set; the API has its own default
+        return {"max_tokens": self.max_tokens} if self.max_tokens else {}
+
+    def _build_messages(
         self,
         prompt: str,
-        prompt_type: Optional[Prompts] = None,
-        message_history: Optional[List[Message]] = None,
-    ) -> str:
-        # Build messages array
+        prompt_type: Optional[Prompts],
+        message_history: Optional[List[Message]],
+        context: Optional[str],
+    ) -> List[Dict[str, str]]:
         messages = []
+        system_prompt = self.system_prompt(prompt_type)
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
 
-        # Add system message if prompt type is specified
-        if prompt_type:
-            system_content = None
-            match prompt_type:
-                case Prompts.MAIN:
-                    system_content = MAIN_PROMPT
-                case Prompts.UNIVERSAL_PRIMER:
-                    system_content = UNIVERSAL_PRIMER
-                case Prompts.CONCISE:
-                    system_content = CONCISE
-                case Prompts.REPL:
-                    system_content = REPL
-            if system_content:
-                messages.append({"role": "system", "content": system_content})
-
-        # Add message history
-        if message_history:
-            messages.extend(
-                [{"role": msg.role, "content": msg.content} for msg in message_history]
-            )
+        # Add file context once per request, ahead of the history
+        if context:
+            messages.append({"role": "system", "content": format_context(context)})
+
+        # Add message history, converted once per session
+        messages.extend(self._native_history(message_history))
 
         # Add current prompt
         messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def query(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        messages = self._build_messages(prompt, prompt_type, message_history, context)
+        self._mark("request")
 
         # Generate completion
         response = self.client.chat.completions.create(
-            model=self.model, messages=messages, stream=False
+            model=self.model,
+            messages=messages,
+            stream=False,
+            **self._limits(),
         )
 
+        self._mark("response")
+        if response.usage:
+            self.last_usage = self._parse_usage(response.usage)
         return response.choices[0].message.content
 
     def query_stream(
@@ -60,40 +98,98 @@ class DeepSeekProvider(BaseProvider):
         prompt: str,
         prompt_type: Optional[Prompts] = None,
         message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
     ) -> Generator[str, None, None]:
-        # Build messages array
-        messages = []
-
-        # Add system message if prompt type is specified
-        if prompt_type:
-            system_content = None
-            match prompt_type:
-                case Prompts.MAIN:
-                    system_content = MAIN_PROMPT
-                case Prompts.UNIVERSAL_PRIMER:
-                    system_content = UNIVERSAL_PRIMER
-                case Prompts.CONCISE:
-                    system_content = CONCISE
-                case Prompts.REPL:
-                    system_content = REPL
-            if system_content:
-                messages.append({"role": "system", "content": system_content})
-
-        # Add message history
-        if message_history:
-            messages.extend(
-                [{"role": msg.role, "content": msg.content} for msg in message_history]
-            )
-
-        # Add current prompt
-        messages.append({"role": "user", "content": prompt})
+        messages = self._build_messages(prompt, prompt_type, message_history, context)
+        self._mark("request")
 
         # Generate streaming completion
         response = self.client.chat.completions.create(
-            model=self.model, messages=messages, stream=True
+            model=self.model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **self._limits(),
+        )
+
+        self._mark("response")
+
+        # Stream the response; the final chunk carries only usage. Closing
+        # the stream on exit (including an early close of this generator)
+        # hands the connection back to the pool.
+        with response:
+            for chunk in response:
+                if chunk.usage:
+                    self.last_usage = self._parse_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    def _async_client(self) -> AsyncOpenAI:
+        return get_async_client(
+            ("deepseek", self.api_key, self.base_url),
+            lambda: AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=get_async_httpx_client(self.base_url),
+                max_retries=0,
+            ),
+        )
+
+    async def aquery(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        messages = self._build_messages(prompt, prompt_type, message_history, context)
+        self._mark("request")
+
+        response = await self._async_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=False,
+            **self._limits(),
         )
 
-        # Stream the response
-        for chunk in response:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+        self._mark("response")
+        if response.usage:
+            self.last_usage = self._parse_usage(response.usage)
+        return response.choices[0].message.content
+
+    async def aquery_stream(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
+        messages = self._build_messages(prompt, prompt_type, message_history, context)
+        self._mark("request")
+
+        response = await self._async_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **self._limits(),
+        )
+
+        self._mark("response")
+
+        # Closing the stream on exit (including cancellation) frees the connection
+        async with response:
+            async for chunk in response:
+                if chunk.usage:
+                    self.last_usage = self._parse_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    @staticmethod
+    def _parse_usage(usage) -> Usage:
+        # DeepSeek caches prefixes automatically and reports hits separately
+        return Usage(
+            input_tokens=usage.prompt_tokens or 0,
+            output_tokens=usage.completion_tokens or 0,
+            cached_tokens=getattr(usage, "prompt_cache_hit_tokens", None) or 0,
+        )
@@ -0,0 +1,240 @@
+"""Send one turn to several providers concurrently.
+
+`fan_out` streams every provider side by side for comparison.
+`HedgedProvider` races them and keeps whichever answers first, cancelling
+the rest; it is a drop-in `BaseProvider`, so caching and the chat loop work
+unchanged.
+"""
+
+import asyncio
+from typing import (
+    AsyncGenerator,
+    AsyncIterator,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .base import BaseProvider, Message
+from .prompts import Prompts
+from .transport import iterate_sync, run_sync
+
+
+def provider_label(provider: BaseProvider) -> str:
+    """Short "name:model" label used in notes and column headers."""
+    name = getattr(provider, "name", None) or (
+        type(provider).__name__.replace("Provider", "").lower()
+    )
+    return f"{name}:{provider.model}" if provider.model else name
+
+
+async def fan_out(
+    providers: Sequence[BaseProvider],
+    prompt: str,
+    prompt_type: Optional[Prompts] = None,
+    message_history: Optional[List[Message]] = None,
+    context: Optional[str] = None,
+) -> AsyncGenerator[Tuple[int, Union[str, Exception]], None]:
+    """Stream `prompt` to every provider at once.
+
+    Yields (provider index, token) in arrival order. A provider that fails
+    yields (index, exception) once and the others carry on.
+    """
+    events: "asyncio.Queue[Tuple[int, Union[str, Exception, None]]]" = asyncio.Queue()
+
+    async def pump(index: int, provider: BaseProvider) -> None:
+        try:
+            async for token in provider.aquery_stream(
+                prompt, prompt_type, message_history, context
+            ):
+                await events.put((index, token))
+        except Exception as e:
+            await events.put((index, e))
+        finally:
+            await events.put((index, None))
+
+    tasks = [
+        asyncio.create_task(pump(index, provider))
+        for index, provider in enumerate(providers)
+    ]
+    running = len(tasks)
+    try:
+        while running:
+            index, event = await events.get()
+            if event is None:
+                running -= 1
+            else:
+                yield index, event
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class HedgedProvider(BaseProvider):
+    """Races the same request across providers; the first to answer wins.
+
+    Streams are decided by the first token, plain queries by the first
+    complete answer. The first provider starts immediately and the others
+    start `hedge_delay` seconds later (0 starts them all at once), or as soon
+    as an earlier one fails. Losers are cancelled, which closes their HTTP
+    streams. The winner of the last request is kept in `winner`.
+    """
+
+    def __init__(self, providers: Sequence[BaseProvider], hedge_delay: float = 0.0):
+        if not providers:
+            raise ValueError("HedgedProvider needs at least one provider")
+        super().__init__(",".join(provider_label(p) for p in providers))
+        self.providers = list(providers)
+        self.hedge_delay = hedge_delay
+        self.winner: Optional[BaseProvider] = None
+
+    @property
+    def max_tokens(self) -> Optional[int]:
+        limits = [p.max_tokens for p in self.providers if p.max_tokens]
+        return min(limits) if limits else None
+
+    @max_tokens.setter
+    def max_tokens(self, value: Optional[int]) -> None:
+        for provider in self.providers:
+            provider.max_tokens = value
+
+    def warm(self) -> None:
+        # Races run on the background loop, through the async clients
+        run_sync(self.awarm())
+
+    async def awarm(self) -> None:
+        await asyncio.gather(*(p.awarm() for p in self.providers))
+
+    async def _race(self, start) -> Tuple[int, asyncio.Task]:
+        """Start `start(index)` per provider on the hedging schedule.
+
+        Returns the index and finished task of the first to succeed; every
+        other task is cancelled. An empty answer (an empty string, or a
+        stream that ended without a token) only wins once no other provider
+        is left to answer. Raises the last error if all of them fail.
+        """
+        loop = asyncio.get_running_loop()
+        tasks: Dict[asyncio.Task, int] = {}
+        launched = 0
+        next_launch = loop.time()
+        error: Optional[BaseException] = None
+        empty: Optional[Tuple[int, asyncio.Task]] = None
+        try:
+            while True:
+                if launched < len(self.providers) and loop.time() >= next_launch:
+                    tasks[asyncio.create_task(start(launched))] = launched
+                    launched += 1
+                    next_launch = loop.time() + self.hedge_delay
+                    continue
+                if not tasks:
+                    if empty is not None:
+                        return empty
+                    raise error or RuntimeError("no provider answered")
+
+                timeout = None
+                if launched < len(self.providers):
+                    timeout = max(0.0, next_launch - loop.time())
+                done, _ = await asyncio.wait(
+                    tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    index = tasks.pop(task)
+                    failure = task.exception()
+                    if isinstance(failure, StopAsyncIteration) or (
+                        failure is None and not task.result()
+                    ):
+                        empty = empty or (index, task)
+                    elif failure is None:
+                        return index, task
+                    else:
+                        error = failure
+                    # Don't make the next backup wait out the delay
+                    next_launch = loop.time()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def aquery(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        def start(index: int):
+            return self.providers[index].aquery(
+                prompt, prompt_type, message_history, context
+            )
+
+        index, task = await self._race(start)
+        self.winner = self.providers[index]
+        self.last_usage = self.winner.last_usage
+        self.last_marks = self.winner.last_marks
+        return task.result()
+
+    async def aquery_stream(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
+        streams: List[AsyncIterator[str]] = [
+            p.aquery_stream(prompt, prompt_type, message_history, context)
+            for p in self.providers
+        ]
+
+        def start(index: int):
+            return streams[index].__anext__()
+
+        try:
+            index, task = await self._race(start)
+        except BaseException:
+            for stream in streams:
+                await stream.aclose()
+            raise
+        # Losing streams were cancelled mid-read or never started
+        for loser, stream in enumerate(streams):
+            if loser != index:
+                await stream.aclose()
+
+        self.winner = self.providers[index]
+        stream = streams[index]
+        if task.exception() is not None:  # finished first with an empty answer
+            self.last_usage = self.winner.last_usage
+            self.last_marks = self.winner.last_marks
+            return
+        try:
+            yield task.result()
+            async for token in stream:
+                yield token
+        finally:
+            await stream.aclose()
+        self.last_usage = self.winner.last_usage
+        self.last_marks = self.winner.last_marks
+
+    def query(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        return run_sync(self.aquery(prompt, prompt_type, message_history, context))
+
+    def query_stream(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> Generator[str, None, None]:
+        yield from iterate_sync(
+            lambda: self.aquery_stream(prompt, prompt_type, message_history, context)
+        )
@@ -1,10 +1,45 @@
+import logging
 import os
-from typing import Optional, List, Generator
-from .base import BaseProvider, Message
-from .prompts import MAIN_PROMPT, REPL, UNIVERSAL_PRIMER, CONCISE, Prompts
+import time
+from typing import AsyncGenerator, Dict, Optional, List, Generator, Tuple
+from .base import BaseProvider, Message, Usage, format_context
+from .prompts import Prompts
+from .transport import TRANSPORT_CONFIG, get_client, warm_connection
+from ..utils.tokens import estimate_tokens, split_retrieved
 from google import genai
 from google.genai import types
 
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/"
+
+CACHE_TTL_SECONDS = 600
+# Smallest prefix (in tokens) each model accepts for an explicit cache, by
+# model-name prefix; the longest matching prefix wins. Smaller prefixes are
+# sent inline rather than paying for a request that is bound to be rejected.
+MIN_CACHE_TOKENS = {
+    "gemini-1.5": 32_768,
+    "gemini-2.0": 4_096,
+    "gemini-2.5-flash": 1_024,
+    "gemini-2.5-pro": 4_096,
+}
+DEFAULT_MIN_CACHE_TOKENS = 4_096
+
+# A failed cache creation (model without explicit caching, prefix below
+# its minimum, a transient error) sends the context inline for this long
+# before creation is tried again
+CACHE_RETRY_SECONDS = CACHE_TTL_SECONDS
+
+# Explicit context caches shared by every GeminiProvider in the process:
+# prefix hash -> (cache name, or None after a failure, expiry)
+_CONTEXT_CACHES: Dict[str, Tuple[Optional[str], float]] = {}
+
+
+def min_cache_tokens(model: str) -> int:
+    best, size = "", DEFAULT_MIN_CACHE_TOKENS
+    for prefix, tokens in MIN_CACHE_TOKENS.items():
+        if model.startswith(prefix) and len(prefix) > len(best):
+            best, size = prefix, tokens
+    return size
+
 
 class GeminiProvider(BaseProvider):
     def __init__(self, model=None):
@@ -13,51 +48,185 @@ class GeminiProvider(BaseProvider):
         self.api_key = os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY environment variable not set")
-        self.client = genai.Client(api_key=self.api_key)
+        # GEMINI_BASE_URL points the provider at a proxy or a local server
+        self.base_url = os.getenv("GEMINI_BASE_URL") or None
+        self.url = self.base_url or GEMINI_BASE_URL
+        # genai manages its own connection pool; sharing the client keeps it
+        # warm across sessions.
+        self.client = get_client(
+            ("gemini", self.api_key, self.base_url),
+            lambda: genai.Client(
+                api_key=self.api_key,
+                http_options=types.HttpOptions(
+                    base_url=self.base_url,
+                    timeout=int(TRANSPORT_CONFIG.read_timeout * 1000),
+                ),
+            ),
+        )
 
-    def query(
+    def warm(self) -> None:
+        # Not part of genai's public API, so only warmed where it exists
+        pool = getattr(self.client._api_client, "_httpx_client", None)
+        if pool is not None:
+            warm_connection(pool, self.url)
+
+    def _build_request(
         self,
         prompt: str,
-        prompt_type: Optional[Prompts] = None,
-        message_history: Optional[List[Message]] = None,
-    ) -> str:
-        # Convert message history to Gemini format
-        contents = []
-        if message_history:
-            for msg in message_history:
-                role = "user" if msg.role == "user" else "model"
-                contents.append({"role": role, "parts": [{"text": msg.content}]})
-        
+        prompt_type: Optional[Prompts],
+        message_history: Optional[List[Message]],
+        context: Optional[str],
+        cached_content: Optional[str],
+    ) -> Tuple[List[dict], types.GenerateContentConfig]:
+        contents = self._native_history(message_history)
+        parts = [{"text": prompt}]
+
+        system_instruction = self.system_prompt(prompt_type)
+
+        # Prefer an explicit cache holding system prompt + file context, with
+        # the chunks retrieved for this message sent alongside the prompt;
+        # otherwise the context travels with the system instruction
+        if cached_content:
+            system_instruction = None
+            retrieved = split_retrieved(context or "")[1]
+            if retrieved:
+                parts.insert(0, {"text": format_context(retrieved)})
+        elif context:
+            system_instruction = "\n\n".join(
+                filter(None, [system_instruction, format_context(context)])
+            )
+
         # Add current prompt
-        contents.append({"role": "user", "parts": [{"text": prompt}]})
-
-        # Handle system prompt if specified
-        system_instruction = None
-        if prompt_type:
-            match prompt_type:
-                case Prompts.MAIN:
-                    system_instruction = MAIN_PROMPT
-                case Prompts.UNIVERSAL_PRIMER:
-                    system_instruction = UNIVERSAL_PRIMER
-                case Prompts.CONCISE:
-                    system_instruction = CONCISE
-                case Prompts.REPL:
-                    system_instruction = REPL
+        contents.append({"role": "user", "parts": parts})
 
         # Configure generation parameters
         config = types.GenerateContentConfig(
-            max_output_tokens=2048,
+            max_output_tokens=self.output_limit,
             temperature=1.0,
-            system_instruction=system_instruction
+            system_instruction=system_instruction,
+            cached_content=cached_content,
+        )
+        return contents, config
+
+    def _native_message(self, message: Message) -> dict:
+        role = "user" if message.role == "user" else "model"
+        return {"role": role, "parts": [{"text": message.content}]}
+
+    def _cache_lookup(
+        self, system_instruction: Optional[str], context: Optional[str]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """(name of a live cache for this prefix, key to create one under).
+
+        Both are None when the prefix is below the model's minimum or
+        creation failed recently.
+        """
+        if not (self.prompt_cache and context):
+            return None, None
+        prefix = (system_instruction or "") + format_context(context)
+        if estimate_tokens(prefix, "gemini") < min_cache_tokens(self.model):
+            return None, None
+
+        key = self.cache_key(self.model, system_instruction, context)
+        entry = _CONTEXT_CACHES.get(key)
+        if entry is not None:
+            name, expires = entry
+            if name is None:
+                if time.monotonic() < expires:
+                    return None, None
+            # Leave headroom so the cache doesn't expire mid-request
+            elif time.monotonic() < expires - 30:
+                return name, None
+        return None, key
+
+    def _cache_config(
+        self, system_instruction: Optional[str], context: str
+    ) -> types.CreateCachedContentConfig:
+        return types.CreateCachedContentConfig(
+            system_instruction=system_instruction,
+            contents=[
+                types.Content(
+                    role="user",
+                    parts=[types.Part(text=format_context(context))],
+                )
+            ],
+            ttl=f"{CACHE_TTL_SECONDS}s",
         )
 
+    @staticmethod
+    def _remember_cache(key: str, cache) -> Optional[str]:
+        if cache is None:
+            _CONTEXT_CACHES[key] = (None, time.monotonic() + CACHE_RETRY_SECONDS)
+            return None
+        _CONTEXT_CACHES[key] = (cache.name, time.monotonic() + CACHE_TTL_SECONDS)
+        return cache.name
+
+    def _cached_content(
+        self, prompt_type: Optional[Prompts], context: Optional[str]
+    ) -> Optional[str]:
+        """Return the name of a cached content entry for this prefix."""
+        system_instruction = self.system_prompt(prompt_type)
+        # Only the file context: chunks retrieved for each message would
+        # make a new cache every turn
+        context = split_retrieved(context)[0] if context else None
+        name, key = self._cache_lookup(system_instruction, context)
+        if key is None:
+            return name
+        try:
+            cache = self.client.caches.create(
+                model=self.model,
+                config=self._cache_config(system_instruction, context),
+            )
+        except Exception:
+            # Fall back to sending the context inline for a while
+            logging.debug("gemini context cache not created", exc_info=True)
+            cache = None
+        return self._remember_cache(key, cache)
+
+    async def _acached_content(
+        self, prompt_type: Optional[Prompts], context: Optional[str]
+    ) -> Optional[str]:
+        """`_cached_content` without blocking the event loop."""
+        system_instruction = self.system_prompt(prompt_type)
+        context = split_retrieved(context)[0] if context else None
+        name, key = self._cache_lookup(system_instruction, context)
+        if key is None:
+            return name
+        try:
+            cache = await self.client.aio.caches.create(
+                model=self.model,
+                config=self._cache_config(system_instruction, context),
+            )
+        except Exception:
+            logging.debug("gemini context cache not created", exc_info=True)
+            cache = None
+        return self._remember_cache(key, cache)
+
+    def query(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        contents, config = self._build_request(
+            prompt,
+            prompt_type,
+            message_history,
+            context,
+            self._cached_content(prompt_type, context),
+        )
+        self._mark("request")
+
         # Generate content
         response = self.client.models.generate_content(
             model=self.model,
             contents=contents,
             config=config
         )
-        
+
+        self._mark("response")
+        if response.usage_metadata:
+            self.last_usage = self._parse_usage(response.usage_metadata)
         return response.text
 
     def query_stream(
@@ -65,36 +234,16 @@ class GeminiProvider(BaseProvider):
         prompt: str,
         prompt_type: Optional[Prompts] = None,
         message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
     ) -> Generator[str, None, None]:
-        # Convert message history to Gemini format
-        contents = []
-        if message_history:
-            for msg in message_history:
-                role = "user" if msg.role == "user" else "model"
-                contents.append({"role": role, "parts": [{"text": msg.content}]})
-        
-        # Add current prompt
-        contents.append({"role": "user", "parts": [{"text": prompt}]})
-
-        # Handle system prompt if specified
-        system_instruction = None
-        if prompt_type:
-            match prompt_type:
-                case Prompts.MAIN:
-                    system_instruction = MAIN_PROMPT
-                case Prompts.UNIVERSAL_PRIMER:
-                    system_instruction = UNIVERSAL_PRIMER
-                case Prompts.CONCISE:
-                    system_instruction = CONCISE
-                case Prompts.REPL:
-                    system_instruction = REPL
-
-        # Configure generation parameters
-        config = types.GenerateContentConfig(
-            max_output_tokens=2048,
-            temperature=1.0,
-            system_instruction=system_instruction
+        contents, config = self._build_request(
+            prompt,
+            prompt_type,
+            message_history,
+            context,
+            self._cached_content(prompt_type, context),
         )
+        self._mark("request")
 
         # Generate streaming content
         response = self.client.models.generate_content_stream(
@@ -103,7 +252,87 @@ class GeminiProvider(BaseProvider):
             config=config
         )
 
-        # Stream the response
-        for chunk in response:
-            if chunk.text:
-                yield chunk.text
+        # Stream the response; the request is only sent once iteration
+        # starts, so the first chunk marks the response. Closing the stream
+        # on exit (including an early close of this generator) stops the
+        # SDK reading it.
+        first = True
+        try:
+            for chunk in response:
+                if first:
+                    self._mark("response")
+                    first = False
+                if chunk.usage_metadata:
+                    self.last_usage = self._parse_usage(chunk.usage_metadata)
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            response.close()
+
+    async def aquery(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        contents, config = self._build_request(
+            prompt,
+            prompt_type,
+            message_history,
+            context,
+            await self._acached_content(prompt_type, context),
+        )
+        self._mark("request")
+
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=contents,
+            config=config
+        )
+
+        self._mark("response")
+        if response.usage_metadata:
+            self.last_usage = self._parse_usage(response.usage_metadata)
+        return response.text
+
+    async def aquery_stream(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
+        contents, config = self._build_request(
+            prompt,
+            prompt_type,
+            message_history,
+            context,
+            await self._acached_content(prompt_type, context),
+        )
+        self._mark("request")
+
+        response = await self.client.aio.models.generate_content_stream(
+            model=self.model,
+            contents=contents,
+            config=config
+        )
+
+        self._mark("response")
+
+        try:
+            async for chunk in response:
+                if chunk.usage_metadata:
+                    self.last_usage = self._parse_usage(chunk.usage_metadata)
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            await response.aclose()
+
+    @staticmethod
+    def _parse_usage(usage_metadata) -> Usage:
+        return Usage(
+            input_tokens=usage_metadata.prompt_token_count or 0,
+            output_tokens=usage_metadata.candidates_token_count or 0,
+            cached_tokens=usage_metadata.cached_content_token_count or 0,
+        )
@@ -6,6 +6,7 @@ class Prompts(Enum):
     UNIVERSAL_PRIMER = "primer"
     CONCISE = "concise"
     REPL = "repl"
+    COMPACT = "compact"
 
 
 USER_PROMPT = """
@@ -93,3 +94,31 @@ Instructions:
    - The explanation approach you'll use (explanatory or concise)
    - Key points you plan to address in your response
 """
+
+COMPACT = """
+You are summarizing the earlier part of a conversation between a user and an AI assistant in a command line chat, so that it can continue without the full transcript.
+
+Write a summary that lets the assistant pick up where the conversation left off:
+- The user's goals, questions and stated preferences
+- Decisions made, answers given and conclusions reached
+- Names, file paths, commands, code identifiers and numbers that may be referred to again, copied exactly
+- Open questions and anything the assistant promised to do
+
+Write in plain prose or short bullet points, in the third person ("The user asked..."). Leave out greetings and anything that no longer matters. Output only the summary.
+"""
+
+SYSTEM_PROMPTS = {
+    Prompts.MAIN: MAIN_PROMPT,
+    Prompts.UNIVERSAL_PRIMER: UNIVERSAL_PRIMER,
+    Prompts.CONCISE: CONCISE,
+    Prompts.REPL: REPL,
+    Prompts.COMPACT: COMPACT,
+}
+
+
+def prompt_type_for_vibe(vibe=None) -> Prompts:
+    """Map the -v/--vibe option to a prompt type, defaulting to REPL."""
+    prompt_types = {"primer": Prompts.UNIVERSAL_PRIMER, "concise": Prompts.CONCISE}
+    if vibe is None:
+        return Prompts.REPL
+    return prompt_types.get(vibe.lower(), Prompts.REPL)
@@ -0,0 +1,137 @@
+import uuid
+from typing import Any, AsyncGenerator, Dict, Generator, List, Optional
+
+from ..daemon import DaemonClient, DaemonError
+from .base import BaseProvider, Message, Usage
+from .prompts import Prompts
+
+
+class RemoteProvider(BaseProvider):
+    """Sends requests through the `llm serve` daemon.
+
+    The daemon builds the real provider (SDK, API key, pooled connections)
+    on its side; this process never imports the vendor SDK. `name` is the
+    provider the daemon should use. `session` lets the daemon reuse the
+    history it converted for this provider's previous request.
+    """
+
+    def __init__(self, client: DaemonClient, name: str, model=None):
+        super().__init__(model)
+        self.client = client
+        self.name = name
+        self.session = uuid.uuid4().hex
+
+    def warm(self) -> None:
+        # The daemon holds the connections; have it open one for us
+        try:
+            for _ in self.client.stream("warm", provider=self.name, model=self.model):
+                pass
+        except (OSError, DaemonError):
+            pass
+
+    async def awarm(self) -> None:
+        try:
+            async for _ in self.client.astream(
+                "warm", provider=self.name, model=self.model
+            ):
+                pass
+        except (OSError, DaemonError):
+            pass
+
+    def _request(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts],
+        message_history: Optional[List[Message]],
+        context: Optional[str],
+        stream: bool,
+    ) -> Dict[str, Any]:
+        return {
+            "provider": self.name,
+            "model": self.model,
+            "prompt": prompt,
+            "prompt_type": prompt_type.value if prompt_type else None,
+            "history": [[m.role, m.content] for m in message_history or []],
+            "context": context,
+            "max_tokens": self.max_tokens,
+            "stream": stream,
+            "session": self.session,
+        }
+
+    def _finish(self, done: Dict[str, Any]) -> None:
+        usage = done.get("usage")
+        self.last_usage = Usage(**usage) if usage else None
+
+    def query(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        self.last_marks = {}
+        self._mark("request")
+        request = self._request(prompt, prompt_type, message_history, context, False)
+        text = ""
+        for message in self.client.stream("query", **request):
+            if "text" in message:
+                self._mark("response")
+                text = message["text"]
+            elif "done" in message:
+                self._finish(message["done"])
+        return text
+
+    def query_stream(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> Generator[str, None, None]:
+        self.last_marks = {}
+        self._mark("request")
+        request = self._request(prompt, prompt_type, message_history, context, True)
+        for message in self.client.stream("query", **request):
+            if "token" in message:
+                yield message["token"]
+            elif "done" in message:
+                self._finish(message["done"])
+
+    async def aquery(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        self.last_marks = {}
+        self._mark("request")
+        request = self._request(prompt, prompt_type, message_history, context, False)
+        text = ""
+        async for message in self.client.astream("query", **request):
+            if "text" in message:
+                self._mark("response")
+                text = message["text"]
+            elif "done" in message:
+                self._finish(message["done"])
+        return text
+
+    async def aquery_stream(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
+        self.last_marks = {}
+        self._mark("request")
+        request = self._request(prompt, prompt_type, message_history, context, True)
+        messages = self.client.astream("query", **request)
+        try:
+            async for message in messages:
+                if "token" in message:
+                    yield message["token"]
+                elif "done" in message:
+                    self._finish(message["done"])
+        finally:
+            await messages.aclose()
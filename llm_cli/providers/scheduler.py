@@ -0,0 +1,586 @@
+"""Pacing, retries and failover in front of every provider.
+
+Requests to each provider pass through a token bucket for requests and
+tokens per minute, so a batch slows down before the API starts refusing
+it. Transient failures (429, 5xx, overload, dropped connections) are
+retried with exponential backoff and jitter, waiting at least as long as
+the API's Retry-After. A provider that keeps failing trips its circuit
+breaker; requests then go to its configured failover target, or fail fast
+until the breaker lets a trial request through.
+
+Buckets and breakers are shared by every request in the process, which
+under `llm serve` means every client of the daemon.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncGenerator, Dict, Generator, List, Optional, Tuple
+
+from .base import BaseProvider, Message
+from .prompts import Prompts
+
+# Statuses worth retrying: timeouts, conflicts, rate limits, server errors
+# and Anthropic's 529 "overloaded"
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+# Errors raised before a response arrived, matched by class name (anywhere
+# in the MRO) so no SDK has to be imported: requests, httpx and openai
+TRANSIENT_ERRORS = {
+    "ConnectionError",
+    "Timeout",
+    "TransportError",
+    "APIConnectionError",
+}
+# Error events sent in place of the first token (see sse.StreamError)
+TRANSIENT_STREAM_ERRORS = {"overloaded_error", "rate_limit_error", "api_error"}
+
+
+@dataclass
+class SchedulerConfig:
+    enabled: bool = True
+    max_retries: int = 3
+    backoff_base: float = 0.5  # seconds before the first retry, doubled each time
+    backoff_max: float = 30.0
+    # Consecutive failures that open a provider's breaker, and how long it
+    # stays open before a trial request is let through
+    breaker_failures: int = 5
+    breaker_reset: float = 30.0
+    # "provider" or "provider:model" -> {"rpm": requests, "tpm": tokens}
+    # per minute; the more specific entry wins
+    limits: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    # Provider name -> "provider[:model]" to use while it is failing
+    failover: Dict[str, str] = field(default_factory=dict)
+
+
+SCHEDULER_CONFIG = SchedulerConfig()
+
+_lock = threading.Lock()
+_limiters: Dict[str, "RateLimiter"] = {}
+_breakers: Dict[str, "CircuitBreaker"] = {}
+
+
+class CircuitOpenError(Exception):
+    """The provider is failing and there is nowhere else to send the request."""
+
+
+def configure_scheduler(settings: Optional[Dict[str, Any]] = None) -> SchedulerConfig:
+    """Apply the `scheduler` section of the config file.
+
+    Rate limiters are rebuilt so changed limits take effect; breakers keep
+    their state.
+    """
+    known = {f.name for f in fields(SchedulerConfig)}
+    for key, value in (settings or {}).items():
+        if key in ("limits", "failover"):
+            setattr(SCHEDULER_CONFIG, key, dict(value or {}))
+        elif key in known:
+            setattr(SCHEDULER_CONFIG, key, type(getattr(SCHEDULER_CONFIG, key))(value))
+    with _lock:
+        _limiters.clear()
+    return SCHEDULER_CONFIG
+
+
+class TokenBucket:
+    """Allows `rate` units per minute, in bursts of up to a minute's worth.
+
+    `reserve` takes units immediately and returns how long the caller must
+    wait before using them; the balance may go negative, so concurrent
+    callers queue up in order instead of racing for the refill.
+    """
+
+    def __init__(self, rate: float):
+        self.capacity = rate
+        self.per_second = rate / 60.0
+        self.level = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(
+            self.capacity, self.level + (now - self.updated) * self.per_second
+        )
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.level -= amount
+            return max(0.0, -self.level / self.per_second)
+
+    def adjust(self, amount: float) -> None:
+        """Charge (or refund, if negative) units after the fact."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level - amount)
+
+
+class RateLimiter:
+    """The request and token buckets of one provider, plus Retry-After pauses."""
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """Hold every request to this provider for `seconds` (Retry-After)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def reserve(self, tokens: int) -> float:
+        """Seconds to wait before sending a request of about `tokens` tokens."""
+        delay = max(0.0, self.paused_until - time.monotonic())
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Correct the token bucket once the real usage is known."""
+        if self.tokens is not None:
+            self.tokens.adjust(actual - estimated)
+
+
+class CircuitBreaker:
+    """Stops sending to a provider after `failures` consecutive failures.
+
+    Once open, it lets a single trial request through after `reset`
+    seconds; success closes it again, failure re-opens it.
+    """
+
+    def __init__(self, name: str, failures: int, reset: float):
+        self.name = name
+        self.failures = failures
+        self.reset = reset
+        self.count = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.reset:
+                return False
+            self.probing = True
+            return True
+
+    def retry_in(self) -> float:
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.opened_at + self.reset - time.monotonic())
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.count = 0
+            self.opened_at = None
+            self.probing = False
+
+    def release(self) -> None:
+        """Give up a trial request that ended without an outcome (cancelled)."""
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.count += 1
+            if self.probing or self.count >= self.failures:
+                if self.opened_at is None:
+                    logging.warning(
+                        f"{self.name}: circuit opened after {self.count} failures"
+                    )
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+def get_limiter(name: str, model: Optional[str]) -> RateLimiter:
+    """The limiter for `name:model` if it has its own limits, else `name`'s."""
+    key = f"{name}:{model}"
+    if key not in SCHEDULER_CONFIG.limits:
+        key = name
+    with _lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limits = SCHEDULER_CONFIG.limits.get(key) or {}
+            limiter = RateLimiter(limits.get("rpm"), limits.get("tpm"))
+            _limiters[key] = limiter
+        return limiter
+
+
+def get_breaker(name: str, model: Optional[str]) -> CircuitBreaker:
+    key = f"{name}:{model}"
+    with _lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                key, SCHEDULER_CONFIG.breaker_failures, SCHEDULER_CONFIG.breaker_reset
+            )
+            _breakers[key] = breaker
+        return breaker
+
+
+def _status(error: Exception) -> Optional[int]:
+    for attr in ("status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    value = getattr(getattr(error, "response", None), "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def _retry_after(error: Exception) -> float:
+    """The Retry-After of the error's response in seconds, 0 if absent."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return 0.0
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return 0.0
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, AttributeError):
+        return 0.0
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the API asked to wait if `error` is worth retrying, else None.
+
+    0.0 means retryable with no Retry-After given.
+    """
+    status = _status(error)
+    if status is not None:
+        return _retry_after(error) if status in RETRYABLE_STATUS else None
+    if getattr(error, "kind", None) in TRANSIENT_STREAM_ERRORS:
+        return 0.0
+    if any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__):
+        return 0.0
+    return None
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number `attempt`."""
+    cap = min(
+        SCHEDULER_CONFIG.backoff_max,
+        SCHEDULER_CONFIG.backoff_base * 2 ** (attempt - 1),
+    )
+    return random.uniform(0, cap)
+
+
+class _Target:
+    """One provider a ScheduledProvider may send to."""
+
+    def __init__(self, name: str, model: Optional[str], provider=None):
+        self.name = name
+        self.model = model
+        self.provider: Optional[BaseProvider] = provider
+        self.limiter = get_limiter(name, model)
+        self.breaker = get_breaker(name, model)
+        self.unavailable = False
+
+    def build(self) -> Optional[BaseProvider]:
+        """The provider, constructed on first use; None if it can't be."""
+        if self.provider is None and not self.unavailable:
+            from . import PROVIDERS
+
+            try:
+                self.provider = PROVIDERS[self.name](model=self.model)
+            except (ImportError, KeyError, ValueError) as e:
+                logging.warning(f"failover to {self.name} unavailable: {e!r}")
+                self.unavailable = True
+        return self.provider
+
+
+class _Attempts:
+    """Picks the target and delay of each attempt at one request.
+
+    Every attempt returned by `next` must end in `failed`, `succeeded` or
+    `close` (for one that was cancelled), so a breaker's trial request is
+    never left outstanding.
+    """
+
+    def __init__(self, scheduled: "ScheduledProvider", tokens: int):
+        self.scheduled = scheduled
+        self.tokens = tokens
+        self.attempt = 0
+        self.failed_targets: List[_Target] = []
+        self.pending: Optional[_Target] = None
+
+    def next(self) -> Tuple[BaseProvider, float]:
+        """The provider to send the next attempt to, and how long to wait first.
+
+        Prefers the primary, moving to the failover target while the
+        primary's breaker is open or as soon as it fails. A target that
+        already failed this request is retried after a backoff; Retry-After
+        is enforced by its rate limiter.
+        """
+        scheduled = self.scheduled
+        candidates = [scheduled.primary]
+        if scheduled.fallback is not None:
+            candidates.append(scheduled.fallback)
+        # Targets that haven't failed yet first, then the least recent failure
+        failed = self.failed_targets
+        candidates.sort(key=lambda t: (t in failed, bool(failed) and t is failed[-1]))
+        for target in candidates:
+            provider = target.build()
+            if provider is not None and target.breaker.allow():
+                break
+        else:
+            primary = scheduled.primary
+            raise CircuitOpenError(
+                f"{primary.name} is failing; next try in"
+                f" {primary.breaker.retry_in():.0f}s"
+            )
+        provider.max_tokens = scheduled.max_tokens
+        provider.last_usage = None  # left over from its previous request
+        delay = target.limiter.reserve(self.tokens)
+        if target in failed:
+            delay = max(delay, backoff(self.attempt))
+        self.pending = target
+        return provider, delay
+
+    def failed(self, error: Exception) -> None:
+        """Account for a failed attempt; re-raises `error` if it's final."""
+        target, self.pending = self.pending, None
+        wait = retry_after(error)
+        if wait is None:
+            # The API answered; the request itself is at fault
+            target.breaker.record_success()
+            raise error
+        target.breaker.record_failure()
+        if wait:
+            target.limiter.pause(wait)
+        self.attempt += 1
+        if self.attempt > SCHEDULER_CONFIG.max_retries:
+            raise error
+        logging.info(
+            f"retrying after {type(error).__name__} from {target.name}"
+            f" (attempt {self.attempt}/{SCHEDULER_CONFIG.max_retries})"
+        )
+        if target in self.failed_targets:
+            self.failed_targets.remove(target)
+        self.failed_targets.append(target)
+
+    def interrupted(self, error: Exception) -> None:
+        """A stream failed after its first token; it can't be retried."""
+        target, self.pending = self.pending, None
+        if retry_after(error) is not None:
+            target.breaker.record_failure()
+        else:
+            target.breaker.record_success()
+
+    def succeeded(self, provider: BaseProvider) -> None:
+        target, self.pending = self.pending, None
+        target.breaker.record_success()
+        usage = provider.last_usage
+        if usage is not None:
+            target.limiter.settle(self.tokens, usage.input_tokens + usage.output_tokens)
+        scheduled = self.scheduled
+        scheduled.answered_by = provider
+        scheduled.last_usage = provider.last_usage
+        scheduled.last_marks = provider.last_marks
+
+    def close(self) -> None:
+        if self.pending is not None:
+            self.pending.breaker.release()
+            self.pending = None
+
+
+class ScheduledProvider(BaseProvider):
+    """Paces, retries and fails over requests to `provider`.
+
+    Streams are only retried before their first token; once text has been
+    shown, an error is passed on. `answered_by` is the provider that served
+    the last request (the failover target's, if it took over).
+    """
+
+    def __init__(self, provider: BaseProvider, name: str):
+        super().__init__(provider.model)
+        self.provider = provider
+        self.name = name
+        self.primary = _Target(name, provider.model, provider)
+        self.fallback: Optional[_Target] = None
+        spec = SCHEDULER_CONFIG.failover.get(name)
+        if spec:
+            fallback_name, _, fallback_model = spec.partition(":")
+            self.fallback = _Target(fallback_name, fallback_model or None)
+        self.answered_by: Optional[BaseProvider] = None
+
+    @property
+    def max_tokens(self) -> Optional[int]:
+        return self.provider.max_tokens
+
+    @max_tokens.setter
+    def max_tokens(self, value: Optional[int]) -> None:
+        self.provider.max_tokens = value
+
+    @property
+    def failed_over(self) -> bool:
+        return self.answered_by is not None and self.answered_by is not self.provider
+
+    def warm(self) -> None:
+        self.provider.warm()
+
+    async def awarm(self) -> None:
+        await self.provider.awarm()
+
+    def _attempts(
+        self,
+        prompt: str,
+        message_history: Optional[List[Message]],
+        context: Optional[str],
+    ) -> _Attempts:
+        from ..utils.tokens import MESSAGE_OVERHEAD, estimate_tokens
+
+        self.answered_by = None
+        tokens = estimate_tokens(prompt + (context or ""), self.name)
+        for message in message_history or []:
+            tokens += message.tokens or (
+                estimate_tokens(message.content, self.name) + MESSAGE_OVERHEAD
+            )
+        return _Attempts(self, tokens)
+
+    def query(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        attempts = self._attempts(prompt, message_history, context)
+        try:
+            while True:
+                provider, delay = attempts.next()
+                if delay:
+                    time.sleep(delay)
+                try:
+                    text = provider.query(prompt, prompt_type, message_history, context)
+                except Exception as e:
+                    attempts.failed(e)
+                    continue
+                attempts.succeeded(provider)
+                return text
+        finally:
+            attempts.close()
+
+    def query_stream(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> Generator[str, None, None]:
+        attempts = self._attempts(prompt, message_history, context)
+        try:
+            while True:
+                provider, delay = attempts.next()
+                if delay:
+                    time.sleep(delay)
+                stream = provider.query_stream(
+                    prompt, prompt_type, message_history, context
+                )
+                try:
+                    # The request goes out on the first next(); retry until a token
+                    first = next(stream)
+                except StopIteration:
+                    attempts.succeeded(provider)
+                    return
+                except Exception as e:
+                    attempts.failed(e)
+                    continue
+                break
+
+            try:
+                yield first
+                yield from stream
+            except Exception as e:
+                attempts.interrupted(e)
+                raise
+            attempts.succeeded(provider)
+        finally:
+            attempts.close()
+
+    async def aquery(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> str:
+        attempts = self._attempts(prompt, message_history, context)
+        try:
+            while True:
+                provider, delay = attempts.next()
+                if delay:
+                    await asyncio.sleep(delay)
+                try:
+                    text = await provider.aquery(
+                        prompt, prompt_type, message_history, context
+                    )
+                except Exception as e:
+                    attempts.failed(e)
+                    continue
+                attempts.succeeded(provider)
+                return text
+        finally:
+            attempts.close()
+
+    async def aquery_stream(
+        self,
+        prompt: str,
+        prompt_type: Optional[Prompts] = None,
+        message_history: Optional[List[Message]] = None,
+        context: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
+        attempts = self._attempts(prompt, message_history, context)
+        try:
+            while True:
+                provider, delay = attempts.next()
+                if delay:
+                    await asyncio.sleep(delay)
+                stream = provider.aquery_stream(
+                    prompt, prompt_type, message_history, context
+                )
+                try:
+                    first = await stream.__anext__()
+                except StopAsyncIteration:
+                    attempts.succeeded(provider)
+                    return
+                except Exception as e:
+                    await stream.aclose()
+                    attempts.failed(e)
+                    continue
+                break
+
+            try:
+                yield first
+                async for token in stream:
+                    yield token
+            except Exception as e:
+                attempts.interrupted(e)
+                raise
+            finally:
+                # Closing on exit (including cancellation) frees the connection
+                await stream.aclose()
+            attempts.succeeded(provider)
+        finally:
+            attempts.close()
+
+
+def schedule(provider: BaseProvider, name: str) -> BaseProvider:
+    """Wrap `provider` (registered as `name`) in a ScheduledProvider if enabled."""
+    if not SCHEDULER_CONFIG.enabled:
+        return provider
+    return ScheduledProvider(provider, name)
@@ -0,0 +1,82 @@
+"""Incremental server-sent events parser.
+
+Works on raw bytes as they come off the socket, so a chunk boundary can
+fall anywhere (mid-line, mid-UTF-8 sequence) and nothing is decoded until
+an event is complete. Multi-line `data:` fields are joined with newlines,
+comments (": ...") are skipped, and `id:`/`retry:` are ignored since no
+provider stream is resumable. Lines may end in LF, CRLF or CR.
+"""
+
+import json
+from typing import Any, List, NamedTuple, Optional
+
+# json.loads re-checks its arguments on every call and sniffs the encoding
+# of bytes; decoding to str and reusing one decoder is about twice as fast
+_decode_json = json.JSONDecoder().decode
+
+
+class ServerSentEvent(NamedTuple):
+    event: str  # "message" when the stream sends no event: line
+    data: bytes
+
+    def json(self) -> Any:
+        return _decode_json(self.data.decode("utf-8"))
+
+
+class StreamError(Exception):
+    """An error event sent by the provider in the middle of a stream."""
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(f"{kind}: {message}" if message else kind)
+        self.kind = kind
+        self.message = message
+
+
+class SSEDecoder:
+    """Feed it chunks of bytes; get back the events they complete."""
+
+    __slots__ = ("_buffer", "_event", "_data", "_after_cr")
+
+    def __init__(self):
+        self._buffer = b""  # incomplete last line
+        self._event: Optional[bytes] = None
+        self._data: List[bytes] = []
+        self._after_cr = False  # previous chunk ended in CR, maybe of a CRLF
+
+    def feed(self, chunk: bytes) -> List[ServerSentEvent]:
+        if self._after_cr and chunk[:1] == b"\n":
+            chunk = chunk[1:]
+        if not chunk:
+            return []
+        self._after_cr = chunk[-1] == 13
+        if self._buffer:
+            chunk = self._buffer + chunk
+        # splitlines runs in C and treats LF, CRLF and bare CR as line ends,
+        # as the spec requires
+        lines = chunk.splitlines()
+        self._buffer = lines.pop() if chunk[-1] not in (10, 13) else b""
+
+        events: List[ServerSentEvent] = []
+        for line in lines:
+            if not line:
+                # Blank line: dispatch the pending event, if it carried data
+                pending = self._data
+                if pending:
+                    data = pending[0] if len(pending) == 1 else b"\n".join(pending)
+                    name = self._event.decode() if self._event else "message"
+                    events.append(ServerSentEvent(name, data))
+                    self._data = []
+                self._event = None
+            elif line.startswith(b"data: "):
+                self._data.append(line[6:])
+            elif line.startswith(b"event: "):
+                self._event = line[7:]
+            elif line[0] != 58:  # lines starting with ":" are comments
+                field, _, value = line.partition(b":")
+                if value[:1] == b" ":
+                    value = value[1:]
+                if field == b"data":
+                    self._data.append(value)
+                elif field == b"event":
+                    self._event = value
+        return events
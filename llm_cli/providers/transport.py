@@ -0,0 +1,264 @@
+"""Shared, pooled HTTP transport for all providers.
+
+Sessions and SDK clients are created once per host (or per API key) and
+reused across turns and across providers, so follow-up messages reuse a
+warm keep-alive connection instead of paying a fresh TCP+TLS handshake.
+"""
+
+import asyncio
+import queue
+import threading
+import weakref
+from dataclasses import dataclass, fields
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+from urllib.parse import urlsplit
+
+
+@dataclass
+class TransportConfig:
+    connect_timeout: float = 10.0
+    read_timeout: float = 300.0
+    pool_connections: int = 4
+    pool_maxsize: int = 16
+    keepalive_expiry: float = 120.0
+    # Chat re-opens connections idle for longer than this once the user
+    # starts typing; servers drop idle keep-alive connections after a while
+    rewarm_after_idle: float = 30.0
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """(connect, read) tuple in the form `requests` expects."""
+        return (self.connect_timeout, self.read_timeout)
+
+
+TRANSPORT_CONFIG = TransportConfig()
+
+# Re-entrant: client factories call get_httpx_client while holding it
+_lock = threading.RLock()
+_sessions: Dict[str, Any] = {}
+_httpx_clients: Dict[str, Any] = {}
+_clients: Dict[Hashable, Any] = {}
+# Async clients are bound to the event loop that created them
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+T = TypeVar("T")
+
+
+def configure_transport(settings: Optional[Dict[str, Any]] = None) -> TransportConfig:
+    """Apply the `http` section of the config file to the shared transport.
+
+    Only affects sessions and clients created after the call.
+    """
+    known = {f.name for f in fields(TransportConfig)}
+    for key, value in (settings or {}).items():
+        if key in known:
+            setattr(TRANSPORT_CONFIG, key, type(getattr(TRANSPORT_CONFIG, key))(value))
+    return TRANSPORT_CONFIG
+
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url: str):
+    """Return the pooled `requests.Session` for the host serving `url`."""
+    key = _host_key(url)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=TRANSPORT_CONFIG.pool_connections,
+                pool_maxsize=TRANSPORT_CONFIG.pool_maxsize,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[key] = session
+        return session
+
+
+def get_httpx_client(url: str):
+    """Return the pooled `httpx.Client` for the host serving `url`.
+
+    Used as the `http_client` of the OpenAI SDK so OpenAI-compatible
+    providers share connection limits and keep-alive settings.
+    """
+    key = _host_key(url)
+    with _lock:
+        client = _httpx_clients.get(key)
+        if client is None:
+            import httpx
+
+            timeout, limits = _httpx_timeout_and_limits()
+            client = httpx.Client(timeout=timeout, limits=limits)
+            _httpx_clients[key] = client
+        return client
+
+
+def _httpx_timeout_and_limits():
+    import httpx
+
+    timeout = httpx.Timeout(
+        TRANSPORT_CONFIG.read_timeout, connect=TRANSPORT_CONFIG.connect_timeout
+    )
+    limits = httpx.Limits(
+        max_connections=TRANSPORT_CONFIG.pool_maxsize,
+        max_keepalive_connections=TRANSPORT_CONFIG.pool_maxsize,
+        keepalive_expiry=TRANSPORT_CONFIG.keepalive_expiry,
+    )
+    return timeout, limits
+
+
+def warm_connection(client, url: str) -> None:
+    """Leave a keep-alive connection to `url`'s host in `client`'s pool.
+
+    `client` is a `requests.Session` or an `httpx.Client`. A HEAD request
+    pays for DNS, TCP and TLS now instead of on the next real request; its
+    status doesn't matter. Errors are ignored.
+    """
+    try:
+        client.head(url, timeout=TRANSPORT_CONFIG.connect_timeout).close()
+    except Exception:
+        pass
+
+
+async def awarm_connection(client, url: str) -> None:
+    """`warm_connection` for an `httpx.AsyncClient`."""
+    try:
+        await client.head(url, timeout=TRANSPORT_CONFIG.connect_timeout)
+    except Exception:
+        pass
+
+
+def get_async_client(key: Hashable, factory: Callable[[], Any]):
+    """Like `get_client`, but cached per running event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = factory()
+            clients[key] = client
+        return client
+
+
+def get_async_httpx_client(url: str):
+    """Return the pooled `httpx.AsyncClient` for `url`'s host on this loop."""
+
+    def factory():
+        import httpx
+
+        timeout, limits = _httpx_timeout_and_limits()
+        return httpx.AsyncClient(timeout=timeout, limits=limits)
+
+    return get_async_client(("httpx", _host_key(url)), factory)
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """Return the long-lived event loop used to drive async calls from sync code.
+
+    It runs on a daemon thread for the life of the process, so the async
+    clients cached for it keep their connections warm between turns.
+    """
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="llm-cli-async", daemon=True
+            ).start()
+            _loop = loop
+        return _loop
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """Run a coroutine on the background loop and wait for its result."""
+    future = asyncio.run_coroutine_threadsafe(coro, background_loop())
+    try:
+        return future.result()
+    finally:
+        future.cancel()
+
+
+_DONE = object()
+
+
+class _Failure:
+    """Carries an exception from the background loop to the sync consumer."""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def iterate_sync(stream: Callable[[], AsyncIterator[T]]) -> Iterator[T]:
+    """Consume the async iterator built by `stream` from synchronous code.
+
+    Items are handed over through a queue as they arrive. Closing the
+    returned generator early (or an exception in the consumer) cancels the
+    async side, which closes its HTTP streams.
+    """
+    items: "queue.Queue[Any]" = queue.Queue()
+
+    async def pump() -> None:
+        try:
+            async for item in stream():
+                items.put(item)
+        except Exception as e:
+            items.put(_Failure(e))
+        finally:
+            items.put(_DONE)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), background_loop())
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        future.cancel()
+
+
+def get_client(key: Hashable, factory: Callable[[], Any]):
+    """Return a cached SDK client, building it with `factory` on first use."""
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = factory()
+            _clients[key] = client
+        return client
+
+
+def close_all() -> None:
+    """Close every pooled session and client."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        for client in _httpx_clients.values():
+            client.close()
+        _sessions.clear()
+        _httpx_clients.clear()
+        _clients.clear()
+        # Async clients must be closed on their own loop; dropping them lets
+        # the loop's shutdown reclaim the connections
+        _async_clients.clear()
@@ -0,0 +1,173 @@
+"""Lexical codebase search with a BM25-scored inverted index.
+
+The index lives in SQLite next to the embedding index: postings are stored
+clustered by term (WITHOUT ROWID) so a query reads only the posting lists of
+its own terms, and re-indexing touches only files whose content changed.
+"""
+
+import heapq
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from .ingest import IngestOptions, IngestReport, iter_directory
+from .retrieval import (
+    Chunk,
+    chunk_text,
+    file_hash,
+    format_results,
+    index_dir,
+    index_options,
+    load_chunk_text,
+    split_identifiers,
+)
+
+K1 = 1.2
+B = 0.75
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    start_line INTEGER NOT NULL,
+    end_line INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_path ON chunks (path);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    chunk_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk_id);
+"""
+
+
+class BM25Index:
+    """Inverted index over a directory, refreshed incrementally."""
+
+    remote = False
+
+    def __init__(
+        self, root: str, options: Optional[IngestOptions] = None, k: int = 8
+    ):
+        self.root = os.path.abspath(root)
+        self.options = index_options(options)
+        self.k = k
+        path = index_dir(self.root, "bm25")
+        path.mkdir(parents=True, exist_ok=True)
+        # `llm serve` shares one index between its request threads
+        self.conn = sqlite3.connect(str(path / "index.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+
+    def refresh(self) -> int:
+        """Index new and changed files, drop deleted ones; returns chunks indexed."""
+        with self.lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        indexed = dict(self.conn.execute("SELECT path, sha256 FROM files"))
+        seen = set()
+        added = 0
+        report = IngestReport()
+        with self.conn:
+            for file in iter_directory(self.root, self.options, report):
+                seen.add(file.path)
+                sha = file_hash(file.text, file.sha256)
+                if indexed.get(file.path) == sha:
+                    continue
+                self._remove(file.path)
+                for chunk in chunk_text(file.path, file.text, sha):
+                    self._add(chunk)
+                    added += 1
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO files (path, sha256) VALUES (?, ?)",
+                    (file.path, sha),
+                )
+            # Files now over the per-file limit keep their last indexed
+            # version; the rest are deleted, excluded or no longer text
+            for path in indexed.keys() - seen - set(report.oversized):
+                self._remove(path)
+                self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        return added
+
+    def _add(self, chunk: Chunk) -> None:
+        terms = Counter(split_identifiers(chunk.text))
+        cursor = self.conn.execute(
+            "INSERT INTO chunks (path, start_line, end_line, sha256, length)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (
+                chunk.path,
+                chunk.start_line,
+                chunk.end_line,
+                chunk.sha256,
+                sum(terms.values()),
+            ),
+        )
+        self.conn.executemany(
+            "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+            [(term, cursor.lastrowid, tf) for term, tf in terms.items()],
+        )
+
+    def _remove(self, path: str) -> None:
+        self.conn.execute(
+            "DELETE FROM postings WHERE chunk_id IN"
+            " (SELECT id FROM chunks WHERE path = ?)",
+            (path,),
+        )
+        self.conn.execute("DELETE FROM chunks WHERE path = ?", (path,))
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Tuple[Chunk, float]]:
+        with self.lock:
+            hits = self._search(query, k or self.k)
+        results = []
+        for chunk, score in hits:
+            results.append(
+                (load_chunk_text(self.root, chunk, self.options.use_cache), score)
+            )
+        return results
+
+    def _search(self, query: str, k: int) -> List[Tuple[Chunk, float]]:
+        n, avg_len = self.conn.execute(
+            "SELECT COUNT(*), AVG(length) FROM chunks"
+        ).fetchone()
+        if not n:
+            return []
+
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(split_identifiers(query)):
+            rows = self.conn.execute(
+                "SELECT p.chunk_id, p.tf, c.length FROM postings p"
+                " JOIN chunks c ON c.id = p.chunk_id WHERE p.term = ?",
+                (term,),
+            ).fetchall()
+            if not rows:
+                continue
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            for chunk_id, tf, length in rows:
+                norm = K1 * (1 - B + B * length / avg_len)
+                scores[chunk_id] += idf * tf * (K1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        hits = []
+        for chunk_id, score in best:
+            path, start, end, sha = self.conn.execute(
+                "SELECT path, start_line, end_line, sha256 FROM chunks WHERE id = ?",
+                (chunk_id,),
+            ).fetchone()
+            hits.append((Chunk(path, start, end, sha), score))
+        return hits
+
+    def retrieve(self, query: str) -> str:
+        return format_results(self.search(query, self.k))
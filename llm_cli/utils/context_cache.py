@@ -0,0 +1,136 @@
+"""Persistent cache of processed file text.
+
+Files are keyed by absolute path, mtime and size; their text is stored once
+per content hash so unchanged files are served without being read again and
+identical files share storage. Text of deleted files and of versions no file
+has any more is pruned once a day.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+CACHE_PATH = Path.home() / ".config" / "llm_cli" / "cache"
+
+# Seconds between prunes of the cache
+PRUNE_INTERVAL = 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    text TEXT  -- NULL for binary or undecodable content
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+# Sentinel returned by lookup() for files known to be binary
+BINARY = object()
+
+
+class ContextCache:
+    def __init__(self, path: Path = CACHE_PATH / "context.db"):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+
+    def lookup(self, path: str, mtime_ns: int, size: int) -> Tuple[Optional[str], object]:
+        """Return (content hash, text) for an unchanged file.
+
+        Text is `BINARY` for files previously found to be binary, and
+        (None, None) is returned when the file is unknown or has changed.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT b.sha256, b.text FROM files f JOIN blobs b USING (sha256)"
+                " WHERE f.path = ? AND f.mtime_ns = ? AND f.size = ?",
+                (path, mtime_ns, size),
+            ).fetchone()
+        if row is None:
+            return None, None
+        return row[0], BINARY if row[1] is None else row[1]
+
+    def store(self, path: str, mtime_ns: int, size: int, data: bytes, text: Optional[str]) -> str:
+        """Record the processed text of a file; returns its content hash.
+
+        Writes are batched until `commit()`.
+        """
+        sha = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO blobs (sha256, text) VALUES (?, ?)", (sha, text)
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, sha256)"
+                " VALUES (?, ?, ?, ?)",
+                (path, mtime_ns, size, sha),
+            )
+        return sha
+
+    def get_text(self, sha: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT text FROM blobs WHERE sha256 = ?", (sha,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def commit(self) -> None:
+        with self.lock:
+            self.conn.commit()
+
+    def prune(self) -> None:
+        """Drop entries for deleted files and content no file refers to."""
+        with self.lock:
+            paths = [row[0] for row in self.conn.execute("SELECT path FROM files")]
+            gone = [(p,) for p in paths if not os.path.exists(p)]
+            self.conn.executemany("DELETE FROM files WHERE path = ?", gone)
+            self.conn.execute(
+                "DELETE FROM blobs WHERE sha256 NOT IN (SELECT sha256 FROM files)"
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('pruned', ?)",
+                (time.time(),),
+            )
+            self.conn.commit()
+
+    def prune_if_due(self, interval: float = PRUNE_INTERVAL) -> bool:
+        """Prune if the last prune was over `interval` seconds ago."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM meta WHERE key = 'pruned'"
+            ).fetchone()
+        if row is not None and time.time() - row[0] < interval:
+            return False
+        self.prune()
+        return True
+
+
+_default_cache: Optional[ContextCache] = None
+
+
+def get_context_cache() -> Optional[ContextCache]:
+    """Return the shared on-disk cache, or None if it can't be opened."""
+    global _default_cache
+    if _default_cache is None:
+        try:
+            cache = ContextCache()
+            cache.prune_if_due()
+        except (sqlite3.Error, OSError):
+            return None
+        _default_cache = cache
+    return _default_cache
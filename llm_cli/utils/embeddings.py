@@ -0,0 +1,296 @@
+"""Chunking, embedding and top-k retrieval over a codebase.
+
+Files are split into overlapping line windows, embedded with a pluggable
+embedder and stored in a memory-mapped float32 matrix under the cache
+directory. Re-indexing only embeds files whose content hash changed.
+"""
+
+import json
+import os
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .ingest import IngestOptions, IngestReport, iter_directory
+from .retrieval import (
+    Chunk,
+    chunk_text,
+    file_hash,
+    format_results,
+    index_dir,
+    index_options,
+    load_chunk_text,
+    split_identifiers,
+)
+
+
+class Embedder(ABC):
+    """Turns texts into L2-normalised float32 vectors."""
+
+    name: str
+    dim: int
+    # Each embed() is a (paid) API request
+    remote = False
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        pass
+
+
+class HashingEmbedder(Embedder):
+    """Offline embedder: signed feature hashing of words and character trigrams.
+
+    Needs no network or model weights, so `-c` works anywhere; quality is
+    closer to fuzzy lexical matching than to semantic search.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        features = []
+        for token in split_identifiers(text):
+            features.append(token)
+            padded = f"#{token}#"
+            features.extend(padded[i : i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes = np.fromiter(
+                (zlib.crc32(f.encode("utf-8")) for f in self._features(text)),
+                dtype=np.uint64,
+            )
+            if not hashes.size:
+                continue
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+            counts = np.bincount(
+                (hashes % self.dim).astype(np.intp), weights=signs, minlength=self.dim
+            )
+            # Sublinear term frequency
+            matrix[row] = np.sign(counts) * np.log1p(np.abs(counts))
+        return _normalize(matrix)
+
+
+class OpenAIEmbedder(Embedder):
+    """Embeddings from the OpenAI API; requires OPENAI_API_KEY."""
+
+    BATCH_SIZE = 256
+    remote = True
+
+    def __init__(self, model: str = "text-embedding-3-small", dim: int = 1536):
+        from openai import OpenAI
+
+        from ..providers.openai import OPENAI_BASE_URL
+        from ..providers.transport import get_client, get_httpx_client
+
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable not set")
+        self.client = get_client(
+            ("openai", api_key),
+            lambda: OpenAI(
+                api_key=api_key, http_client=get_httpx_client(OPENAI_BASE_URL)
+            ),
+        )
+        self.model = model
+        self.dim = dim
+        self.name = f"openai-{model}-{dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), self.BATCH_SIZE):
+            batch = list(texts[start : start + self.BATCH_SIZE])
+            response = self.client.embeddings.create(
+                model=self.model, input=batch, dimensions=self.dim
+            )
+            for item in response.data:
+                matrix[start + item.index] = item.embedding
+        return _normalize(matrix)
+
+
+EMBEDDERS = {
+    "hashing": HashingEmbedder,
+    "openai": OpenAIEmbedder,
+}
+
+
+def get_embedder(settings: Optional[Dict[str, Any]] = None) -> Embedder:
+    """Build the embedder named in the `embeddings` config section."""
+    settings = dict(settings or {})
+    name = settings.pop("embedder", "hashing")
+    settings.pop("top_k", None)
+    return EMBEDDERS[name](**settings)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def top_k(matrix: np.ndarray, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """Indices and cosine scores of the `k` rows most similar to `query`.
+
+    Rows and query are expected to be L2-normalised.
+    """
+    if matrix.shape[0] == 0:
+        return []
+    scores = matrix @ query
+    k = min(k, scores.shape[0])
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best])]
+    return [(int(i), float(scores[i])) for i in best]
+
+
+class VectorStore:
+    """Chunk metadata (JSON) plus a memory-mapped (rows x dim) float32 matrix."""
+
+    def __init__(self, path: Path, dim: int):
+        self.path = path
+        self.dim = dim
+        self._load()
+
+    @property
+    def _meta_file(self) -> Path:
+        return self.path / "meta.json"
+
+    @property
+    def _vectors_file(self) -> Path:
+        return self.path / "vectors.f32"
+
+    def _load(self) -> None:
+        self.chunks: List[Chunk] = []
+        self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        try:
+            meta = json.loads(self._meta_file.read_text())
+        except (OSError, ValueError):
+            return
+        rows = len(meta.get("chunks") or [])
+        if meta.get("dim") != self.dim or meta.get("rows") != rows or not rows:
+            return
+        # The two files are replaced one after the other; a crash in between
+        # leaves a matrix of the wrong size, and the index is rebuilt
+        try:
+            if self._vectors_file.stat().st_size != rows * self.dim * 4:
+                return
+            vectors = np.memmap(
+                self._vectors_file, dtype=np.float32, mode="r", shape=(rows, self.dim)
+            )
+        except (OSError, ValueError):
+            return
+        self.chunks = [Chunk(**c) for c in meta["chunks"]]
+        self.vectors = vectors
+
+    def file_hashes(self) -> Dict[str, str]:
+        return {c.path: c.sha256 for c in self.chunks}
+
+    def replace(self, keep: np.ndarray, chunks: List[Chunk], vectors: np.ndarray) -> None:
+        """Keep the rows selected by `keep`, append new rows and persist."""
+        kept_chunks = [c for c, k in zip(self.chunks, keep) if k]
+        matrix = np.concatenate([np.asarray(self.vectors)[keep], vectors])
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        tmp = self._vectors_file.with_suffix(".tmp")
+        if len(matrix):
+            out = np.memmap(tmp, dtype=np.float32, mode="w+", shape=matrix.shape)
+            out[:] = matrix
+            out.flush()
+            del out
+        else:
+            tmp.write_bytes(b"")
+        os.replace(tmp, self._vectors_file)
+
+        self.chunks = kept_chunks + [
+            Chunk(c.path, c.start_line, c.end_line, c.sha256) for c in chunks
+        ]
+        meta = {
+            "dim": self.dim,
+            "rows": len(self.chunks),
+            "chunks": [asdict(c) for c in self.chunks],
+        }
+        tmp = self._meta_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self._meta_file)
+        self._load()
+
+
+class CodebaseIndex:
+    """Embedding index over a directory, refreshed incrementally."""
+
+    def __init__(
+        self,
+        root: str,
+        embedder: Optional[Embedder] = None,
+        options: Optional[IngestOptions] = None,
+        k: int = 8,
+    ):
+        self.root = os.path.abspath(root)
+        self.embedder = embedder or HashingEmbedder()
+        self.options = index_options(options)
+        self.k = k
+        self.store = VectorStore(
+            index_dir(self.root, self.embedder.name), self.embedder.dim
+        )
+        # `llm serve` shares one index between its request threads
+        self.lock = threading.Lock()
+
+    @property
+    def remote(self) -> bool:
+        return self.embedder.remote
+
+    def refresh(self) -> int:
+        """Embed new and changed files, drop deleted ones; returns chunks embedded."""
+        with self.lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        indexed = self.store.file_hashes()
+        current: Dict[str, str] = {}
+        new_chunks: List[Chunk] = []
+        report = IngestReport()
+        for file in iter_directory(self.root, self.options, report):
+            sha = file_hash(file.text, file.sha256)
+            current[file.path] = sha
+            if indexed.get(file.path) != sha:
+                new_chunks.extend(chunk_text(file.path, file.text, sha))
+
+        # Files now over the per-file limit keep their last indexed version
+        for path in report.oversized:
+            current.setdefault(path, indexed.get(path))
+        keep = np.array(
+            [current.get(c.path) == c.sha256 for c in self.store.chunks], dtype=bool
+        )
+        if not new_chunks and keep.all():
+            return 0
+        vectors = (
+            self.embedder.embed([c.text for c in new_chunks])
+            if new_chunks
+            else np.zeros((0, self.embedder.dim), dtype=np.float32)
+        )
+        self.store.replace(keep, new_chunks, vectors)
+        return len(new_chunks)
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Tuple[Chunk, float]]:
+        query_vector = self.embedder.embed([query])[0]
+        with self.lock:
+            hits = [
+                (self.store.chunks[row], score)
+                for row, score in top_k(self.store.vectors, query_vector, k or self.k)
+            ]
+        results = []
+        for chunk, score in hits:
+            results.append(
+                (load_chunk_text(self.root, chunk, self.options.use_cache), score)
+            )
+        return results
+
+    def retrieve(self, query: str) -> str:
+        return format_results(self.search(query, self.k))
@@ -0,0 +1,261 @@
+"""Fast access to the monthly JSON chat logs.
+
+`tail_entries` reads log files backwards from the end, newest month first,
+so showing the last few entries costs the same however large the logs get.
+`HistoryIndex` keeps a full-text (FTS5) index of queries and responses that
+catches up with whatever was appended to the logs since its last use.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .context_cache import CACHE_PATH
+from .io_utils import LOGS_PATH
+
+LOG_GLOB = "llm_cli_*.log*"
+# Month file, optionally a rotated piece of it (".1" is the newest piece)
+_LOG_NAME_RE = re.compile(r"^llm_cli_(\d{6})\.log(?:\.(\d+)(?:\.gz)?)?$")
+READ_BLOCK_BYTES = 64 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_files (
+    name TEXT PRIMARY KEY,  -- see _file_key
+    offset INTEGER NOT NULL  -- bytes already indexed
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    level TEXT NOT NULL,
+    query TEXT NOT NULL,
+    response TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_timestamp ON entries (timestamp);
+CREATE INDEX IF NOT EXISTS entries_file ON entries (file);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    query, response, content='entries', content_rowid='id'
+);
+"""
+
+_RELATIVE_RE = re.compile(r"^(\d+)\s*([mhdw])$")
+_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def log_files(logs_path: Path = LOGS_PATH) -> List[Path]:
+    """Monthly log files and their rotated pieces, oldest first."""
+    keyed = []
+    for path in logs_path.glob(LOG_GLOB):
+        match = _LOG_NAME_RE.match(path.name)
+        if match:
+            keyed.append(((match.group(1), -int(match.group(2) or 0)), path))
+    return [path for _, path in sorted(keyed)]
+
+
+def _is_live(path: Path) -> bool:
+    return path.suffix == ".log"
+
+
+def _file_key(path: Path) -> str:
+    """Identity of a log file in the index.
+
+    The live month file is appended to, so it is tracked by name and inode
+    (rotation starts a new file). Rotated pieces are renamed on every
+    rollover, so they are tracked by content.
+    """
+    if _is_live(path):
+        return f"{path.name}:{path.stat().st_ino}"
+    with open(path, "rb") as f:
+        head = f.read(4096)
+    month = path.name.split(".", 1)[0]
+    return f"{month}:{path.stat().st_size}:{hashlib.sha1(head).hexdigest()}"
+
+
+def reverse_lines(path: Path, block_size: int = READ_BLOCK_BYTES) -> Iterator[bytes]:
+    """Yield the lines of `path` from last to first, reading fixed-size blocks.
+
+    Compressed pieces can't be read backwards and are decompressed whole;
+    rotation keeps them bounded in size.
+    """
+    if path.suffix == ".gz":
+        with gzip.open(path, "rb") as f:
+            lines = f.read().split(b"\n")
+        for line in reversed(lines):
+            if line.strip():
+                yield line
+        return
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        remainder = b""
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            lines = (f.read(step) + remainder).split(b"\n")
+            # The first piece may be the end of a line that starts earlier
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line
+        if remainder.strip():
+            yield remainder
+
+
+def _chat_entry(line: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None  # partially written or corrupt line
+    return entry if isinstance(entry, dict) and "query" in entry else None
+
+
+def tail_entries(n: int, logs_path: Path = LOGS_PATH) -> List[Dict[str, Any]]:
+    """The last `n` chat entries across all months, oldest first."""
+    entries: List[Dict[str, Any]] = []
+    for path in reversed(log_files(logs_path)):
+        for line in reverse_lines(path):
+            entry = _chat_entry(line)
+            if entry is not None:
+                entries.append(entry)
+                if len(entries) >= n:
+                    return entries[::-1]
+    return entries[::-1]
+
+
+def parse_since(value: str) -> str:
+    """Turn "2025-03-01", "2025-03-01 14:00" or "3d"/"12h" into a log timestamp."""
+    match = _RELATIVE_RE.match(value.strip())
+    if match:
+        delta = timedelta(**{_UNITS[match.group(2)]: int(match.group(1))})
+        moment = datetime.now() - delta
+    else:
+        moment = datetime.fromisoformat(value.strip())
+    # Same layout as logging.Formatter.formatTime, so strings compare in order
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _match_expression(text: str) -> str:
+    # Quote every term so punctuation in the query isn't read as FTS syntax
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+
+class HistoryIndex:
+    def __init__(
+        self, path: Path = CACHE_PATH / "history.db", logs_path: Path = LOGS_PATH
+    ):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.logs_path = logs_path
+
+    def refresh(self) -> int:
+        """Index log lines appended since the last refresh; returns the count."""
+        offsets = dict(self.conn.execute("SELECT name, offset FROM log_files"))
+        added = 0
+        with self.conn:
+            for path in log_files(self.logs_path):
+                key = _file_key(path)
+                if not _is_live(path):
+                    if key not in offsets:
+                        added += self._index_file(path, key, 0)
+                    continue
+                # What was indexed from a rotated-away file now lives in a
+                # rotated piece, which is indexed under its own key
+                for stale in offsets:
+                    if stale != key and stale.startswith(f"{path.name}:"):
+                        self._forget(stale)
+                offset = offsets.get(key, 0)
+                size = path.stat().st_size
+                if size < offset:  # truncated in place; index it again
+                    self._forget(key)
+                    offset = 0
+                if size > offset:
+                    added += self._index_file(path, key, offset)
+        return added
+
+    def _forget(self, name: str) -> None:
+        # External-content FTS rows must be deleted with their original text
+        self.conn.execute(
+            "INSERT INTO entries_fts (entries_fts, rowid, query, response)"
+            " SELECT 'delete', id, query, response FROM entries WHERE file = ?",
+            (name,),
+        )
+        self.conn.execute("DELETE FROM entries WHERE file = ?", (name,))
+        self.conn.execute("DELETE FROM log_files WHERE name = ?", (name,))
+
+    def _index_file(self, path: Path, key: str, offset: int) -> int:
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        # Leave a trailing partial line for the next refresh
+        end = data.rfind(b"\n") + 1
+        rows = []
+        for line in data[:end].splitlines():
+            entry = _chat_entry(line)
+            if entry is not None:
+                rows.append(
+                    (
+                        key,
+                        entry.get("timestamp", ""),
+                        entry.get("level", ""),
+                        str(entry.get("query", "")),
+                        str(entry.get("response", "")),
+                    )
+                )
+        for row in rows:
+            cursor = self.conn.execute(
+                "INSERT INTO entries (file, timestamp, level, query, response)"
+                " VALUES (?, ?, ?, ?, ?)",
+                row,
+            )
+            self.conn.execute(
+                "INSERT INTO entries_fts (rowid, query, response) VALUES (?, ?, ?)",
+                (cursor.lastrowid, row[3], row[4]),
+            )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO log_files (name, offset) VALUES (?, ?)",
+            (key, offset + end),
+        )
+        return len(rows)
+
+    def search(
+        self, text: Optional[str] = None, since: Optional[str] = None, limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Entries matching `text` (best first) and/or newer than `since`.
+
+        Without `text`, the most recent entries since `since` are returned
+        oldest first.
+        """
+        self.refresh()
+        where, params = [], []
+        if since:
+            where.append("e.timestamp >= ?")
+            params.append(since)
+        if text:
+            where.append("entries_fts MATCH ?")
+            params.append(_match_expression(text))
+            sql = (
+                "SELECT e.timestamp, e.level, e.query, e.response FROM entries_fts"
+                " JOIN entries e ON e.id = entries_fts.rowid"
+                f" WHERE {' AND '.join(where)} ORDER BY entries_fts.rank LIMIT ?"
+            )
+        else:
+            sql = (
+                "SELECT e.timestamp, e.level, e.query, e.response FROM entries e"
+                f"{' WHERE ' + ' AND '.join(where) if where else ''}"
+                " ORDER BY e.timestamp DESC, e.id DESC LIMIT ?"
+            )
+        rows = self.conn.execute(sql, (*params, limit)).fetchall()
+        if not text:
+            rows.reverse()
+        columns = ("timestamp", "level", "query", "response")
+        return [dict(zip(columns, row)) for row in rows]
@@ -0,0 +1,348 @@
+"""Parallel, bounded directory ingestion.
+
+Walks a tree with `os.scandir`, applies default excludes, `.gitignore` rules
+and include/exclude globs, skips binaries by sniffing their content, and
+reads files on a thread pool while yielding them in a stable order within
+per-file and total byte budgets.
+"""
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from fnmatch import fnmatch
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .context_cache import BINARY, get_context_cache
+
+DEFAULT_EXCLUDES = [
+    ".git",
+    ".hg",
+    ".svn",
+    "node_modules",
+    "__pycache__",
+    ".venv",
+    "venv",
+    ".tox",
+    ".nox",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+    # Build output only at the top of the tree; src/build/ may be real code
+    "/dist/",
+    "/build/",
+    "/target/",
+    "*.egg-info",
+    "*.pyc",
+    "*.pyo",
+    "*.so",
+    "*.dll",
+    "*.dylib",
+    "*.bin",
+    "*.lock",
+    ".DS_Store",
+]
+
+# Bytes inspected to decide whether a file is binary
+SNIFF_BYTES = 8192
+
+
+@dataclass
+class IngestOptions:
+    include: Sequence[str] = ()
+    exclude: Sequence[str] = ()
+    use_gitignore: bool = True
+    max_file_bytes: int = 512 * 1024
+    max_total_bytes: int = 8 * 1024 * 1024
+    workers: int = 8
+    # Serve unchanged files from the persistent context cache
+    use_cache: bool = True
+
+    @classmethod
+    def from_config(cls, settings: Optional[Dict[str, Any]] = None, **overrides):
+        """Build options from the `ingest` config section plus CLI overrides."""
+        known = {f.name for f in fields(cls)}
+        values = {k: v for k, v in (settings or {}).items() if k in known}
+        values.update({k: v for k, v in overrides.items() if v})
+        return cls(**values)
+
+
+@dataclass
+class FileChunk:
+    path: str  # path relative to the ingested root
+    text: str
+    sha256: Optional[str] = None  # content hash, when the cache is enabled
+
+
+@dataclass
+class IngestReport:
+    """What the byte budgets left out of an ingestion."""
+
+    oversized: List[str] = field(default_factory=list)  # over max_file_bytes
+    # Files left out once max_total_bytes was reached, and their size
+    dropped_files: int = 0
+    dropped_bytes: int = 0
+
+    def warnings(self, root: str, options: "IngestOptions") -> List[str]:
+        lines = []
+        if self.oversized:
+            names = ", ".join(self.oversized[:3])
+            if len(self.oversized) > 3:
+                names += f" and {len(self.oversized) - 3} more"
+            lines.append(
+                f"Warning: Skipped {_files(len(self.oversized))} in {root} over "
+                f"the {_size(options.max_file_bytes)} per-file limit: {names}"
+            )
+        if self.dropped_files:
+            lines.append(
+                f"Warning: Left out {_files(self.dropped_files)} "
+                f"({_size(self.dropped_bytes)}) of {root} past the "
+                f"{_size(options.max_total_bytes)} context limit; narrow it "
+                "with --include/--exclude"
+            )
+        return lines
+
+
+def _files(n: int) -> str:
+    return f"{n} file" if n == 1 else f"{n} files"
+
+
+def _size(n: int) -> str:
+    if n >= 1024 * 1024:
+        return f"{n / (1024 * 1024):.1f} MB"
+    return f"{n / 1024:.0f} KB"
+
+
+@dataclass
+class _Rule:
+    base: str  # directory (relative to root) holding the .gitignore
+    pattern: str
+    negate: bool = False
+    dir_only: bool = False
+    anchored: bool = False
+
+
+@dataclass
+class IgnoreRules:
+    """A small subset of .gitignore semantics, evaluated last-match-wins."""
+
+    rules: List[_Rule] = field(default_factory=list)
+
+    def add_patterns(self, patterns: Sequence[str], base: str = "") -> None:
+        for raw in patterns:
+            line = raw.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if line.startswith("**/"):
+                line = line[3:]
+            anchored = "/" in line
+            self.rules.append(
+                _Rule(base, line.lstrip("/"), negate, dir_only, anchored)
+            )
+
+    def add_gitignore(self, path: str, base: str) -> None:
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                self.add_patterns(f.readlines(), base)
+        except OSError:
+            pass
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        result = False
+        name = rel_path.rsplit("/", 1)[-1]
+        for rule in self.rules:
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.base:
+                if not rel_path.startswith(rule.base + "/"):
+                    continue
+                target = rel_path[len(rule.base) + 1 :]
+            else:
+                target = rel_path
+            if fnmatch(target if rule.anchored else name, rule.pattern):
+                result = not rule.negate
+        return result
+
+
+def is_binary(sample: bytes) -> bool:
+    """Guess whether `sample` (the start of a file) is binary data."""
+    if b"\0" in sample:
+        return True
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is fine
+        return e.start < len(sample) - 4
+    return False
+
+
+def walk_files(
+    root: str, options: IngestOptions, report: Optional[IngestReport] = None
+) -> Iterator[Tuple[str, str, os.stat_result]]:
+    """Yield (absolute path, relative path, stat) for every candidate file.
+
+    Files over the per-file limit are skipped and noted in `report`.
+    """
+    ignore = IgnoreRules()
+    ignore.add_patterns(DEFAULT_EXCLUDES)
+    ignore.add_patterns(options.exclude)
+    include = list(options.include)
+
+    stack = [(os.path.abspath(root), "")]
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        if options.use_gitignore:
+            ignore.add_gitignore(os.path.join(dir_path, ".gitignore"), rel_dir)
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except (PermissionError, OSError):
+            continue
+
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                # Don't follow symlinked directories to avoid cycles
+                if entry.is_dir(follow_symlinks=False):
+                    if not ignore.ignored(rel_path, is_dir=True):
+                        subdirs.append((entry.path, rel_path))
+                    continue
+                if not entry.is_file():
+                    continue
+                if ignore.ignored(rel_path, is_dir=False):
+                    continue
+                if include and not any(
+                    fnmatch(rel_path, p) or fnmatch(entry.name, p) for p in include
+                ):
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            if st.st_size > options.max_file_bytes:
+                logging.info(
+                    f"Skipping {rel_path}: {st.st_size} bytes exceeds per-file cap"
+                )
+                if report is not None:
+                    report.oversized.append(rel_path)
+                continue
+            yield entry.path, rel_path, st
+
+        # Reversed so the stack pops directories in name order
+        stack.extend(reversed(subdirs))
+
+
+def _read_text(path: str) -> Tuple[Optional[bytes], Optional[str]]:
+    """Return (raw bytes, text); text is None for binary files."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None, None
+    if is_binary(data[:SNIFF_BYTES]):
+        return data, None
+    return data, data.decode("utf-8", errors="replace")
+
+
+def read_file(path: str, use_cache: bool = True) -> Optional[str]:
+    """Read a single text file through the context cache.
+
+    Raises FileNotFoundError for missing files and returns None for binaries.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    cache = get_context_cache() if use_cache else None
+    if cache is not None:
+        _, text = cache.lookup(path, st.st_mtime_ns, st.st_size)
+        if text is BINARY:
+            return None
+        if text is not None:
+            return text
+
+    data, text = _read_text(path)
+    if cache is not None and data is not None:
+        cache.store(path, st.st_mtime_ns, st.st_size, data, text)
+        cache.commit()
+    return text
+
+
+def iter_directory(
+    root: str,
+    options: Optional[IngestOptions] = None,
+    report: Optional[IngestReport] = None,
+) -> Iterator[FileChunk]:
+    """Stream the text files under `root` as chunks, in path order.
+
+    At most `workers * 4` reads are in flight at once, so memory stays
+    bounded no matter how large the tree is. Files left out by the byte
+    budgets are counted in `report`, when given.
+    """
+    options = options or IngestOptions()
+    cache = get_context_cache() if options.use_cache else None
+    total = 0
+    window = max(1, options.workers) * 4
+    # (relative path, absolute path, stat, content hash, read or cached text)
+    pending: Deque[Tuple[str, str, os.stat_result, Optional[str], Any]] = deque()
+
+    with ThreadPoolExecutor(max_workers=max(1, options.workers)) as pool:
+        files = walk_files(root, options, report)
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < window:
+                    try:
+                        path, rel_path, st = next(files)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    sha, text = None, None
+                    if cache is not None:
+                        sha, text = cache.lookup(path, st.st_mtime_ns, st.st_size)
+                    if text is None:
+                        text = pool.submit(_read_text, path)
+                    pending.append((rel_path, path, st, sha, text))
+                if not pending:
+                    return
+
+                rel_path, path, st, sha, text = pending.popleft()
+                if isinstance(text, Future):
+                    data, text = text.result()
+                    if cache is not None and data is not None:
+                        sha = cache.store(
+                            path, st.st_mtime_ns, st.st_size, data, text
+                        )
+                if text is None or text is BINARY:
+                    continue
+
+                size = len(text.encode("utf-8"))
+                if total + size > options.max_total_bytes:
+                    logging.info(
+                        f"Stopping ingestion of {root}: total budget of "
+                        f"{options.max_total_bytes} bytes reached"
+                    )
+                    for *_, item in pending:
+                        if isinstance(item, Future):
+                            item.cancel()
+                    if report is not None:
+                        # Sized from stat; the rest of the tree isn't read
+                        report.dropped_files = 1 + len(pending)
+                        report.dropped_bytes = size + sum(p[2].st_size for p in pending)
+                        for _, _, st in files:
+                            report.dropped_files += 1
+                            report.dropped_bytes += st.st_size
+                    return
+                total += size
+                yield FileChunk(rel_path, text, sha)
+        finally:
+            if cache is not None:
+                cache.commit()
+
+
+def format_chunk(chunk: FileChunk) -> str:
+    return f'<file path="{chunk.path}">\n{chunk.text}\n</file>\n'
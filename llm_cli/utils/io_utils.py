@@ -1,19 +1,48 @@
+import atexit
+import copy
+import gzip
+import hashlib
 import json
 import logging
+import queue
+import shutil
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import click
 import yaml
-from rich.syntax import Syntax
+
+from .ingest import (
+    FileChunk,
+    IngestOptions,
+    IngestReport,
+    format_chunk,
+    iter_directory,
+    read_file,
+)
 
 
 CONFIG_PATH = Path.home() / ".config" / "llm_cli" / "config.yml"
 LOGS_PATH = Path.home() / ".config" / "llm_cli" / "logs"
+# File contexts referenced from log entries, one file per content hash
+CONTEXTS_PATH = LOGS_PATH / "contexts"
 
 
 class JsonFormatter(logging.Formatter):
+    """One JSON object per line.
+
+    With `contexts_path` set, a record's file context is written once to
+    `contexts_path/<sha256>.txt` and the record keeps only `context_sha`, so
+    logs don't grow by the full context on every turn.
+    """
+
+    def __init__(self, contexts_path: Optional[Path] = None):
+        super().__init__()
+        self.contexts_path = contexts_path
+
     def format(self, record):
         log_record = {
             "timestamp": self.formatTime(record, self.datefmt),
@@ -22,18 +51,67 @@ class JsonFormatter(logging.Formatter):
         if isinstance(record.msg, dict):
             # Merge dictionary messages into the log record
             log_record.update(record.msg)
+            if self.contexts_path is not None and log_record.get("context"):
+                log_record["context_sha"] = self._store_context(
+                    log_record.pop("context")
+                )
         else:
             # Handle regular string messages
             log_record["message"] = record.getMessage()
         return json.dumps(log_record)
 
+    def _store_context(self, context: str) -> str:
+        data = context.encode("utf-8")
+        sha = hashlib.sha256(data).hexdigest()
+        path = self.contexts_path / f"{sha}.txt"
+        if not path.exists():
+            self.contexts_path.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        return sha
+
+
+class _DeferredQueueHandler(QueueHandler):
+    # The stock handler formats in the caller's thread; leave all of it,
+    # including JSON encoding and context storage, to the listener
+    def prepare(self, record):
+        return copy.copy(record)
+
 
-def setup_logging():
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def setup_logging(settings: Optional[Dict[str, Any]] = None):
+    """Log JSON lines to this month's file from a background thread.
+
+    `settings` is the `logging` config section: max_mb (size at which the
+    month's file is rotated, 0 to never rotate), backups (rotated files
+    kept) and compress (gzip rotated files).
+    """
+    settings = settings or {}
     LOGS_PATH.mkdir(parents=True, exist_ok=True)
     log_file = LOGS_PATH / f"llm_cli_{datetime.now().strftime('%Y%m')}.log"
-    handler = logging.FileHandler(log_file)
-    handler.setFormatter(JsonFormatter())
-    logging.basicConfig(level=logging.INFO, handlers=[handler])
+    handler = RotatingFileHandler(
+        log_file,
+        maxBytes=int(settings.get("max_mb", 64) * 1024 * 1024),
+        backupCount=int(settings.get("backups", 10)),
+        encoding="utf-8",
+    )
+    if settings.get("compress", True):
+        handler.namer = lambda name: name + ".gz"
+        handler.rotator = _gzip_rotator
+    handler.setFormatter(JsonFormatter(CONTEXTS_PATH))
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    # Drain whatever is still queued before the process exits
+    atexit.register(listener.stop)
+    logging.basicConfig(level=logging.INFO, handlers=[_DeferredQueueHandler(log_queue)])
 
 
 def load_config():
@@ -45,6 +123,38 @@ def load_config():
             "deepseek": "deepseek-chat",
             "openai": "o3-mini-2025-01-31",
         },
+        # Connection pool / timeout settings for the shared HTTP transport
+        "http": {},
+        # Limits for -d directory ingestion (see utils.ingest.IngestOptions)
+        "ingest": {},
+        # Retrieval for -c/--codebase: embedder ("hashing" or "openai"), top_k
+        "embeddings": {"embedder": "hashing", "top_k": 8},
+        # Upper bound on generated tokens. Unset, Anthropic and Gemini are
+        # capped at 2048 and OpenAI and DeepSeek at the API's own limit; 2048
+        # is reserved out of the window either way
+        "max_tokens": None,
+        # Opt-in cache of complete responses: enabled, ttl (seconds), max_mb
+        "response_cache": {"enabled": False},
+        # Extra "provider:model" targets for each turn; hedge races them
+        # instead of comparing, backups start hedge_delay seconds late
+        "fanout": {"targets": [], "hedge": False, "hedge_delay": 0.0},
+        # Rotate the month's log at max_mb, keep `backups` gzipped pieces
+        "logging": {"max_mb": 64, "backups": 10, "compress": True},
+        # Opt-in: summarize older chat turns once the history passes
+        # `threshold` tokens, keeping the newest `keep_recent` messages
+        # verbatim. The transcript is sent to `target` ("provider[:model]"),
+        # by default a cheap model of the chat's provider
+        "compaction": {
+            "enabled": False,
+            "threshold": 16_000,
+            "keep_recent": 4,
+            "target": None,
+            "max_tokens": 1024,
+        },
+        # Pacing and retries in front of every provider. limits: {"provider"
+        # or "provider:model": {rpm, tpm}}; failover: {provider: "provider[:model]"}
+        # used while it fails (see providers.scheduler.SchedulerConfig)
+        "scheduler": {"enabled": True, "max_retries": 3, "limits": {}, "failover": {}},
     }
     if not CONFIG_PATH.exists():
         return default_config
@@ -53,6 +163,15 @@ def load_config():
     # Ensure defaults are present even if config file exists
     config.setdefault("provider", default_config["provider"])
     config.setdefault("provider_defaults", default_config["provider_defaults"])
+    config.setdefault("http", default_config["http"])
+    config.setdefault("ingest", default_config["ingest"])
+    config.setdefault("embeddings", default_config["embeddings"])
+    config.setdefault("max_tokens", default_config["max_tokens"])
+    config.setdefault("response_cache", default_config["response_cache"])
+    config.setdefault("fanout", default_config["fanout"])
+    config.setdefault("logging", default_config["logging"])
+    config.setdefault("compaction", default_config["compaction"])
+    config.setdefault("scheduler", default_config["scheduler"])
 
     # Set API keys as environment variables
     os.environ["ANTHROPIC_API_KEY"] = config["ANTHROPIC_API_KEY"]
@@ -78,38 +197,57 @@ def extract_content_between_tags(content, start_tag, end_tag) -> str | None:
     return content[start:end].strip()
 
 
-def read_directory(dir: str, context=None) -> str:
-    if not context:
-        context = ""
-    try:
-        dir_path = Path(dir)
-        files = [f.name for f in dir_path.iterdir() if f.is_file()]
-        dirs = [f.name for f in dir_path.iterdir() if f.is_dir()]
-
-        # Read files
-        for file_path in files:
-            try:
-                # Skip binary files and common non-text extensions
-                file_extension = file_path.split(".")[-1]
-                if file_extension in ["pyc", "pyo", "so", "dll", "bin"]:
-                    continue
-                with open(f"{dir}/{file_path}", "r", encoding="utf-8") as f:
-                    context += f.read()
-            except (UnicodeDecodeError, PermissionError, OSError) as e:
-                continue
-        for subdir in dirs:
-            try:
-                context = read_directory(subdir, context)
-            except (PermissionError, OSError) as e:
-                continue
-        return context
-    except PermissionError as e:
-        return context
-    except OSError as e:
-        return context
+def read_directory(
+    dir: str,
+    context=None,
+    options: Optional[IngestOptions] = None,
+    report: Optional[IngestReport] = None,
+) -> str:
+    """Read the text files under `dir` into one string of <file> blocks.
+
+    Prefer `iter_directory` when the chunks can be consumed as a stream.
+    """
+    parts = [context] if context else []
+    parts.extend(
+        format_chunk(chunk) for chunk in iter_directory(dir, options, report)
+    )
+    return "".join(parts)
+
+
+def load_file_context(
+    files: Optional[Iterable[str]] = None,
+    directories: Optional[Iterable[str]] = None,
+    options: Optional[IngestOptions] = None,
+    echo: Callable[[str], None] = click.echo,
+) -> str:
+    """Read the given files and directories into a single context string.
+
+    Warnings about skipped files are reported through `echo`.
+    """
+    file_context = ""
+    use_cache = options.use_cache if options else True
+    for file in files or []:
+        try:
+            text = read_file(file, use_cache)
+        except FileNotFoundError:
+            echo(f"Warning: File {file} not found")
+            continue
+        if text is None:
+            echo(f"Warning: Skipping binary file {file}")
+            continue
+        file_context += format_chunk(FileChunk(file, text))
+
+    for d in directories or []:
+        report = IngestReport()
+        file_context += read_directory(d, options=options, report=report)
+        for line in report.warnings(d, options or IngestOptions()):
+            echo(line)
+    return file_context
 
 
 def format_response(text: str) -> list:
+    from rich.syntax import Syntax
+
     lines = text.split("\n")
     in_code_block = False
     formatted_lines = []
@@ -153,9 +291,9 @@ def format_prompt_with_context(prompt: str, file_context: str) -> str:
     return formatted_context
 
 
-def get_provider_and_model(provider=None, model=None):
+def get_provider_and_model(provider=None, model=None, config=None):
     """Get the provider and model, using defaults from config when needed."""
-    config = load_config()
+    config = config or load_config()
 
     # Determine provider
     provider = provider or config["provider"]
@@ -166,3 +304,26 @@ def get_provider_and_model(provider=None, model=None):
         model = config["provider_defaults"].get(provider)
 
     return provider, model
+
+
+def parse_targets(specs: Iterable[str], config=None) -> List[Tuple[str, str]]:
+    """Parse "provider[:model]" targets, comma-separated or repeated.
+
+    A missing model falls back to the provider's default from config.
+    """
+    from ..providers import PROVIDER_PATHS
+
+    config = config or load_config()
+    targets = []
+    for spec in specs:
+        for item in spec.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            provider, _, model = item.partition(":")
+            if provider not in PROVIDER_PATHS:
+                raise click.BadParameter(
+                    f"unknown provider {provider!r} in {item!r}", param_hint="--fanout"
+                )
+            targets.append(get_provider_and_model(provider, model or None, config))
+    return targets
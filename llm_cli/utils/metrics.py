@@ -0,0 +1,185 @@
+"""Latency and throughput metrics for each request.
+
+Every answered turn appends one JSON line to `logs/metrics.jsonl`: stage
+timings (startup, packing, request setup, wait for response headers,
+rendering), time to first token, streaming throughput and the provider's
+token usage. `llm stats` summarises them per provider and model.
+"""
+
+import json
+import math
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..providers.base import Usage
+from .io_utils import LOGS_PATH
+
+METRICS_PATH = LOGS_PATH / "metrics.jsonl"
+
+
+class Stopwatch:
+    """Accumulates named stage durations in seconds."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+
+class StreamMeter:
+    """Wraps a token stream, timing the first and last token.
+
+    The clock starts when the meter is created, so create it right before
+    iterating (provider streams only send the request on first iteration).
+    """
+
+    def __init__(self, tokens: Iterable[str]):
+        self.tokens = tokens
+        self.start = time.perf_counter()
+        self.first: Optional[float] = None
+        self.end: Optional[float] = None
+
+    def __iter__(self) -> Iterator[str]:
+        for token in self.tokens:
+            if self.first is None:
+                self.first = time.perf_counter()
+            yield token
+        self.end = time.perf_counter()
+
+
+@dataclass
+class TurnMetrics:
+    provider: str
+    model: Optional[str]
+    total: float
+    ttft: Optional[float] = None
+    output_tokens: int = 0
+    tokens_per_s: Optional[float] = None
+    stages: Dict[str, float] = field(default_factory=dict)
+    usage: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_stream(
+        cls,
+        provider: str,
+        model: Optional[str],
+        start: float,
+        first: Optional[float],
+        end: float,
+        output_tokens: int,
+        marks: Dict[str, float],
+        usage: Optional[Usage],
+        stages: Optional[Dict[str, float]] = None,
+    ) -> "TurnMetrics":
+        """Build from perf_counter() timestamps of one streamed answer.
+
+        `output_tokens` is used when the provider didn't report usage.
+        """
+        stages = dict(stages or {})
+        request, response = marks.get("request"), marks.get("response")
+        if request is not None and request >= start:
+            stages["setup"] = request - start
+            if response is not None and response >= request:
+                stages["wait"] = response - request
+        if "render" in stages:  # keep stages in the order they happen
+            stages["render"] = stages.pop("render")
+        if usage is not None and usage.output_tokens:
+            output_tokens = usage.output_tokens
+        streaming = end - first if first is not None else 0.0
+        return cls(
+            provider=provider,
+            model=model,
+            total=end - start,
+            ttft=first - start if first is not None else None,
+            output_tokens=output_tokens,
+            tokens_per_s=output_tokens / streaming if streaming > 0 else None,
+            stages=stages,
+            usage=asdict(usage) if usage is not None else None,
+        )
+
+    def footer(self) -> str:
+        """One-line summary shown under an answer with --stats."""
+        parts = []
+        if self.ttft is not None:
+            parts.append(f"ttft {self.ttft:.2f}s")
+        rate = f" ({self.tokens_per_s:,.0f} tok/s)" if self.tokens_per_s else ""
+        parts.append(f"{self.output_tokens:,} tok in {self.total:.2f}s{rate}")
+        if self.usage:
+            cached = self.usage["cached_tokens"]
+            parts.append(
+                f"in {self.usage['input_tokens']:,} tok"
+                + (f", {cached:,} cached" if cached else "")
+            )
+        if self.stages:
+            parts.append(
+                ", ".join(
+                    f"{name} {seconds * 1000:,.0f}ms"
+                    for name, seconds in self.stages.items()
+                )
+            )
+        return " | ".join(parts)
+
+    def to_record(self) -> Dict[str, Any]:
+        return {"timestamp": time.time(), **asdict(self)}
+
+
+def record_metrics(metrics: TurnMetrics, path: Path = METRICS_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(metrics.to_record()) + "\n")
+
+
+def load_metrics(
+    path: Path = METRICS_PATH, since: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if since is None or record.get("timestamp", 0) >= since:
+                records.append(record)
+    return records
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of `values` (0 < p <= 100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(
+    records: Iterable[Dict[str, Any]],
+) -> Dict[Tuple[str, Optional[str]], Dict[str, Any]]:
+    """Per (provider, model): request count and p50/p95/p99 of the key timings."""
+    groups: Dict[Tuple[str, Optional[str]], List[Dict[str, Any]]] = {}
+    for record in records:
+        groups.setdefault((record["provider"], record.get("model")), []).append(record)
+
+    summary = {}
+    for key, group in sorted(groups.items(), key=lambda item: str(item[0])):
+        row: Dict[str, Any] = {"count": len(group)}
+        for metric in ("ttft", "total", "tokens_per_s"):
+            values = [r[metric] for r in group if r.get(metric) is not None]
+            for p in (50, 95, 99):
+                row[f"{metric}_p{p}"] = percentile(values, p)
+        inputs = sum((r.get("usage") or {}).get("input_tokens", 0) for r in group)
+        cached = sum((r.get("usage") or {}).get("cached_tokens", 0) for r in group)
+        row["cached_ratio"] = cached / inputs if inputs else None
+        summary[key] = row
+    return summary
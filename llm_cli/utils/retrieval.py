@@ -0,0 +1,142 @@
+"""Pieces shared by the codebase retrieval engines (embeddings and BM25)."""
+
+import hashlib
+import os
+import re
+import sys
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Protocol, Sequence, Tuple
+
+from .context_cache import CACHE_PATH, get_context_cache
+from .ingest import IngestOptions
+
+INDEX_PATH = CACHE_PATH / "index"
+
+CHUNK_LINES = 40
+CHUNK_OVERLAP = 8
+CHUNK_MAX_CHARS = 2400
+
+RETRIEVAL_MODES = ["embedding", "bm25"]
+
+_WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+@dataclass
+class Chunk:
+    path: str
+    start_line: int  # 1-based, inclusive
+    end_line: int
+    sha256: str  # content hash of the whole file
+    text: str = ""
+
+
+class Retriever(Protocol):
+    # Whether retrieve() makes an API request (a remote embedder)
+    remote: bool
+
+    def refresh(self) -> int: ...
+
+    def search(self, query: str, k: int) -> List[Tuple[Chunk, float]]: ...
+
+    def retrieve(self, query: str) -> str: ...
+
+
+def split_identifiers(text: str) -> List[str]:
+    """Lowercased words from `text`, with identifiers split into their parts.
+
+    `format_prompt_with_context` yields the full identifier followed by
+    `format`, `prompt`, `with`, `context`; `HistoryViewer` yields
+    `historyviewer`, `history`, `viewer`.
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        lower = word.lower()
+        tokens.append(lower)
+        parts = [p for piece in word.split("_") for p in _CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(p.lower() for p in parts)
+    return tokens
+
+
+def chunk_text(path: str, text: str, sha256: str) -> List[Chunk]:
+    """Split a file into overlapping windows of lines."""
+    lines = text.splitlines()
+    chunks = []
+    start = 0
+    while start < len(lines):
+        end = min(start + CHUNK_LINES, len(lines))
+        # Keep very long lines (minified files, data) from blowing up a chunk
+        while end - start > 1 and sum(len(l) + 1 for l in lines[start:end]) > CHUNK_MAX_CHARS:
+            end -= 1
+        body = "\n".join(lines[start:end])
+        if body.strip():
+            chunks.append(Chunk(path, start + 1, end, sha256, body))
+        if end == len(lines):
+            break
+        start = max(end - CHUNK_OVERLAP, start + 1)
+    return chunks
+
+
+def file_hash(text: str, sha256: Optional[str]) -> str:
+    """Content hash of an ingested file, computing it if the cache was off."""
+    return sha256 or hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def index_options(options: Optional[IngestOptions]) -> IngestOptions:
+    """`options` without the total byte budget, for indexing a codebase.
+
+    The budget bounds what -d puts into a prompt; an index only sends its top
+    chunks, so it covers the whole tree. The per-file limit still applies.
+    """
+    return replace(options or IngestOptions(), max_total_bytes=sys.maxsize)
+
+
+def index_dir(root: str, kind: str) -> Path:
+    """Per-codebase directory for an index of the given kind."""
+    key = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()[:16]
+    return INDEX_PATH / key / kind
+
+
+def load_chunk_text(root: str, chunk: Chunk, use_cache: bool = True) -> Chunk:
+    """Fill in a chunk's text from the context cache, or the file itself."""
+    text = None
+    cache = get_context_cache() if use_cache else None
+    if cache is not None:
+        text = cache.get_text(chunk.sha256)
+    if text is None:
+        try:
+            with open(os.path.join(root, chunk.path), encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError):
+            text = ""
+    lines = text.splitlines()[chunk.start_line - 1 : chunk.end_line]
+    return Chunk(chunk.path, chunk.start_line, chunk.end_line, chunk.sha256, "\n".join(lines))
+
+
+def format_results(results: Sequence[Tuple[Chunk, float]]) -> str:
+    """Render retrieved chunks as context blocks."""
+    return "".join(
+        f'<file path="{c.path}" lines="{c.start_line}-{c.end_line}">\n{c.text}\n</file>\n'
+        for c, _ in results
+    )
+
+
+def get_retriever(
+    mode: str,
+    root: str,
+    settings: Optional[Dict[str, Any]] = None,
+    options: Optional[IngestOptions] = None,
+) -> Retriever:
+    """Build the retriever for `mode` over `root` from the `embeddings` config."""
+    settings = settings or {}
+    k = settings.get("top_k", 8)
+    if mode == "bm25":
+        from .bm25 import BM25Index
+
+        return BM25Index(root, options, k=k)
+
+    from .embeddings import CodebaseIndex, get_embedder
+
+    return CodebaseIndex(root, get_embedder(settings), options, k=k)
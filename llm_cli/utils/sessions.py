@@ -0,0 +1,149 @@
+"""Persistent chat sessions.
+
+Each turn is appended to SQLite as soon as it completes (WAL mode, one
+small transaction per turn), so a crash or closed terminal loses at most
+the turn in flight. Session metadata and per-message token counts live
+apart from message bodies: listing sessions and choosing which tail of a
+conversation fits the token window never reads the message text.
+"""
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from ..providers.base import Message
+
+SESSIONS_PATH = Path.home() / ".config" / "llm_cli" / "sessions.db"
+
+# Characters of the first prompt kept as the session title
+TITLE_CHARS = 80
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    provider TEXT,
+    model TEXT,
+    title TEXT NOT NULL,
+    messages INTEGER NOT NULL DEFAULT 0,
+    tokens INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    content TEXT NOT NULL
+);
+-- Covering index: tail selection reads it without touching message bodies
+CREATE UNIQUE INDEX IF NOT EXISTS messages_tail
+    ON messages (session_id, seq, role, tokens);
+"""
+
+
+@dataclass
+class SessionInfo:
+    id: int
+    created: float
+    updated: float
+    provider: Optional[str]
+    model: Optional[str]
+    title: str
+    messages: int
+    tokens: int
+
+
+class SessionStore:
+    def __init__(self, path: Path = SESSIONS_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+
+    def create(self, provider: Optional[str], model: Optional[str], title: str) -> int:
+        now = time.time()
+        title = " ".join(title.split())[:TITLE_CHARS]
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO sessions (created, updated, provider, model, title)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (now, now, provider, model, title),
+            )
+        return cursor.lastrowid
+
+    def append(self, session_id: int, messages: List[Message], tokens: List[int]) -> None:
+        """Append the messages of one turn (with their token counts) atomically."""
+        with self.lock, self.conn:
+            (seq,) = self.conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            self.conn.executemany(
+                "INSERT INTO messages (session_id, seq, role, tokens, content)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [
+                    (session_id, seq + i, message.role, count, message.content)
+                    for i, (message, count) in enumerate(zip(messages, tokens))
+                ],
+            )
+            self.conn.execute(
+                "UPDATE sessions SET updated = ?, messages = messages + ?,"
+                " tokens = tokens + ? WHERE id = ?",
+                (time.time(), len(messages), sum(tokens), session_id),
+            )
+
+    def get(self, session_id: int) -> Optional[SessionInfo]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        return SessionInfo(*row) if row else None
+
+    def latest(self) -> Optional[SessionInfo]:
+        sessions = self.list(1)
+        return sessions[0] if sessions else None
+
+    def list(self, limit: int = 20) -> List[SessionInfo]:
+        """Most recently updated sessions first."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM sessions ORDER BY updated DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [SessionInfo(*row) for row in rows]
+
+    def load_tail(self, session_id: int, max_tokens: int) -> List[Message]:
+        """Load the newest messages that fit in `max_tokens`.
+
+        The tail always starts on a user message. Only the selected
+        messages' bodies are read.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT seq, role, tokens FROM messages WHERE session_id = ?"
+                " ORDER BY seq DESC",
+                (session_id,),
+            )
+            start, total = None, 0
+            for seq, role, tokens in rows:
+                total += tokens
+                if total > max_tokens:
+                    break
+                if role == "user":
+                    start = seq
+            if start is None:
+                return []
+            return [
+                Message(role, content, tokens)
+                for role, content, tokens in self.conn.execute(
+                    "SELECT role, content, tokens FROM messages"
+                    " WHERE session_id = ? AND seq >= ? ORDER BY seq",
+                    (session_id, start),
+                )
+            ]
@@ -0,0 +1,193 @@
+"""Token estimation and request budgeting.
+
+Estimates are character-ratio based: O(1) per string and close enough to
+decide what fits in a model's context window before a request is sent.
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+from ..providers.base import Message
+
+# Average characters per token for each provider's tokenizer on mixed
+# English/code text
+CHARS_PER_TOKEN = {
+    "anthropic": 3.5,
+    "openai": 4.0,
+    "deepseek": 4.0,
+    "gemini": 4.0,
+}
+DEFAULT_CHARS_PER_TOKEN = 3.5
+
+# Context window sizes by model-name prefix; the longest matching prefix wins
+MODEL_WINDOWS = {
+    "claude-": 200_000,
+    "gpt-4.1": 1_047_576,
+    "gpt-4o": 128_000,
+    "gpt-5": 400_000,
+    "o1": 200_000,
+    "o3": 200_000,
+    "o4": 200_000,
+    "deepseek-chat": 64_000,
+    "deepseek-reasoner": 64_000,
+    "gemini-1.5-pro": 2_097_152,
+    "gemini-1.5-flash": 1_048_576,
+    "gemini-2": 1_048_576,
+}
+DEFAULT_WINDOW = 32_000
+
+# Per-message overhead for role markers and separators
+MESSAGE_OVERHEAD = 4
+# Most recent history messages kept ahead of any context chunk
+MIN_RECENT_MESSAGES = 2
+
+_BLOCK_RE = re.compile(r"(?=<file path=)")
+# Retrieved chunks carry their line range (see retrieval.format_results)
+_RETRIEVED_RE = re.compile(r'<file path="[^"]*" lines="')
+
+
+def estimate_tokens(text: str, provider: Optional[str] = None) -> int:
+    ratio = CHARS_PER_TOKEN.get(provider, DEFAULT_CHARS_PER_TOKEN)
+    return math.ceil(len(text) / ratio)
+
+
+def context_window(model: Optional[str]) -> int:
+    best, size = "", DEFAULT_WINDOW
+    for prefix, window in MODEL_WINDOWS.items():
+        if model and model.startswith(prefix) and len(prefix) > len(best):
+            best, size = prefix, window
+    return size
+
+
+def split_context(context: str) -> List[str]:
+    """Split a context string into its <file> blocks (the unit of dropping)."""
+    return [block for block in _BLOCK_RE.split(context) if block.strip()]
+
+
+def split_retrieved(context: str) -> Tuple[str, str]:
+    """Split a context string into (whole files, chunks retrieved for one message)."""
+    files, retrieved = [], []
+    for block in split_context(context):
+        (retrieved if _RETRIEVED_RE.match(block) else files).append(block)
+    return "".join(files), "".join(retrieved)
+
+
+@dataclass
+class PackResult:
+    context: str
+    history: List[Message]
+    tokens: int  # estimated input tokens of the packed request
+    limit: int  # input tokens available (window minus output reservation)
+    system_tokens: int = 0
+    context_tokens: int = 0
+    history_tokens: int = 0
+    dropped_chunks: int = 0
+    dropped_messages: int = 0
+    dropped: List[str] = field(default_factory=list)  # human-readable notes
+
+    @property
+    def over_budget(self) -> bool:
+        """Whether the system prompt and new message alone don't fit.
+
+        Everything else is only packed while it fits, so this is the one way
+        a request ends up over the limit.
+        """
+        return self.tokens > self.limit
+
+    def over_budget_note(self) -> str:
+        return (
+            f"budget: system prompt and message are ~{self.system_tokens:,}"
+            f" tokens, over the {self.limit:,} available; the request will"
+            " likely be rejected"
+        )
+
+
+class TokenBudget:
+    """Packs system prompt, context chunks and history into a model's window.
+
+    The system prompt and the new message always go in. Then the most recent
+    history, then context chunks in priority order, then older history
+    newest-first while it still fits. History is dropped oldest-first in
+    whole exchanges so it still starts with a user message.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        model: Optional[str],
+        max_output_tokens: int,
+        window: Optional[int] = None,
+    ):
+        self.provider = provider
+        self.window = window or context_window(model)
+        self.limit = max(0, self.window - max_output_tokens)
+
+    def estimate(self, text: str) -> int:
+        return estimate_tokens(text, self.provider)
+
+    def message_tokens(self, content: str) -> int:
+        return self.estimate(content) + MESSAGE_OVERHEAD
+
+    def _message_tokens(self, message: Message) -> int:
+        # Counted once when the message was created or loaded
+        return message.tokens or self.message_tokens(message.content)
+
+    def pack(
+        self,
+        system: str,
+        prompt: str,
+        chunks: Sequence[str],
+        history: Sequence[Message],
+    ) -> PackResult:
+        system_tokens = self.estimate(system) + self.estimate(prompt) + MESSAGE_OVERHEAD
+        remaining = self.limit - system_tokens
+        costs = [self._message_tokens(m) for m in history]
+
+        # Walk back from the newest message; `start` is the first kept index
+        start = len(history)
+        recent = 0
+        while start > 0 and len(history) - start < MIN_RECENT_MESSAGES:
+            if costs[start - 1] > remaining - recent:
+                break
+            start -= 1
+            recent += costs[start]
+        remaining -= recent
+
+        kept_chunks, context_tokens, dropped_chunks = [], 0, 0
+        for chunk in chunks:
+            cost = self.estimate(chunk)
+            if cost <= remaining - context_tokens:
+                kept_chunks.append(chunk)
+                context_tokens += cost
+            else:
+                dropped_chunks += 1
+        remaining -= context_tokens
+
+        history_tokens = recent
+        while start > 0 and costs[start - 1] <= remaining:
+            start -= 1
+            remaining -= costs[start]
+            history_tokens += costs[start]
+        # Never start the window on an assistant reply
+        while start < len(history) and history[start].role != "user":
+            history_tokens -= costs[start]
+            start += 1
+
+        result = PackResult(
+            context="".join(kept_chunks),
+            history=list(history[start:]),
+            tokens=system_tokens + context_tokens + history_tokens,
+            limit=self.limit,
+            system_tokens=system_tokens,
+            context_tokens=context_tokens,
+            history_tokens=history_tokens,
+            dropped_chunks=dropped_chunks,
+            dropped_messages=start,
+        )
+        if start:
+            result.dropped.append(f"{start} older messages")
+        if dropped_chunks:
+            result.dropped.append(f"{dropped_chunks} context blocks")
+        return result
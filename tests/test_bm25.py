@@ -0,0 +1,80 @@
+import pytest
+
+from llm_cli.utils import retrieval
+from llm_cli.utils.bm25 import BM25Index
+from llm_cli.utils.ingest import IngestOptions
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval, "INDEX_PATH", tmp_path / "index")
+    root = tmp_path / "repo"
+    root.mkdir()
+    (root / "parser.py").write_text("def parse_tokens(stream):\n    return stream\n")
+    (root / "render.py").write_text("def render_markdown(text):\n    return text\n")
+    (root / "notes.md").write_text("The parser reads tokens from a stream.\n")
+    return root
+
+
+def index(root, **options):
+    return BM25Index(str(root), IngestOptions(use_cache=False, **options))
+
+
+def paths(results):
+    return [chunk.path for chunk, _ in results]
+
+
+def test_search_ranks_matching_files(tree):
+    idx = index(tree)
+    assert idx.refresh() == 3
+    assert paths(idx.search("parse tokens"))[:2] == ["parser.py", "notes.md"]
+    assert paths(idx.search("markdown")) == ["render.py"]
+    assert idx.search("nothing here") == []
+
+
+def test_refresh_only_reindexes_changes(tree):
+    idx = index(tree)
+    idx.refresh()
+    assert idx.refresh() == 0
+
+    (tree / "render.py").write_text("def render_html(text):\n    return text\n")
+    assert idx.refresh() == 1
+    assert idx.search("markdown") == []
+    assert paths(idx.search("html")) == ["render.py"]
+
+
+def test_refresh_drops_deleted_files(tree):
+    idx = index(tree)
+    idx.refresh()
+    (tree / "parser.py").unlink()
+    assert idx.refresh() == 0
+    assert paths(idx.search("parse")) == []
+    assert paths(idx.search("tokens")) == ["notes.md"]
+    # Reopening reads the same state back from disk
+    assert paths(index(tree).search("tokens")) == ["notes.md"]
+
+
+def test_refresh_drops_newly_excluded_files(tree):
+    index(tree).refresh()
+    idx = index(tree, exclude=["*.md"])
+    idx.refresh()
+    assert paths(idx.search("tokens")) == ["parser.py"]
+
+
+def test_total_budget_does_not_limit_the_index(tree):
+    idx = index(tree, max_total_bytes=10)
+    assert idx.refresh() == 3
+    assert idx.refresh() == 0
+    assert sorted(paths(idx.search("def text stream"))) == [
+        "notes.md",
+        "parser.py",
+        "render.py",
+    ]
+
+
+def test_file_over_per_file_limit_keeps_last_version(tree):
+    idx = index(tree, max_file_bytes=1000)
+    idx.refresh()
+    (tree / "render.py").write_text("render_markdown = 1\n" * 100)
+    idx.refresh()
+    assert paths(idx.search("markdown")) == ["render.py"]
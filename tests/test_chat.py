@@ -0,0 +1,75 @@
+import pytest
+
+from llm_cli.chat.chat import ChatSession
+from llm_cli.providers import PROVIDERS
+from llm_cli.providers.base import BaseProvider, Message
+from llm_cli.providers.fanout import HedgedProvider
+from llm_cli.utils.sessions import SessionStore
+
+
+class FakeProvider(BaseProvider):
+    def query(self, prompt, prompt_type=None, message_history=None, context=None):
+        return "answer"
+
+    def query_stream(self, prompt, prompt_type=None, message_history=None, context=None):
+        yield "answer"
+
+    async def aquery(self, prompt, prompt_type=None, message_history=None, context=None):
+        return "answer"
+
+    async def aquery_stream(
+        self, prompt, prompt_type=None, message_history=None, context=None
+    ):
+        yield "answer"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setitem(PROVIDERS._loaded, "alpha", FakeProvider)
+    monkeypatch.setitem(PROVIDERS._loaded, "beta", FakeProvider)
+    return SessionStore(tmp_path / "sessions.db")
+
+
+def turn(text):
+    return [Message("user", text), Message("assistant", "answer")]
+
+
+def test_resume_hedged_session(store):
+    session = ChatSession(
+        "alpha", "a-model", fanout=[("beta", "b-model")], hedge=True, sessions=store
+    )
+    assert isinstance(session.llm, HedgedProvider)
+    session._save_turn(turn("hi"))
+
+    resumed = store.latest()
+    assert (resumed.provider, resumed.model) == ("alpha", "a-model")
+    session = ChatSession(
+        resumed.provider, resumed.model, sessions=store, session_id=resumed.id
+    )
+    assert session.llm.model == "a-model"
+    assert [m.content for m in session.message_history] == ["hi", "answer"]
+
+
+class Retriever:
+    def __init__(self, remote):
+        self.remote = remote
+        self.queries = []
+
+    def refresh(self):
+        return 0
+
+    def search(self, query, k):
+        return []
+
+    def retrieve(self, query):
+        self.queries.append(query)
+        return ""
+
+
+@pytest.mark.parametrize("remote", [False, True])
+def test_drafts_are_only_retrieved_for_local_retrievers(store, remote):
+    retriever = Retriever(remote)
+    session = ChatSession("alpha", "a-model", retriever=retriever)
+    packed = session._pack_draft("draft")
+    assert (packed is None) == remote
+    assert retriever.queries == ([] if remote else ["draft"])
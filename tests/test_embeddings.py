@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from llm_cli.utils import retrieval
+from llm_cli.utils.embeddings import CodebaseIndex
+from llm_cli.utils.ingest import IngestOptions
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval, "INDEX_PATH", tmp_path / "index")
+    root = tmp_path / "repo"
+    root.mkdir()
+    (root / "parser.py").write_text("def parse_tokens(stream):\n    return stream\n")
+    (root / "render.py").write_text("def render_markdown(text):\n    return text\n")
+    return root
+
+
+def index(root):
+    return CodebaseIndex(str(root), options=IngestOptions(use_cache=False))
+
+
+def paths(results):
+    return [chunk.path for chunk, _ in results]
+
+
+def test_search_and_reopen(tree):
+    idx = index(tree)
+    assert idx.refresh() == 2
+    assert paths(idx.search("render markdown", 1)) == ["render.py"]
+    assert index(tree).refresh() == 0
+
+
+@pytest.mark.parametrize("extra", [1, -1])
+def test_rows_out_of_step_with_vectors_rebuilds(tree, extra):
+    idx = index(tree)
+    idx.refresh()
+    # As if the process died between writing the vectors and the metadata
+    meta_file = idx.store._meta_file
+    meta = json.loads(meta_file.read_text())
+    chunk = meta["chunks"][0]
+    meta["chunks"] = meta["chunks"] + [chunk] if extra > 0 else meta["chunks"][:1]
+    meta["rows"] = len(meta["chunks"])
+    meta_file.write_text(json.dumps(meta))
+
+    idx = index(tree)
+    assert idx.store.chunks == []
+    assert idx.refresh() == 2
+    assert paths(idx.search("render markdown", 1)) == ["render.py"]
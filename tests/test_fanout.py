@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from llm_cli.providers.base import BaseProvider
+from llm_cli.providers.fanout import HedgedProvider
+
+
+class Stub(BaseProvider):
+    """Answers `tokens` after `delay` seconds, or raises `error`."""
+
+    def __init__(self, tokens, delay=0.0, error=None):
+        super().__init__("m")
+        self.tokens = tokens
+        self.delay = delay
+        self.error = error
+
+    async def aquery(self, prompt, prompt_type=None, message_history=None, context=None):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return "".join(self.tokens)
+
+    async def aquery_stream(
+        self, prompt, prompt_type=None, message_history=None, context=None
+    ):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        for token in self.tokens:
+            yield token
+
+    def query(self, prompt, prompt_type=None, message_history=None, context=None):
+        return asyncio.run(self.aquery(prompt))
+
+    def query_stream(self, prompt, prompt_type=None, message_history=None, context=None):
+        yield from self.tokens
+
+
+def collect(llm):
+    async def run():
+        return [token async for token in llm.aquery_stream("hi")]
+
+    return asyncio.run(run())
+
+
+def test_first_answer_wins():
+    slow, fast = Stub(["slow"], delay=0.2), Stub(["fa", "st"])
+    llm = HedgedProvider([slow, fast])
+    assert collect(llm) == ["fa", "st"]
+    assert llm.winner is fast
+
+
+def test_error_falls_through_to_backup():
+    failing, backup = Stub([], error=ValueError("down")), Stub(["ok"], delay=0.05)
+    llm = HedgedProvider([failing, backup], hedge_delay=10)
+    assert collect(llm) == ["ok"]
+    assert llm.winner is backup
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_empty_answer_does_not_win_while_others_are_pending(stream):
+    empty, backup = Stub([]), Stub(["answer"], delay=0.05)
+    llm = HedgedProvider([empty, backup])
+    if stream:
+        assert collect(llm) == ["answer"]
+    else:
+        assert asyncio.run(llm.aquery("hi")) == "answer"
+    assert llm.winner is backup
+
+
+def test_empty_answer_wins_when_nothing_else_answers():
+    empty, failing = Stub([]), Stub([], delay=0.05, error=ValueError("down"))
+    llm = HedgedProvider([empty, failing])
+    assert collect(llm) == []
+    assert llm.winner is empty
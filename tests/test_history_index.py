@@ -0,0 +1,109 @@
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+
+import pytest
+
+from llm_cli.utils.history_index import HistoryIndex, log_files, tail_entries
+from llm_cli.utils.io_utils import JsonFormatter, _gzip_rotator
+
+MONTH = "llm_cli_202503.log"
+
+
+@pytest.fixture
+def logs(tmp_path):
+    path = tmp_path / "logs"
+    path.mkdir()
+    return path
+
+
+def make_handler(logs, compress=True, max_bytes=400):
+    handler = RotatingFileHandler(
+        logs / MONTH, maxBytes=max_bytes, backupCount=10, encoding="utf-8"
+    )
+    if compress:
+        handler.namer = lambda name: name + ".gz"
+        handler.rotator = _gzip_rotator
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def log(handler, n, start=0):
+    for i in range(start, start + n):
+        record = logging.makeLogRecord(
+            {
+                "msg": {"query": f"question {i}", "response": f"answer number{i}"},
+                "levelname": "INFO",
+            }
+        )
+        handler.emit(record)
+    handler.flush()
+
+
+def queries(entries):
+    return [entry["query"] for entry in entries]
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_rotation_indexes_every_entry_once(tmp_path, logs, compress):
+    index = HistoryIndex(tmp_path / "history.db", logs)
+    handler = make_handler(logs, compress)
+
+    log(handler, 3)
+    assert index.refresh() == 3
+    assert index.refresh() == 0
+
+    # Enough to roll the month file over a few times
+    log(handler, 10, start=3)
+    handler.close()
+    assert len(log_files(logs)) > 2
+    index.refresh()
+
+    found = queries(index.search(limit=100))
+    assert sorted(found) == sorted(f"question {i}" for i in range(13))
+    assert queries(index.search("number7")) == ["question 7"]
+
+
+def test_rotated_pieces_are_not_indexed_twice(tmp_path, logs):
+    index = HistoryIndex(tmp_path / "history.db", logs)
+    handler = make_handler(logs)
+    log(handler, 10)
+    index.refresh()
+    # Each rollover renames every piece; content keys keep them matched
+    log(handler, 10, start=10)
+    index.refresh()
+    log(handler, 10, start=20)
+    handler.close()
+    index.refresh()
+    assert len(index.search(limit=100)) == 30
+
+
+def test_partial_line_waits_for_the_rest(tmp_path, logs):
+    index = HistoryIndex(tmp_path / "history.db", logs)
+    line = json.dumps({"timestamp": "t", "level": "INFO", "query": "q", "response": "r"})
+    with open(logs / MONTH, "w") as f:
+        f.write(line[:10])
+    assert index.refresh() == 0
+    with open(logs / MONTH, "a") as f:
+        f.write(line[10:] + "\n")
+    assert index.refresh() == 1
+
+
+def test_truncated_file_is_indexed_again(tmp_path, logs):
+    index = HistoryIndex(tmp_path / "history.db", logs)
+    handler = make_handler(logs, max_bytes=0)
+    log(handler, 3)
+    index.refresh()
+    (logs / MONTH).write_text("")
+    log(handler, 1, start=100)
+    handler.close()
+    index.refresh()
+    assert queries(index.search(limit=10)) == ["question 100"]
+
+
+def test_tail_entries_reads_across_pieces(logs):
+    handler = make_handler(logs)
+    log(handler, 13)
+    handler.close()
+    assert queries(tail_entries(4, logs)) == [f"question {i}" for i in range(9, 13)]
+    assert len(tail_entries(100, logs)) == 13
@@ -0,0 +1,110 @@
+import pytest
+
+from llm_cli.providers.base import BaseProvider
+from llm_cli.providers.cached import CachedProvider
+from llm_cli.providers.scheduler import ScheduledProvider
+from llm_cli.utils import response_cache
+from llm_cli.utils.response_cache import ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return clock
+
+
+def test_make_key_is_order_independent():
+    a = ResponseCache.make_key(model="m", prompt="p", history=[["user", "x"]])
+    b = ResponseCache.make_key(prompt="p", history=[["user", "x"]], model="m")
+    assert a == b
+    assert a != ResponseCache.make_key(model="m", prompt="q", history=[])
+
+
+def test_get_and_put(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "r.db")
+    assert cache.get("k") is None
+    cache.put("k", "answer")
+    assert cache.get("k") == "answer"
+    cache.put("k", "newer")
+    assert cache.get("k") == "newer"
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "r.db", ttl=60)
+    cache.put("k", "answer")
+    clock.now += 59
+    assert cache.get("k") == "answer"
+    clock.now += 2
+    assert cache.get("k") is None
+    # Reading an expired entry deletes it
+    clock.now -= 2
+    assert cache.get("k") is None
+
+
+def test_reads_do_not_extend_ttl(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "r.db", ttl=60)
+    cache.put("k", "answer")
+    for _ in range(3):
+        clock.now += 30
+        cache.get("k")
+    assert cache.get("k") is None
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "r.db", max_bytes=30)
+    for key in "abc":
+        cache.put(key, key * 10)
+        clock.now += 1
+    cache.get("a")  # now the most recently used
+    clock.now += 1
+    cache.put("d", "d" * 10)
+    assert cache.get("b") is None
+    assert [cache.get(k) for k in "acd"] == ["a" * 10, "c" * 10, "d" * 10]
+
+
+def test_put_expires_old_entries(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "r.db", ttl=60)
+    cache.put("old", "x")
+    clock.now += 120
+    cache.put("new", "y")
+    count = cache.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    assert count == 1
+
+
+class Answers(BaseProvider):
+    def __init__(self, answer):
+        super().__init__("m")
+        self.answer = answer
+
+    def query(self, prompt, prompt_type=None, message_history=None, context=None):
+        return self.answer
+
+    def query_stream(self, prompt, prompt_type=None, message_history=None, context=None):
+        yield self.answer
+
+    async def aquery(self, prompt, prompt_type=None, message_history=None, context=None):
+        return self.answer
+
+    async def aquery_stream(
+        self, prompt, prompt_type=None, message_history=None, context=None
+    ):
+        yield self.answer
+
+
+def test_wrapped_providers_do_not_share_entries(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "r.db")
+    a = CachedProvider(ScheduledProvider(Answers("from a"), "anthropic"), cache)
+    b = CachedProvider(ScheduledProvider(Answers("from b"), "openai"), cache)
+    assert a.query("hi") == "from a"
+    assert b.query("hi") == "from b"
+    a.provider.provider.answer = "changed"
+    assert a.query("hi") == "from a"
@@ -0,0 +1,249 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from llm_cli.providers import PROVIDERS, scheduler
+from llm_cli.providers.base import BaseProvider, Usage
+from llm_cli.providers.scheduler import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RateLimiter,
+    ScheduledProvider,
+    TokenBucket,
+    configure_scheduler,
+    retry_after,
+)
+from llm_cli.providers.sse import StreamError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class HTTPError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+        self.response = SimpleNamespace(status_code=status, headers=headers or {})
+
+
+class ConnectionError(Exception):  # matched by name, like requests' and httpx's
+    pass
+
+
+class FakeProvider(BaseProvider):
+    """Answers with the next of `outcomes`: text, or an exception to raise."""
+
+    def __init__(self, outcomes=(), model="m"):
+        super().__init__(model)
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, Exception):
+            raise outcome
+        self.last_usage = Usage(input_tokens=10, output_tokens=5)
+        return outcome
+
+    def query(self, prompt, prompt_type=None, message_history=None, context=None):
+        return self._next()
+
+    def query_stream(self, prompt, prompt_type=None, message_history=None, context=None):
+        for token in self._next().split():
+            if token == "FAIL":
+                raise HTTPError(503)
+            yield token
+
+    async def aquery(self, prompt, prompt_type=None, message_history=None, context=None):
+        return self._next()
+
+    async def aquery_stream(
+        self, prompt, prompt_type=None, message_history=None, context=None
+    ):
+        for token in self._next().split():
+            yield token
+
+
+@pytest.fixture(autouse=True)
+def fresh_scheduler(monkeypatch):
+    monkeypatch.setattr(scheduler, "SCHEDULER_CONFIG", scheduler.SchedulerConfig())
+    monkeypatch.setattr(scheduler, "_limiters", {})
+    monkeypatch.setattr(scheduler, "_breakers", {})
+    configure_scheduler({"backoff_base": 0})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    calls = []
+    monkeypatch.setattr(scheduler.time, "sleep", calls.append)
+    return calls
+
+
+def test_retry_after_classification():
+    assert retry_after(HTTPError(503)) == 0.0
+    assert retry_after(HTTPError(429, {"retry-after": "2"})) == 2.0
+    assert retry_after(HTTPError(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after(HTTPError(400)) is None
+    assert retry_after(HTTPError(401)) is None
+    assert retry_after(ConnectionError()) == 0.0
+    assert retry_after(StreamError("overloaded_error", "busy")) == 0.0
+    assert retry_after(StreamError("invalid_request_error", "bad")) is None
+    assert retry_after(ValueError()) is None
+
+
+def test_retries_transient_errors(sleeps):
+    provider = FakeProvider([HTTPError(503), ConnectionError(), "answer"])
+    llm = ScheduledProvider(provider, "fake")
+    assert llm.query("hi") == "answer"
+    assert provider.calls == 3
+    assert llm.last_usage == provider.last_usage
+    assert not llm.failed_over
+
+
+def test_client_errors_are_not_retried(sleeps):
+    provider = FakeProvider([HTTPError(400), "answer"])
+    llm = ScheduledProvider(provider, "fake")
+    with pytest.raises(HTTPError):
+        llm.query("hi")
+    assert provider.calls == 1
+
+
+def test_gives_up_after_max_retries(sleeps):
+    configure_scheduler({"max_retries": 2})
+    provider = FakeProvider([HTTPError(503)] * 5)
+    with pytest.raises(HTTPError):
+        ScheduledProvider(provider, "fake").query("hi")
+    assert provider.calls == 3
+
+
+def test_retry_after_is_waited_for(sleeps):
+    provider = FakeProvider([HTTPError(429, {"retry-after": "2"}), "answer"])
+    assert ScheduledProvider(provider, "fake").query("hi") == "answer"
+    assert len(sleeps) == 1 and 1.9 < sleeps[0] <= 2.0
+
+
+def test_stream_retried_before_first_token(sleeps):
+    provider = FakeProvider([HTTPError(529), "a b c"])
+    llm = ScheduledProvider(provider, "fake")
+    assert list(llm.query_stream("hi")) == ["a", "b", "c"]
+    assert provider.calls == 2
+
+
+def test_stream_not_retried_after_first_token(sleeps):
+    provider = FakeProvider(["a FAIL", "a b"])
+    stream = ScheduledProvider(provider, "fake").query_stream("hi")
+    assert next(stream) == "a"
+    with pytest.raises(HTTPError):
+        next(stream)
+    assert provider.calls == 1
+
+
+def test_async_retries():
+    provider = FakeProvider([HTTPError(503), "x y"])
+    llm = ScheduledProvider(provider, "fake")
+
+    async def collect():
+        return [token async for token in llm.aquery_stream("hi")]
+
+    assert asyncio.run(collect()) == ["x", "y"]
+    provider.outcomes = [HTTPError(502), "answer"]
+    assert asyncio.run(llm.aquery("hi")) == "answer"
+    assert provider.calls == 4
+
+
+def test_breaker_transitions(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler.time, "monotonic", clock)
+    breaker = CircuitBreaker("fake:m", failures=2, reset=10)
+
+    breaker.record_failure()
+    assert breaker.allow()  # one failure short of opening
+    breaker.record_failure()
+    assert not breaker.allow()
+    assert breaker.retry_in() == 10
+
+    clock.now += 10
+    assert breaker.allow()  # half-open: one trial request
+    assert not breaker.allow()
+    breaker.record_failure()  # the trial failed: open again
+    assert not breaker.allow()
+
+    clock.now += 10
+    assert breaker.allow()
+    breaker.release()  # trial cancelled without an outcome
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+    assert breaker.retry_in() == 0
+
+
+def test_open_breaker_fails_fast(sleeps):
+    configure_scheduler({"breaker_failures": 2, "max_retries": 1})
+    provider = FakeProvider([HTTPError(503)] * 2)
+    llm = ScheduledProvider(provider, "fake")
+    with pytest.raises(HTTPError):
+        llm.query("hi")
+    with pytest.raises(CircuitOpenError):
+        llm.query("hi")
+    assert provider.calls == 2
+
+
+def test_failover_when_primary_fails(sleeps, monkeypatch):
+    backups = []
+
+    def backup(model=None):
+        backups.append(FakeProvider(["from backup"], model=model))
+        return backups[-1]
+
+    monkeypatch.setitem(PROVIDERS._loaded, "backup", backup)
+    configure_scheduler({"failover": {"fake": "backup:small"}, "breaker_failures": 1})
+    provider = FakeProvider([HTTPError(503)] * 3)
+    llm = ScheduledProvider(provider, "fake")
+    assert backups == []  # built on first use only
+
+    assert llm.query("hi") == "from backup"
+    assert llm.failed_over and llm.answered_by is backups[0]
+    assert backups[0].model == "small"
+    # The primary's breaker is open, so the next request goes straight over
+    assert llm.query("again") == "ok"
+    assert provider.calls == 1
+
+
+def test_token_bucket_queues_callers(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler.time, "monotonic", clock)
+    bucket = TokenBucket(60)  # one per second, bursts of 60
+    assert [bucket.reserve(30), bucket.reserve(30)] == [0, 0]
+    assert bucket.reserve(1) == pytest.approx(1)
+    assert bucket.reserve(1) == pytest.approx(2)
+    clock.now += 2
+    assert bucket.reserve(1) == pytest.approx(1)
+    bucket.adjust(-10)  # refund after a smaller response than estimated
+    assert bucket.reserve(1) == 0
+
+
+def test_rate_limiter_pause_and_settle(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler.time, "monotonic", clock)
+    limiter = RateLimiter(rpm=None, tpm=600)
+    assert limiter.reserve(600) == 0
+    limiter.settle(600, 300)  # used half the estimate
+    assert limiter.reserve(300) == 0
+    limiter.pause(5)
+    assert limiter.reserve(0) == pytest.approx(5)
+
+
+def test_model_specific_limits():
+    configure_scheduler(
+        {"limits": {"fake": {"rpm": 10}, "fake:big": {"rpm": 1}}}
+    )
+    assert scheduler.get_limiter("fake", "big").requests.capacity == 1
+    assert scheduler.get_limiter("fake", "small").requests.capacity == 10
+    assert scheduler.get_limiter("other", "x").requests is None
@@ -0,0 +1,79 @@
+from llm_cli.providers.sse import SSEDecoder
+
+STREAM = (
+    b"event: message_start\n"
+    b'data: {"type": "message_start"}\n'
+    b"\n"
+    b": keep-alive comment\n"
+    b"event: content_block_delta\n"
+    b'data: {"text": "h\xc3\xa9llo"}\n'
+    b"\n"
+    b"data: line one\n"
+    b"data: line two\n"
+    b"\n"
+)
+
+EXPECTED = [
+    ("message_start", b'{"type": "message_start"}'),
+    ("content_block_delta", b'{"text": "h\xc3\xa9llo"}'),
+    ("message", b"line one\nline two"),
+]
+
+
+def decode(chunks):
+    decoder = SSEDecoder()
+    events = []
+    for chunk in chunks:
+        events.extend(decoder.feed(chunk))
+    return [(e.event, e.data) for e in events]
+
+
+def test_whole_stream():
+    assert decode([STREAM]) == EXPECTED
+
+
+def test_every_split_point():
+    # Includes splits inside "data:", inside the UTF-8 "é" and between the
+    # two newlines that end an event
+    for i in range(1, len(STREAM)):
+        assert decode([STREAM[:i], STREAM[i:]]) == EXPECTED, i
+
+
+def test_byte_at_a_time():
+    assert decode([STREAM[i : i + 1] for i in range(len(STREAM))]) == EXPECTED
+
+
+def test_crlf_and_cr_line_endings():
+    crlf = STREAM.replace(b"\n", b"\r\n")
+    cr = STREAM.replace(b"\n", b"\r")
+    assert decode([crlf]) == EXPECTED
+    assert decode([cr]) == EXPECTED
+    for i in range(1, len(crlf)):
+        assert decode([crlf[:i], crlf[i:]]) == EXPECTED, i
+
+
+def test_crlf_split_between_cr_and_lf():
+    # The LF of a CRLF arriving in the next chunk must not end a second line
+    assert decode([b"data: a\r", b"\n\r", b"\ndata: b\r\n\r\n"]) == [
+        ("message", b"a"),
+        ("message", b"b"),
+    ]
+
+
+def test_field_without_space_and_empty_event():
+    assert decode([b"event:ping\ndata:x\n\n", b"event: empty\n\n"]) == [
+        ("ping", b"x")
+    ]
+
+
+def test_incomplete_event_is_held_back():
+    decoder = SSEDecoder()
+    assert decoder.feed(b"data: partial") == []
+    assert decoder.feed(b"\n") == []
+    events = decoder.feed(b"\n")
+    assert [(e.event, e.data) for e in events] == [("message", b"partial")]
+
+
+def test_json():
+    (event,) = SSEDecoder().feed(b'data: {"a": [1, 2]}\n\n')
+    assert event.json() == {"a": [1, 2]}
@@ -0,0 +1,88 @@
+from llm_cli.providers.base import Message
+from llm_cli.utils.tokens import (
+    MESSAGE_OVERHEAD,
+    TokenBudget,
+    context_window,
+    split_context,
+    split_retrieved,
+)
+
+
+def budget(limit):
+    # openai estimates 4 characters per token; no output reservation
+    return TokenBudget("openai", "test", 0, window=limit)
+
+
+def history(n, size=40):
+    roles = ["user", "assistant"]
+    return [Message(roles[i % 2], str(i) * size) for i in range(n)]
+
+
+def test_context_window_longest_prefix():
+    assert context_window("gpt-4o-mini") == 128_000
+    assert context_window("gpt-4.1-mini") == 1_047_576
+    assert context_window("unknown") == 32_000
+
+
+def test_split_context():
+    context = '<file path="a">\nA\n</file>\n<file path="b">\nB\n</file>\n'
+    assert split_context(context) == [
+        '<file path="a">\nA\n</file>\n',
+        '<file path="b">\nB\n</file>\n',
+    ]
+
+
+def test_split_retrieved():
+    whole = '<file path="a">\nA\n</file>\n'
+    chunk = '<file path="b" lines="1-2">\nB\n</file>\n'
+    assert split_retrieved(chunk + whole + chunk) == (whole, chunk + chunk)
+    assert split_retrieved("") == ("", "")
+
+
+def test_everything_fits():
+    packed = budget(10_000).pack("system", "prompt", ["c" * 40], history(4))
+    assert packed.context == "c" * 40
+    assert len(packed.history) == 4
+    assert packed.dropped == []
+    assert not packed.over_budget
+    assert packed.tokens == (
+        packed.system_tokens + packed.context_tokens + packed.history_tokens
+    )
+
+
+def test_recent_history_beats_context_beats_older_history():
+    messages = history(6)  # 14 tokens each with overhead
+    system = budget(1000).estimate("s") + budget(1000).estimate("p") + MESSAGE_OVERHEAD
+    # Room for the system prompt, two messages and one 20-token chunk only
+    packed = budget(system + 2 * 14 + 20).pack(
+        "s", "p", ["a" * 80, "b" * 80], messages
+    )
+    assert packed.history == messages[-2:]
+    assert packed.context == "a" * 80
+    assert packed.dropped_chunks == 1
+    assert packed.dropped_messages == 4
+    assert packed.dropped == ["4 older messages", "1 context blocks"]
+
+
+def test_history_never_starts_with_assistant():
+    messages = history(5)  # user, assistant, user, assistant, user
+    system = budget(1000).estimate("s") + budget(1000).estimate("p") + MESSAGE_OVERHEAD
+    # Room for four messages, which would start on an assistant reply
+    packed = budget(system + 4 * 14).pack("s", "p", [], messages)
+    assert packed.history[0].role == "user"
+    assert packed.history == messages[2:]
+
+
+def test_message_token_count_is_reused():
+    messages = [Message("user", "x" * 4000, tokens=3), Message("assistant", "y", 3)]
+    packed = budget(100).pack("", "", [], messages)
+    assert packed.history == messages
+    assert packed.history_tokens == 6
+
+
+def test_over_budget_when_prompt_alone_is_too_big():
+    packed = budget(100).pack("s", "p" * 4000, ["chunk"], history(2))
+    assert packed.over_budget
+    assert packed.context == ""
+    assert packed.history == []
+    assert "over the 100 available" in packed.over_budget_note()